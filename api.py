@@ -1,21 +1,33 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-from clickclickclick.planner.task import execute_with_timeout, execute_task
+from clickclickclick.planner.async_task import execute_with_timeout_async, execute_task_async
+from clickclickclick.planner.task import execute_task_with_generator, prompt_cache_stats
 from clickclickclick.executor.osx import MacExecutor
 from clickclickclick.executor.android import AndroidExecutor
-from clickclickclick.planner.gemini import GeminiPlanner
-from clickclickclick.finder.gemini import GeminiFinder
-from clickclickclick.planner.openai import ChatGPTPlanner
-from clickclickclick.finder.local_ollama import OllamaFinder
-from clickclickclick.finder.openai import OpenAIFinder
-from clickclickclick.planner.local_ollama import OllamaPlanner
-from clickclickclick.config import get_config
+from clickclickclick.executor.device_pool import DevicePool
+from clickclickclick.config import BaseConfig
+from clickclickclick.registry import registry
+from clickclickclick.jobs import (
+    CANCELLED,
+    FAILED,
+    RUNNING,
+    SUCCEEDED,
+    TIMED_OUT,
+    Job,
+    JobManager,
+    QueueFull,
+    run_task_generator,
+)
+from clickclickclick import metrics
+from clickclickclick.screen.store import cleanup_leaked, default_store
+from clickclickclick.tracing import TaskTrace
+from contextlib import asynccontextmanager
+import asyncio
+import json
 import uvicorn
 
 
-app = FastAPI()
-
-
 class TaskRequest(BaseModel):
     task_prompt: str
     platform: str = "android"
@@ -23,52 +35,228 @@ class TaskRequest(BaseModel):
     finder_model: str = "gemini"
 
 
+@asynccontextmanager
+async def lease_executor(platform: str):
+    """Yields an executor for the task, holding an Android device for as long as it runs."""
+    if platform == "osx":
+        yield MacExecutor()
+        return
+    # raises RuntimeError when no device is attached
+    serial = await device_pool.acquire()
+    executor = AndroidExecutor(serial=serial)
+    try:
+        yield executor
+    finally:
+        executor.close()
+        device_pool.release(serial)
+
+
+def task_trace(name: str, request: dict, executor, id: str = None) -> TaskTrace:
+    labels = {
+        "planner_model": request["planner_model"],
+        "finder_model": request["finder_model"],
+        "serial": getattr(executor, "serial", None) or request["platform"],
+    }
+    return TaskTrace(name, id=id, labels=labels)
+
+
+async def run_job(job: Job):
+    request = job.request
+    async with lease_executor(request["platform"]) as executor:
+        c, planner, finder = registry.session(
+            request["platform"], request["planner_model"], request["finder_model"], executor
+        )
+        trace = task_trace(f"job {job.id}", request, executor, id=job.id)
+        generator = execute_task_with_generator(
+            request["task_prompt"], executor, planner, finder, c, trace, stop=job.stop
+        )
+        status = metrics.ERROR
+        try:
+            result = await run_task_generator(job, generator, c.TASK_TIMEOUT_IN_SECONDS)
+            if job.status == TIMED_OUT:
+                status = TIMED_OUT
+            elif job.cancel_requested:
+                status = CANCELLED
+            else:
+                status = SUCCEEDED if result else FAILED
+            return result
+        except asyncio.CancelledError:
+            status = CANCELLED
+            raise
+        finally:
+            metrics.record_task(trace, status, planner, finder)
+            job.stats["prompt_cache"] = prompt_cache_stats(planner, finder)
+            job.stats["finder_sources"] = dict(finder.lookup_sources)
+            job.stats["finder_passes"] = finder.pass_stats
+            job.stats["planner_steps"] = planner.step_timings
+            job.stats["settle"] = dict(executor.settle_stats)
+            job.stats["screens"] = dict(executor.screen_stats)
+            job.stats["pipeline"] = dict(executor.pipeline_stats)
+            job.stats["trace"] = trace.summary()
+
+
+device_pool = DevicePool.from_config()
+job_manager = JobManager(run_job, BaseConfig.JOB_WORKERS, BaseConfig.JOB_QUEUE_SIZE)
+# read when /metrics is scraped, nothing is tracked on the request path
+metrics.JOBS_QUEUED.set_function(lambda: job_manager.queued)
+metrics.JOBS_RUNNING.set_function(
+    lambda: sum(job.status == RUNNING for job in job_manager.jobs.values())
+)
+metrics.DEVICES.set_function(
+    lambda: {("available",): device_pool.available, ("in_use",): device_pool.in_use}
+)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # frame files of servers that were killed before they could remove them
+    cleanup_leaked()
+    job_manager.start()
+    yield
+    await job_manager.stop()
+    default_store().close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
 @app.post("/execute")
-def execute_task_api(request: TaskRequest):
+async def execute_task_api(request: TaskRequest):
     task_prompt = request.task_prompt
     platform = request.platform
     planner_model = request.planner_model
     finder_model = request.finder_model
 
-    c = get_config(platform, planner_model, finder_model)
-
-    if platform == "osx":
-        executor = MacExecutor()
-    elif platform == "android":
-        executor = AndroidExecutor()
-    else:
+    if platform not in ("osx", "android"):
         raise HTTPException(status_code=400, detail=f"Unsupported platform: {platform}")
 
-    if planner_model == "openai":
-        executor.screenshot_as_base64 = True
-        planner = ChatGPTPlanner(c)
-    elif planner_model == "gemini":
-        executor.screenshot_as_tempfile = True
-        planner = GeminiPlanner(c)
-    elif planner_model == "ollama":
-        executor.screenshot_as_tempfile = True
-        planner = OllamaPlanner(c, executor)
-    else:
-        raise HTTPException(status_code=400, detail=f"Unsupported planner model: {planner_model}")
-
-    if finder_model == "openai":
-        finder = OpenAIFinder(c, executor)
-    elif finder_model == "gemini":
-        finder = GeminiFinder(c, executor)
-    elif finder_model == "ollama":
-        finder = OllamaFinder("llama3.2-vision", executor)
-    else:
-        raise HTTPException(status_code=400, detail=f"Unsupported finder model: {finder_model}")
+    try:
+        registry.config(platform, planner_model, finder_model)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unsupported model: {e}")
+
+    try:
+        async with lease_executor(platform) as executor:
+            try:
+                c, planner, finder = registry.session(
+                    platform, planner_model, finder_model, executor
+                )
+            except ValueError as e:
+                raise HTTPException(status_code=400, detail=str(e))
 
-    result = execute_with_timeout(
-        execute_task, c.TASK_TIMEOUT_IN_SECONDS, task_prompt, executor, planner, finder, c
-    )
+            trace = task_trace("execute", request.model_dump(), executor)
+            status = metrics.ERROR
+            try:
+                result = await execute_with_timeout_async(
+                    execute_task_async,
+                    c.TASK_TIMEOUT_IN_SECONDS,
+                    task_prompt,
+                    executor,
+                    planner,
+                    finder,
+                    c,
+                    trace,
+                )
+                status = TIMED_OUT if result is None else SUCCEEDED if result else FAILED
+            except asyncio.CancelledError:
+                status = CANCELLED
+                raise
+            finally:
+                metrics.record_task(trace, status, planner, finder)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
 
     if result is not None:
-        return {"result": result}
+        return {
+            "result": result,
+            "prompt_cache": prompt_cache_stats(planner, finder),
+            "finder_sources": dict(finder.lookup_sources),
+            "finder_passes": finder.pass_stats,
+        }
     else:
         raise HTTPException(status_code=500, detail="Task execution failed")
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_api():
+    """Prometheus text format metrics of the jobs, tasks, model requests and devices."""
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@app.get("/devices")
+async def list_devices_api():
+    await device_pool.refresh()
+    return {
+        "devices": device_pool.serials,
+        "available": device_pool.available,
+        "in_use": device_pool.in_use,
+        "waiting": device_pool.waiting,
+    }
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job_api(request: TaskRequest):
+    if request.platform not in ("osx", "android"):
+        raise HTTPException(status_code=400, detail=f"Unsupported platform: {request.platform}")
+    try:
+        registry.config(request.platform, request.planner_model, request.finder_model)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unsupported model: {e}")
+
+    try:
+        job = job_manager.submit(request.model_dump())
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "30"})
+    return {"job_id": job.id, "status": job.status}
+
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
+
+@app.get("/jobs/{job_id}")
+async def job_status_api(job_id: str):
+    return get_job_or_404(job_id).to_dict()
+
+
+@app.get("/jobs/{job_id}/result")
+async def job_result_api(job_id: str):
+    job = get_job_or_404(job_id)
+    if not job.finished:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    return {"job_id": job.id, "status": job.status, "result": job.result, "error": job.error}
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events_api(job_id: str):
+    """Server-sent events with every status change and step (screenshot + observation)."""
+    job = get_job_or_404(job_id)
+
+    async def events():
+        async for event in job.stream():
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.get("/jobs/{job_id}/steps/{step}/screenshot")
+async def job_screenshot_api(job_id: str, step: int):
+    job = get_job_or_404(job_id)
+    for event in job.events:
+        if event["type"] == "step" and event["step"] == step and event["screenshot"]:
+            return FileResponse(event["screenshot"], media_type="image/png")
+    raise HTTPException(status_code=404, detail=f"No screenshot for step {step}")
+
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job_api(job_id: str):
+    get_job_or_404(job_id)
+    job = await job_manager.cancel(job_id)
+    return job.to_dict()
+
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
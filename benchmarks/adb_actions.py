@@ -0,0 +1,48 @@
+"""
+Compares adb input throughput of one adb process per action against a persistent shell.
+
+    python benchmarks/adb_actions.py --actions 50
+
+A harmless keyevent (KEYCODE_UNKNOWN) is sent so the device state is left untouched.
+"""
+
+import time
+import click
+from clickclickclick.executor.android import AdbShellSession, run_adb_command
+
+NOOP_ACTION = ["input", "keyevent", "0"]
+
+
+def bench_subprocess(actions: int) -> float:
+    start = time.perf_counter()
+    for _ in range(actions):
+        run_adb_command(["shell"] + NOOP_ACTION)
+    return time.perf_counter() - start
+
+
+def bench_session(actions: int) -> float:
+    session = AdbShellSession()
+    try:
+        # session startup is paid once per executor, keep it out of the per-action numbers
+        session.run(["true"])
+        start = time.perf_counter()
+        for _ in range(actions):
+            session.run(NOOP_ACTION)
+        return time.perf_counter() - start
+    finally:
+        session.close()
+
+
+@click.command()
+@click.option("--actions", default=50, help="Number of input actions per mode.")
+def main(actions):
+    for name, bench in [("subprocess", bench_subprocess), ("persistent shell", bench_session)]:
+        elapsed = bench(actions)
+        click.echo(
+            f"{name:>16}: {actions / elapsed:8.1f} actions/s "
+            f"({elapsed / actions * 1000:.1f} ms/action)"
+        )
+
+
+if __name__ == "__main__":
+    main()
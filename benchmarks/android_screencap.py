@@ -0,0 +1,44 @@
+"""
+Compares screenshot capture modes of the AndroidExecutor on the connected device.
+
+    python benchmarks/android_screencap.py --runs 10
+
+For each mode it reports the capture latency (adb transfer plus decode into a PIL image)
+and the number of bytes moved over adb per screenshot.
+"""
+
+import io
+import time
+import click
+from PIL import Image
+from clickclickclick.executor.android import parse_raw_screencap, run_adb_command
+
+MODES = {
+    "png": (["exec-out", "screencap", "-p"], lambda data: Image.open(io.BytesIO(data)).load()),
+    "raw": (["exec-out", "screencap"], parse_raw_screencap),
+}
+
+
+@click.command()
+@click.option("--runs", default=10, help="Number of captures per mode.")
+def main(runs):
+    for mode, (command, decode) in MODES.items():
+        latencies = []
+        moved = 0
+        for _ in range(runs):
+            start = time.perf_counter()
+            result = run_adb_command(command, text_mode=False)
+            if result.returncode != 0:
+                raise click.ClickException(f"screencap failed in {mode} mode")
+            decode(result.stdout)
+            latencies.append(time.perf_counter() - start)
+            moved += len(result.stdout)
+        latencies.sort()
+        click.echo(
+            f"{mode:>4}: median {latencies[len(latencies) // 2] * 1000:7.1f} ms, "
+            f"min {latencies[0] * 1000:7.1f} ms, {moved / runs / 1024:8.1f} KiB/capture"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Compares single pass and coarse-to-fine element finding on a saved screenshot.
+
+    python benchmarks/finder_passes.py screen.png "Settings icon" --finder-model gemini
+
+Both modes ask the configured finder model for the same prompt. For each mode it reports
+the end-to-end latency, the image bytes uploaded per lookup and the bounds found.
+"""
+
+import time
+import click
+from clickclickclick.config import get_config
+from clickclickclick.screen import Frame
+from clickclickclick.utils import get_executor, get_finder
+
+
+@click.command()
+@click.argument("screenshot", type=click.Path(exists=True, dir_okay=False))
+@click.argument("prompt")
+@click.option("--platform", default="android", help="Platform the screenshot is from.")
+@click.option("--finder-model", default="gemini", help="Finder model to benchmark.")
+@click.option("--coarse-size", default=256, help="Size of the coarse frame.")
+@click.option("--refine-size", default=384, help="Size of the refined patch.")
+@click.option("--runs", default=3, help="Lookups per mode.")
+def main(screenshot, prompt, platform, finder_model, coarse_size, refine_size, runs):
+    config = get_config(platform, "gemini", finder_model)
+    config.FINDER_CACHE_SIZE = 0
+    config.FINDER_USE_HIERARCHY = False
+    with open(screenshot, "rb") as file:
+        data = file.read()
+
+    for mode, size in (("single", 0), ("coarse_to_fine", coarse_size)):
+        executor = get_executor(platform)
+        finder = get_finder(finder_model, config, executor)
+        finder.coarse_size = size
+        finder.refine_size = refine_size
+        latencies = []
+        for _ in range(runs):
+            # a new frame every run, so no resized or encoded form is reused between runs
+            executor._set_frame(Frame(data=data))
+            start = time.perf_counter()
+            bounds = finder.find_element(prompt, "benchmark")
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        stats = finder.pass_stats[mode]
+        click.echo(
+            f"{mode:>14}: median {latencies[len(latencies) // 2] * 1000:7.1f} ms, "
+            f"{stats['bytes'] / stats['lookups'] / 1024:8.1f} KiB/lookup, bounds {bounds}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+"""
+Compares uploading a planner screenshot with genai.upload_file to sending it inline.
+
+    python benchmarks/gemini_screenshot_upload.py screen.png --runs 5
+
+The Gemini planner used to upload the 768x768 resize of every screenshot before each step, it
+now sends the encoded bytes with the message. This reports the time each way takes to get the
+screenshot ready for the request, the difference is the latency saved per step.
+"""
+
+import io
+import os
+import time
+import click
+import google.generativeai as genai
+from clickclickclick.screen import Frame, ImageCodec
+
+
+@click.command()
+@click.argument("screenshot", type=click.Path(exists=True, dir_okay=False))
+@click.option("--runs", default=5, help="Screenshots prepared per mode.")
+def main(screenshot, runs):
+    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+    codec = ImageCodec()
+    with open(screenshot, "rb") as file:
+        data = file.read()
+
+    def upload(frame):
+        resized = frame.resized(768, 768)
+        genai.upload_file(io.BytesIO(codec.encode(resized)), mime_type=codec.mime_type(resized))
+
+    def inline(frame):
+        resized = frame.resized(768, 768)
+        {"mime_type": codec.mime_type(resized), "data": codec.encode(resized)}
+
+    for mode, prepare in (("upload_file", upload), ("inline", inline)):
+        latencies = []
+        for _ in range(runs):
+            # a new frame every run, so no resize or encoding is reused between runs
+            frame = Frame(data=data)
+            start = time.perf_counter()
+            prepare(frame)
+            latencies.append(time.perf_counter() - start)
+        latencies.sort()
+        click.echo(f"{mode:>11}: median {latencies[len(latencies) // 2] * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
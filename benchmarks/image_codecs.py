@@ -0,0 +1,97 @@
+"""
+Compares image codecs for planner and finder uploads over a directory of saved screenshots.
+
+    python benchmarks/image_codecs.py screens/ -c PNG -c JPEG:85 -c WEBP:80 -c AUTO
+    python benchmarks/image_codecs.py screens/ --labels labels.json --finder-model gemini
+
+For each codec it reports the mean encode time and payload size per screen. With --labels it
+also asks the finder model for every labelled element and reports how many it found. The
+labels file maps a screenshot's file name to the elements on it, each a prompt and its box in
+screen pixels:
+
+    {"home.png": {"Settings icon": [40, 1900, 160, 2020]}}
+
+An element counts as found when the centre of the returned box is inside the labelled box.
+"""
+
+import json
+import os
+import time
+import click
+from clickclickclick.config import get_config
+from clickclickclick.screen import Frame, ImageCodec
+from clickclickclick.utils import get_executor, get_finder
+
+
+def parse_codec(value, max_dimension, max_bytes):
+    format, _, quality = value.partition(":")
+    return ImageCodec(format, int(quality) if quality else None, max_dimension, max_bytes)
+
+
+def found(bounds, label, frame, finder):
+    ymin, xmin, ymax, xmax = map(int, bounds.split(","))
+    if ymin == ymax or xmin == xmax:
+        return False
+    width, height = frame.size
+    x = (xmin + xmax) / 2 * width / finder.IMAGE_WIDTH
+    y = (ymin + ymax) / 2 * height / finder.IMAGE_HEIGHT
+    left, top, right, bottom = label
+    return left <= x <= right and top <= y <= bottom
+
+
+@click.command()
+@click.argument("screens", type=click.Path(exists=True, file_okay=False))
+@click.option("--codec", "-c", "codecs", multiple=True, help="FORMAT or FORMAT:QUALITY.")
+@click.option("--max-dimension", default=0, help="Downscale the longer side to this size.")
+@click.option("--max-bytes", default=0, help="Lower the quality until a payload fits.")
+@click.option("--labels", type=click.Path(exists=True, dir_okay=False), help="Elements to find.")
+@click.option("--platform", default="android", help="Platform the screenshots are from.")
+@click.option("--finder-model", default="gemini", help="Finder model for the accuracy check.")
+def main(screens, codecs, max_dimension, max_bytes, labels, platform, finder_model):
+    names = sorted(name for name in os.listdir(screens) if name.lower().endswith(".png"))
+    if not names:
+        raise click.ClickException(f"No PNG screenshots in {screens}")
+    screenshots = {}
+    for name in names:
+        with open(os.path.join(screens, name), "rb") as file:
+            screenshots[name] = file.read()
+    labelled = {}
+    if labels:
+        with open(labels) as file:
+            labelled = json.load(file)
+
+    for value in codecs or ("PNG", "JPEG:85", "WEBP:80", "AUTO"):
+        codec = parse_codec(value, max_dimension, max_bytes)
+        seconds = size = 0
+        for data in screenshots.values():
+            # a new frame per screen, so nothing is reused from another codec's run
+            frame = Frame(data=data)
+            frame.image
+            start = time.perf_counter()
+            size += len(codec.encode(frame))
+            seconds += time.perf_counter() - start
+        line = (
+            f"{value:>10}: encode {seconds / len(names) * 1000:7.1f} ms, "
+            f"{size / len(names) / 1024:8.1f} KiB/screen"
+        )
+
+        if labelled:
+            config = get_config(platform, "gemini", finder_model)
+            config.FINDER_CACHE_SIZE = 0
+            config.FINDER_USE_HIERARCHY = False
+            executor = get_executor(platform)
+            finder = get_finder(finder_model, config, executor)
+            finder.codec = parse_codec(value, 0, max_bytes)
+            hits = total = 0
+            for name, elements in labelled.items():
+                frame = Frame(data=screenshots[name])
+                executor._set_frame(frame)
+                for prompt, label in elements.items():
+                    total += 1
+                    hits += found(finder.find_element(prompt, "benchmark"), label, frame, finder)
+            line += f", found {hits}/{total}"
+        click.echo(line)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""
+Records a task on the connected device for replay_sessions.py.
+
+    python benchmarks/record_session.py sessions/settings "turn on dark mode" --planner-model gemini
+
+The task runs as usual with the configured planner and finder. The screenshot, UI hierarchy
+and actions of every planner request and the elements the finder located are saved to the
+session directory.
+"""
+
+import click
+from clickclickclick.config import get_config
+from clickclickclick.planner.task import execute_task
+from clickclickclick.replay import SessionRecorder
+from clickclickclick.utils import get_executor, get_finder, get_planner
+
+
+@click.command()
+@click.argument("directory", type=click.Path(file_okay=False))
+@click.argument("prompt")
+@click.option("--platform", default="android", help="Platform to record on.")
+@click.option("--planner-model", default="gemini", help="Planner model of the task.")
+@click.option("--finder-model", default="gemini", help="Finder model of the task.")
+def main(directory, prompt, platform, planner_model, finder_model):
+    config = get_config(platform, planner_model, finder_model)
+    executor = get_executor(platform)
+    planner = get_planner(planner_model, config, executor)
+    finder = get_finder(finder_model, config, executor)
+    recorder = SessionRecorder(prompt, executor, planner, finder)
+    try:
+        finished = execute_task(prompt, executor, planner, finder, config)
+    finally:
+        executor.close()
+    recorder.save(directory)
+    click.echo(
+        f"{len(recorder.session.steps)} steps recorded to {directory}, "
+        f"the task {'finished' if finished else 'did not finish'}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Runs recorded device sessions through the real task loop with a fake executor and stub
+planner and finder, no device, model or network needed.
+
+    python benchmarks/replay_sessions.py --steps 20
+    python benchmarks/replay_sessions.py sessions/settings --planner-latency 800 --runs 5
+    python benchmarks/replay_sessions.py --json replay.json --baseline baseline.json
+
+Without a session directory a synthetic session is generated (see
+``clickclickclick.replay.synthetic_session``), record real ones with record_session.py. For
+each session it reports steps per second, CPU time per step, peak resident memory and the
+bytes encoded per step, the median of ``--runs`` runs. With ``--baseline`` (a ``--json``
+report of an earlier run on the same machine) it exits with an error when a session got
+slower, used more CPU or encoded more bytes per step than ``--tolerance`` allows.
+"""
+
+import json
+import logging
+import os
+import statistics
+import sys
+import click
+from clickclickclick.replay import ReplaySession, run_replay, synthetic_session
+
+
+def run_session(session: ReplaySession, runs: int, latencies: dict) -> dict:
+    reports = [run_replay(session, **latencies) for _ in range(runs)]
+    failed = [report for report in reports if not report.finished or report.missed_clicks]
+    if failed:
+        raise click.ClickException(
+            f"replay of {session.prompt!r} did not finish cleanly: {failed[0].to_dict()}"
+        )
+    result = {
+        key: statistics.median(report.to_dict()[key] for report in reports)
+        for key in ("steps_per_second", "cpu_seconds_per_step", "encoded_bytes_per_step")
+    }
+    result["steps"] = reports[0].steps
+    result["peak_rss"] = max(report.peak_rss for report in reports)
+    return result
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    found = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        if result["steps_per_second"] < before["steps_per_second"] * (1 - tolerance):
+            found.append(
+                f"{name}: {before['steps_per_second']:.2f} -> "
+                f"{result['steps_per_second']:.2f} steps/s"
+            )
+        for key in ("cpu_seconds_per_step", "encoded_bytes_per_step"):
+            if result[key] > before[key] * (1 + tolerance):
+                found.append(f"{name}: {key} {before[key]:.4g} -> {result[key]:.4g}")
+    return found
+
+
+@click.command()
+@click.argument("sessions", nargs=-1, type=click.Path(exists=True, file_okay=False))
+@click.option("--steps", default=20, help="Steps of the synthetic session.")
+@click.option("--size", default="1080x2400", help="Screen size of the synthetic session.")
+@click.option("--runs", default=3, help="Runs per session, the median is reported.")
+@click.option("--planner-latency", default=0.0, help="Milliseconds per planner request.")
+@click.option("--finder-latency", default=0.0, help="Milliseconds per finder segment.")
+@click.option("--capture-latency", default=0.0, help="Milliseconds per screen capture.")
+@click.option("--action-latency", default=0.0, help="Milliseconds per device action.")
+@click.option("--json", "json_path", type=click.Path(dir_okay=False), help="Write a report.")
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False), help="Report to compare.")
+@click.option("--tolerance", default=0.2, help="Allowed regression against the baseline.")
+@click.option("--verbose", is_flag=True, help="Keep the task loop's logging.")
+def main(
+    sessions,
+    steps,
+    size,
+    runs,
+    planner_latency,
+    finder_latency,
+    capture_latency,
+    action_latency,
+    json_path,
+    baseline,
+    tolerance,
+    verbose,
+):
+    if not verbose:
+        # logging every step would be measured too, warnings still show
+        logging.disable(logging.INFO)
+    latencies = {
+        "planner_latency": planner_latency / 1000,
+        "finder_latency": finder_latency / 1000,
+        "capture_latency": capture_latency / 1000,
+        "action_latency": action_latency / 1000,
+    }
+    if sessions:
+        named = {
+            os.path.basename(os.path.normpath(path)): ReplaySession.load(path) for path in sessions
+        }
+    else:
+        width, height = map(int, size.lower().split("x"))
+        named = {f"synthetic-{steps}x{size}": synthetic_session(steps, (width, height))}
+
+    results = {}
+    for name, session in named.items():
+        result = results[name] = run_session(session, runs, latencies)
+        click.echo(
+            f"{name}: {result['steps']} steps, {result['steps_per_second']:.2f} steps/s, "
+            f"{result['cpu_seconds_per_step'] * 1000:.1f} ms CPU/step, "
+            f"{result['encoded_bytes_per_step'] / 1024:.0f} KiB encoded/step, "
+            f"peak RSS {result['peak_rss'] / 2**20:.0f} MiB"
+        )
+
+    if json_path:
+        with open(json_path, "w") as file:
+            json.dump(results, file, indent=2)
+    if baseline:
+        with open(baseline) as file:
+            found = regressions(results, json.load(file), tolerance)
+        for regression in found:
+            click.echo(f"regression: {regression}", err=True)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,11 @@
 # TODO: make a config  module
 import logging
 import logging.config
+import os
 from .conf_types import BaseConfig, ProductionConfig, DevelopmentConfig, TestingConfig
 
-log_file_path = "clickclickclick.log"
+# the tests point it at a temporary directory, see tests/conftest.py
+log_file_path = os.environ.get("CLICKCLICKCLICK_LOG_FILE", "clickclickclick.log")
 log_level = "DEBUG"
 
 logging_config = {
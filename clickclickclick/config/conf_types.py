@@ -18,6 +18,58 @@ class BaseConfig:
     SAMPLE_TASK_PROMPT = "open google.com in safari and search for sharukh khan and click the first link in the result. Take a screenshot and save the screenshot."
     TASK_TIMEOUT_IN_SECONDS = 330
     TASK_DELAY = 1
+    # wait for the screen to stop changing after an action instead of sleeping TASK_DELAY,
+    # up to SETTLE_MAX_WAIT seconds; 0 sleeps TASK_DELAY before every step
+    SETTLE_MAX_WAIT = 2.0
+    SETTLE_INTERVAL = 0.15
+    SETTLE_MIN_WAIT = 0.2
+    # mean grey level difference (0-255) between two frames that still counts as unchanged
+    SETTLE_THRESHOLD = 1.5
+    # a step whose screenshot looks like the last one tells the planner so in text
+    # instead of sending the image again
+    SKIP_UNCHANGED_SCREENS = True
+    # perceptual hash bits and grey levels (0-255) two frames may differ by and look the same
+    UNCHANGED_MAX_DISTANCE = 0
+    UNCHANGED_TOLERANCE = 12
+    # the same actions this many steps in a row without a visible change stop the task, 0 never
+    LOOP_MAX_REPEATS = 3
+    # capture and encode the next frame in the background once a step's last action is sent;
+    # off by default, it only overlaps the end of the step (see the pipeline job stats)
+    PIPELINE_CAPTURE = False
+    # a JSON trace file per task (Chrome trace event format) is written to TRACE_DIR if set,
+    # TRACE_OPENTELEMETRY sends the spans to the app's OpenTelemetry tracer provider
+    TRACE_DIR = ""
+    TRACE_OPENTELEMETRY = False
+    PLANNER_HISTORY_TOKEN_BUDGET = 8000
+    JOB_WORKERS = 4
+    JOB_QUEUE_SIZE = 100
+    # element locations cached per screen fingerprint, 0 turns the cache off
+    FINDER_CACHE_SIZE = 256
+    FINDER_CACHE_TTL = 300
+    FINDER_CACHE_MAX_DISTANCE = 8
+    # find elements by text / content-desc in the UI hierarchy first where the platform has one;
+    # off by default, a uiautomator dump can take seconds before the model is asked
+    FINDER_USE_HIERARCHY = False
+    FINDER_HIERARCHY_MIN_SCORE = 0.8
+    # more tiles find smaller elements on tall screens at the cost of more model calls,
+    # a model's finder section can set its own `tiles`
+    FINDER_TILES = 1
+    FINDER_TILE_OVERLAP = 0.15
+    FINDER_TILE_WORKERS = 4
+    # two pass finding, a rough region on a small frame then a patch of it, 0 turns it off;
+    # a model's finder section can set its own `coarse_size` and `refine_size`
+    FINDER_COARSE_SIZE = 0
+    FINDER_REFINE_SIZE = 384
+    FINDER_REFINE_MARGIN = 0.5
+    # screenshot uploads as PNG, JPEG, WEBP or AUTO (PNG for flat UI screens, JPEG for photos),
+    # IMAGE_MAX_BYTES lowers the lossy quality until a screenshot fits, 0 turns it off;
+    # a model's planner or finder section can set its own `image_format`, `image_quality`,
+    # `image_max_dimension` and `image_max_bytes`
+    IMAGE_FORMAT = "PNG"
+    IMAGE_QUALITY = 85
+    # planner screenshots only, finders size their images with `image_width` / `image_height`
+    IMAGE_MAX_DIMENSION = 0
+    IMAGE_MAX_BYTES = 0
     DEBUG = True
 
     def get_config_for_platform(self, model_name, section, platform=""):
@@ -70,6 +122,14 @@ class BaseConfig:
 
         # return f'Find if any bounding box of {element_name} in this format ymin,xmin,ymax,xmax. Really thats a "{element_name}"?'
 
+    def elements_finder_prompt(self, element_names):
+        elements = "\n".join(f'{i + 1}. "{name}"' for i, name in enumerate(element_names))
+        return (
+            'Return a bounding box for each of these elements, in this order, in the "elements" '
+            "list. If an element is not present then return 0 0 0 0 for all its xmax xmin ymax "
+            f"ymin. Check again.\n{elements}"
+        )
+
     def get_prompts(self, platform, planner_model, finder_model):
         # Load the YAML file
         yaml_path = os.path.join(base_dir, "prompts.yaml")
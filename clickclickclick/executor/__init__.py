@@ -1,11 +1,25 @@
 from abc import ABC, abstractmethod
-from typing import List
+from collections import Counter
+from typing import List, Optional, Tuple
+import asyncio
 import logging
+from PIL import Image
+from clickclickclick.screen import Frame, ImageCodec
+from clickclickclick.tracing import span
 
 logger = logging.getLogger(__name__)
 
 
 class Executor(ABC):
+    # encodes the screenshots screenshot() returns, configure_executor sets the planner's
+    codec = ImageCodec()
+
+    def __init__(self):
+        self._frame = None
+        self._frame_size = None
+        self._screen_size = None
+        self._hierarchy = None
+        self._hierarchy_dumped = False
 
     @abstractmethod
     def move_mouse(self, x: int, y: int, observation: str) -> bool:
@@ -74,3 +88,167 @@ class Executor(ABC):
     @abstractmethod
     def long_press_at_a_point(self, x: int, y: int, observation: str) -> bool:
         pass
+
+    def _capture_frame(self) -> Optional[Frame]:
+        """Captures the screen as a Frame, returns None if the screen is not available."""
+        raise NotImplementedError("Frame capture is not implemented for this executor")
+
+    def capture_frame(self, observation: str) -> Optional[Frame]:
+        """Captures a new frame and keeps it as the current one until invalidated."""
+        try:
+            logger.debug("Capture frame")
+            with span("executor.capture"):
+                frame = self._capture_frame()
+        except Exception as e:
+            logger.exception("Error in capture_frame")
+            frame = None
+        return self._set_frame(frame)
+
+    async def _capture_frame_async(self) -> Optional[Frame]:
+        """Async variant of _capture_frame, executors with async device I/O override it."""
+        return await asyncio.to_thread(self._capture_frame)
+
+    async def capture_frame_async(self, observation: str) -> Optional[Frame]:
+        try:
+            logger.debug("Capture frame")
+            with span("executor.capture"):
+                frame = await self._capture_frame_async()
+        except Exception as e:
+            logger.exception("Error in capture_frame")
+            frame = None
+        return self._set_frame(frame)
+
+    @property
+    def has_screen_probe(self) -> bool:
+        """Whether probe_screen is cheaper than a frame capture, the settle polls use it if so."""
+        return False
+
+    def _probe_screen(self) -> Optional[Image.Image]:
+        """
+        Captures an image of the screen only good for telling whether it still changes, e.g. at
+        a lower resolution or without the encoding a frame needs. None if it is not available.
+        """
+        raise NotImplementedError("Screen probes are not implemented for this executor")
+
+    def probe_screen(self) -> Optional[Image.Image]:
+        try:
+            with span("executor.probe"):
+                return self._probe_screen()
+        except Exception:
+            logger.exception("Error in probe_screen")
+            return None
+
+    async def _probe_screen_async(self) -> Optional[Image.Image]:
+        return await asyncio.to_thread(self._probe_screen)
+
+    async def probe_screen_async(self) -> Optional[Image.Image]:
+        try:
+            with span("executor.probe"):
+                return await self._probe_screen_async()
+        except Exception:
+            logger.exception("Error in probe_screen")
+            return None
+
+    def _set_frame(self, frame: Optional[Frame]) -> Optional[Frame]:
+        self._frame = frame
+        # a dump of the screen before is stale, e.g. after a prefetched capture
+        self._drop_hierarchy()
+        if frame is not None:
+            # a change in frame size means the device rotated or the display changed
+            if self._frame_size is not None and frame.size != self._frame_size:
+                logger.info(f"Display changed from {self._frame_size} to {frame.size}")
+                self.invalidate_screen_size()
+            self._frame_size = frame.size
+        return frame
+
+    def current_frame(self, observation: str) -> Optional[Frame]:
+        """Returns the frame captured for this step, capturing one if there is none."""
+        if self._frame is None:
+            return self.capture_frame(observation)
+        return self._frame
+
+    async def current_frame_async(self, observation: str) -> Optional[Frame]:
+        if self._frame is None:
+            return await self.capture_frame_async(observation)
+        return self._frame
+
+    @property
+    def settle_stats(self) -> Counter:
+        """Totals of the waits for the screen to settle before each step."""
+        if "_settle_stats" not in self.__dict__:
+            self._settle_stats = Counter()
+        return self._settle_stats
+
+    @property
+    def screen_stats(self) -> Counter:
+        """Totals of the steps whose screen did not change and of the action loops stopped."""
+        if "_screen_stats" not in self.__dict__:
+            self._screen_stats = Counter()
+        return self._screen_stats
+
+    @property
+    def pipeline_stats(self) -> Counter:
+        """Totals of the frames captured and encoded while the step before was wrapped up."""
+        if "_pipeline_stats" not in self.__dict__:
+            self._pipeline_stats = Counter()
+        return self._pipeline_stats
+
+    def invalidate_frame(self):
+        """Drops the current frame, called once an action may have changed the screen."""
+        self._frame = None
+        self._drop_hierarchy()
+
+    def _drop_hierarchy(self):
+        self._hierarchy = None
+        self._hierarchy_dumped = False
+
+    def _dump_hierarchy(self) -> Optional[str]:
+        """Dumps the accessibility tree of the screen as XML, None if the platform has none."""
+        return None
+
+    async def _dump_hierarchy_async(self) -> Optional[str]:
+        return await asyncio.to_thread(self._dump_hierarchy)
+
+    def ui_hierarchy(self) -> Optional[str]:
+        """
+        The UI hierarchy of the current screen, dumped at most once per step. A dump that
+        failed isn't tried again until the screen may have changed.
+        """
+        if not self._hierarchy_dumped:
+            self._hierarchy_dumped = True
+            try:
+                with span("executor.hierarchy"):
+                    self._hierarchy = self._dump_hierarchy()
+            except Exception as e:
+                logger.exception("Error in ui_hierarchy")
+        return self._hierarchy
+
+    async def ui_hierarchy_async(self) -> Optional[str]:
+        if not self._hierarchy_dumped:
+            self._hierarchy_dumped = True
+            try:
+                with span("executor.hierarchy"):
+                    self._hierarchy = await self._dump_hierarchy_async()
+            except Exception as e:
+                logger.exception("Error in ui_hierarchy")
+        return self._hierarchy
+
+    def _probe_screen_size(self) -> Tuple[int, int]:
+        """Queries the device for its screen size as (width, height)."""
+        raise NotImplementedError("Screen size is not available for this executor")
+
+    @property
+    def screen_size(self) -> Tuple[int, int]:
+        """Screen size as (width, height), probed once per session and cached."""
+        if self._screen_size is None:
+            self._screen_size = self._probe_screen_size()
+            logger.debug(f"Screen size: {self._screen_size}")
+        return self._screen_size
+
+    def invalidate_screen_size(self):
+        """Forces the next screen_size access to probe the device again."""
+        self._screen_size = None
+
+    def close(self):
+        """Releases any long-lived resources (sessions, processes) held by the executor."""
+        pass
@@ -1,32 +1,237 @@
 from . import Executor
-from subprocess import CompletedProcess, run
+import asyncio
+from subprocess import CompletedProcess, Popen, run
 import subprocess
-from typing import List, Union
-import io
-import base64
+from typing import List, Optional, Tuple, Union
+import queue
+import re
+import struct
+import threading
 from PIL import Image
-from tempfile import NamedTemporaryFile
 import shlex
 from . import logger
+from ..metrics import record_adb_failure
+from ..screen import Frame
 from ..config.yaml_loader import load_yaml
 import os
 
 
-def run_adb_command(command: List[str], text_mode: bool = True) -> CompletedProcess:
-    """Runs adb command and returns the completed process."""
+def adb_args(command: List[str], serial: Optional[str] = None) -> List[str]:
+    """Prefixes an adb command with ``-s <serial>`` when a device is targeted."""
+    return (["-s", serial] if serial else []) + command
+
+
+def _error_output(stderr: Union[str, bytes]) -> str:
+    """stderr of an adb command for the log, text or bytes depending on the text mode."""
+    if isinstance(stderr, bytes):
+        stderr = stderr.decode("utf-8", errors="replace")
+    return stderr.strip()
+
+
+def run_adb_command(
+    command: List[str],
+    text_mode: bool = True,
+    serial: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> CompletedProcess:
+    """
+    Runs adb command and returns the completed process. After ``timeout`` seconds the
+    process is killed and ``subprocess.TimeoutExpired`` raised.
+    """
     result = run(
-        ["adb"] + command,
+        ["adb"] + adb_args(command, serial),
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         text=text_mode,
+        timeout=timeout,
     )
     if result.returncode != 0:
-        logger.error(
-            f"adb command {' '.join(command)} failed: {result.stderr.decode('utf-8').strip()}"
-        )
+        record_adb_failure(serial, command)
+        logger.error(f"adb command {' '.join(command)} failed: {_error_output(result.stderr)}")
     return result
 
 
+async def run_adb_command_async(
+    command: List[str],
+    text_mode: bool = True,
+    serial: Optional[str] = None,
+    timeout: Optional[float] = None,
+) -> CompletedProcess:
+    """
+    Runs adb command without blocking the event loop, the process is killed on cancellation
+    or after ``timeout`` seconds, which raises ``asyncio.TimeoutError``.
+    """
+    process = await asyncio.create_subprocess_exec(
+        "adb",
+        *adb_args(command, serial),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except (asyncio.CancelledError, asyncio.TimeoutError):
+        process.kill()
+        await process.wait()
+        raise
+    if text_mode:
+        stdout, stderr = stdout.decode("utf-8"), stderr.decode("utf-8")
+    result = CompletedProcess(["adb"] + command, process.returncode, stdout, stderr)
+    if result.returncode != 0:
+        record_adb_failure(serial, command)
+        logger.error(f"adb command {' '.join(command)} failed: {_error_output(result.stderr)}")
+    return result
+
+
+class AdbShellSession:
+    """
+    A long-lived ``adb shell`` process that shell commands are piped through.
+
+    Spawning a new adb client for every ``input`` command costs a fork/exec plus the
+    adb handshake. The session keeps one shell open, writes each command followed by a
+    sentinel echo carrying its exit status and reads output until the sentinel shows up.
+    If the shell dies or stops answering, it is restarted and the command retried.
+    """
+
+    SENTINEL = "__click3_done__"
+
+    def __init__(self, serial: Optional[str] = None, timeout: float = 10, retries: int = 1):
+        self.serial = serial
+        self.timeout = timeout
+        self.retries = retries
+        self._process = None
+        self._lines = None
+        self._lock = threading.Lock()
+
+    def _command(self) -> List[str]:
+        return ["adb"] + adb_args(["shell"], self.serial)
+
+    def _start(self):
+        logger.debug(f"Starting adb shell session {self._command()}")
+        self._process = Popen(
+            self._command(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+        )
+        # A reader thread lets us wait on output with a timeout instead of blocking forever
+        self._lines = queue.Queue()
+        threading.Thread(
+            target=self._read_output, args=(self._process, self._lines), daemon=True
+        ).start()
+
+    @staticmethod
+    def _read_output(process: Popen, lines: queue.Queue):
+        for line in iter(process.stdout.readline, ""):
+            lines.put(line)
+        lines.put(None)
+
+    @property
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _write(self, command: str):
+        self._process.stdin.write(f"{command}; echo {self.SENTINEL} $?\n")
+        self._process.stdin.flush()
+
+    def _read_result(self, command: str) -> CompletedProcess:
+        output = []
+        while True:
+            try:
+                line = self._lines.get(timeout=self.timeout)
+            except queue.Empty:
+                raise TimeoutError(f"adb shell did not answer within {self.timeout}s")
+            if line is None:
+                raise EOFError("adb shell session closed")
+            index = line.find(self.SENTINEL)
+            if index == -1:
+                output.append(line)
+                continue
+            # command output without a trailing newline ends up on the sentinel line
+            output.append(line[:index])
+            returncode = int(line[index + len(self.SENTINEL) :].strip() or 1)
+            return CompletedProcess(command, returncode, "".join(output), "")
+
+    def run(self, command: List[str]) -> CompletedProcess:
+        """Runs a shell command (the arguments that would follow ``adb shell``)."""
+        # adb joins shell arguments with spaces, so quoting is the caller's job as before
+        line = " ".join(command)
+        error = "adb shell session unavailable"
+        with self._lock:
+            for attempt in range(self.retries + 1):
+                try:
+                    if not self.alive:
+                        self._start()
+                    self._write(line)
+                except OSError as e:
+                    # the command never reached the device, it is safe to send it again
+                    logger.warning(f"adb shell session failed on attempt {attempt + 1}: {e}")
+                    self._close()
+                    continue
+                try:
+                    result = self._read_result(line)
+                except (EOFError, TimeoutError) as e:
+                    # the command may have run, sending it again could tap or type twice
+                    logger.warning(f"adb shell command {line} got no answer: {e}")
+                    self._close()
+                    error = str(e)
+                    break
+                if result.returncode != 0:
+                    record_adb_failure(self.serial, ["shell"])
+                    logger.error(f"adb shell command {line} failed: {result.stdout.strip()}")
+                return result
+        record_adb_failure(self.serial, ["shell"])
+        return CompletedProcess(line, 255, "", error)
+
+    def _close(self):
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        if self._process.poll() is None:
+            self._process.kill()
+        self._process.wait()
+        self._process = None
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+
+# screencap pixel formats (android PixelFormat) -> (bytes per pixel, PIL mode, raw decoder mode)
+SCREENCAP_PIXEL_FORMATS = {
+    1: (4, "RGBA", "RGBA"),  # RGBA_8888
+    2: (4, "RGB", "RGBX"),  # RGBX_8888, the padding byte is dropped (RGBX can't be saved as PNG)
+    3: (3, "RGB", "RGB"),  # RGB_888
+    5: (4, "RGBA", "BGRA"),  # BGRA_8888
+}
+
+
+def parse_raw_screencap(data: bytes) -> Image.Image:
+    """
+    Wraps the output of ``screencap`` (without ``-p``) in a PIL image.
+
+    The output is a little-endian header of width, height and pixel format, followed by a
+    colorspace word on Android 9+, and then the raw pixels. For RGBA framebuffers the image
+    references the adb output buffer directly instead of copying it.
+    """
+    width, height, pixel_format = struct.unpack_from("<III", data)
+    if pixel_format not in SCREENCAP_PIXEL_FORMATS:
+        raise ValueError(f"Unsupported screencap pixel format {pixel_format}")
+    bytes_per_pixel, mode, raw_mode = SCREENCAP_PIXEL_FORMATS[pixel_format]
+    header_size = len(data) - width * height * bytes_per_pixel
+    if header_size not in (12, 16):
+        raise ValueError(f"Unexpected screencap size {len(data)} for {width}x{height}")
+    pixels = memoryview(data)[header_size:]
+    if mode != raw_mode:
+        # frombuffer maps RGBX pixels as an RGBX image whatever the mode asked for
+        return Image.frombytes(mode, (width, height), pixels, "raw", raw_mode, 0, 1)
+    return Image.frombuffer(mode, (width, height), pixels, "raw", raw_mode, 0, 1)
+
+
 def sanitize_for_adb(text: str) -> str:
     # Replace spaces with %s
     text = text.replace(" ", "%s")
@@ -41,12 +246,28 @@ class AndroidExecutor(Executor):
     DEFAULT_SCROLL_DISTANCE = 1000
     DEFAULT_SWIPE_DISTANCE = 600
     DEFAULT_LONG_PRESS_DURATION = 1000
+    DEFAULT_HIERARCHY_TIMEOUT = 3.0
+    SCREENSHOT_MODES = ("png", "raw")
 
-    def __init__(self):
+    def __init__(
+        self,
+        persistent_shell: Optional[bool] = None,
+        screenshot_mode: Optional[str] = None,
+        serial: Optional[str] = None,
+    ):
         super().__init__()
+        # None talks to whichever device adb picks, as a single attached device would
+        self.serial = serial
         self.screenshot_as_base64 = False
         self.screenshot_as_tempfile = False
         self._load_config()
+        if persistent_shell is not None:
+            self.persistent_shell = persistent_shell
+        if screenshot_mode is not None:
+            self.screenshot_mode = screenshot_mode
+        if self.screenshot_mode not in self.SCREENSHOT_MODES:
+            raise ValueError(f"Unsupported screenshot mode: {self.screenshot_mode}")
+        self._shell = AdbShellSession(self.serial) if self.persistent_shell else None
 
     def _load_config(self):
         """Load executor-specific configuration from models.yaml"""
@@ -68,6 +289,11 @@ class AndroidExecutor(Executor):
             self.long_press_duration = android_config.get(
                 "long_press_duration", self.DEFAULT_LONG_PRESS_DURATION
             )
+            self.persistent_shell = android_config.get("persistent_shell", False)
+            self.screenshot_mode = android_config.get("screenshot_mode", "png")
+            self.hierarchy_timeout = android_config.get(
+                "hierarchy_timeout", self.DEFAULT_HIERARCHY_TIMEOUT
+            )
         except Exception as e:
             logger.warning(f"Could not load configuration, using defaults: {e}")
             self.screen_center_x = self.DEFAULT_SCREEN_CENTER_X
@@ -75,6 +301,23 @@ class AndroidExecutor(Executor):
             self.scroll_distance = self.DEFAULT_SCROLL_DISTANCE
             self.swipe_distance = self.DEFAULT_SWIPE_DISTANCE
             self.long_press_duration = self.DEFAULT_LONG_PRESS_DURATION
+            self.persistent_shell = False
+            self.screenshot_mode = "png"
+            self.hierarchy_timeout = self.DEFAULT_HIERARCHY_TIMEOUT
+
+    def _run_adb_command(self, command: List[str]) -> CompletedProcess:
+        """Routes shell commands through the persistent session when it is enabled."""
+        if self._shell is not None and command[0] == "shell":
+            return self._shell.run(command[1:])
+        return run_adb_command(command, **self._target())
+
+    def _target(self) -> dict:
+        """adb keyword arguments selecting this executor's device, empty for the default one."""
+        return {"serial": self.serial} if self.serial else {}
+
+    def close(self):
+        if self._shell is not None:
+            self._shell.close()
 
     def click_mouse(self, observation: str):
         raise NotImplementedError("click mouse is not available in android")
@@ -85,7 +328,7 @@ class AndroidExecutor(Executor):
     def move_mouse(self, x: int, y: int, observation: str) -> bool:
         try:
             logger.debug(f"move mouse x y {x} {y}")
-            run_adb_command(["shell", "input", "tap", str(x), str(y)])
+            self._run_adb_command(["shell", "input", "tap", str(x), str(y)])
             return True
         except Exception as e:
             logger.exception("Error in move_mouse")
@@ -95,7 +338,7 @@ class AndroidExecutor(Executor):
         try:
             logger.debug(f"press keys {keys}")
             for key in keys:
-                run_adb_command(["shell", "input", "keyevent", key.upper()])
+                self._run_adb_command(["shell", "input", "keyevent", key.upper()])
             return True
         except Exception as e:
             logger.exception("Error in press_key")
@@ -107,12 +350,12 @@ class AndroidExecutor(Executor):
             multiline_texts = text.split("\n")
             for text in multiline_texts:
                 if text == "":  # due to newline
-                    run_adb_command(["shell", "input", "keyevent", "66"])
+                    self._run_adb_command(["shell", "input", "keyevent", "66"])
                 else:
                     sanitized_text = sanitize_for_adb(text)
-                    run_adb_command(["shell", "input", "text", sanitized_text])
+                    self._run_adb_command(["shell", "input", "text", sanitized_text])
             # todo confirm if needed
-            run_adb_command(["shell", "input", "keyevent", "66"])
+            self._run_adb_command(["shell", "input", "keyevent", "66"])
             return True
         except Exception as e:
             logger.exception("Error in type_text")
@@ -126,7 +369,7 @@ class AndroidExecutor(Executor):
                 # Scroll up
                 start_y = self.screen_center_y + self.scroll_distance // 2
                 end_y = self.screen_center_y - self.scroll_distance // 2
-                run_adb_command(
+                self._run_adb_command(
                     [
                         "shell",
                         "input",
@@ -141,7 +384,7 @@ class AndroidExecutor(Executor):
                 # Scroll down
                 start_y = self.screen_center_y - self.scroll_distance // 2
                 end_y = self.screen_center_y + self.scroll_distance // 2
-                run_adb_command(
+                self._run_adb_command(
                     [
                         "shell",
                         "input",
@@ -162,7 +405,7 @@ class AndroidExecutor(Executor):
             logger.debug("swipe left")
             start_x = self.screen_center_x + self.swipe_distance // 2
             end_x = self.screen_center_x - self.swipe_distance // 2
-            run_adb_command(
+            self._run_adb_command(
                 [
                     "shell",
                     "input",
@@ -183,7 +426,7 @@ class AndroidExecutor(Executor):
             logger.debug("swipe right")
             start_x = self.screen_center_x - self.swipe_distance // 2
             end_x = self.screen_center_x + self.swipe_distance // 2
-            run_adb_command(
+            self._run_adb_command(
                 [
                     "shell",
                     "input",
@@ -202,7 +445,7 @@ class AndroidExecutor(Executor):
     def volume_up(self, observation: str) -> bool:
         try:
             logger.debug("volume up")
-            run_adb_command(["shell", "input", "keyevent", "KEYCODE_VOLUME_UP"])
+            self._run_adb_command(["shell", "input", "keyevent", "KEYCODE_VOLUME_UP"])
             return True
         except Exception as e:
             logger.exception("Error in volume_up")
@@ -211,7 +454,7 @@ class AndroidExecutor(Executor):
     def volume_down(self, observation: str) -> bool:
         try:
             logger.debug("volume down")
-            run_adb_command(["shell", "input", "keyevent", "KEYCODE_VOLUME_DOWN"])
+            self._run_adb_command(["shell", "input", "keyevent", "KEYCODE_VOLUME_DOWN"])
             return True
         except Exception as e:
             logger.exception("Error in volume_down")
@@ -222,7 +465,7 @@ class AndroidExecutor(Executor):
             logger.debug("swipe up")
             start_y = self.screen_center_y + self.scroll_distance // 2
             end_y = self.screen_center_y - self.scroll_distance // 2
-            run_adb_command(
+            self._run_adb_command(
                 [
                     "shell",
                     "input",
@@ -243,7 +486,7 @@ class AndroidExecutor(Executor):
             logger.debug("swipe down")
             start_y = self.screen_center_y - self.scroll_distance // 2
             end_y = self.screen_center_y + self.scroll_distance // 2
-            run_adb_command(
+            self._run_adb_command(
                 [
                     "shell",
                     "input",
@@ -262,7 +505,7 @@ class AndroidExecutor(Executor):
     def navigate_back(self, observation: str) -> bool:
         try:
             logger.debug("navigate back")
-            run_adb_command(["shell", "input", "keyevent", "KEYCODE_BACK"])
+            self._run_adb_command(["shell", "input", "keyevent", "KEYCODE_BACK"])
             return True
         except Exception as e:
             logger.exception("Error in navigate_back")
@@ -271,7 +514,7 @@ class AndroidExecutor(Executor):
     def minimize_app(self, observation: str) -> bool:
         try:
             logger.debug("minimize app")
-            run_adb_command(["shell", "input", "keyevent", "KEYCODE_HOME"])
+            self._run_adb_command(["shell", "input", "keyevent", "KEYCODE_HOME"])
             return True
         except Exception as e:
             logger.exception("Error in minimize_app")
@@ -280,7 +523,7 @@ class AndroidExecutor(Executor):
     def click_at_a_point(self, x: int, y: int, observation: str) -> bool:
         try:
             logger.debug(f"click at a point x y {x} {y}")
-            run_adb_command(["shell", "input", "tap", str(x), str(y)])
+            self._run_adb_command(["shell", "input", "tap", str(x), str(y)])
             return True
         except Exception as e:
             logger.exception("Error in click_at_a_point")
@@ -291,7 +534,7 @@ class AndroidExecutor(Executor):
             if duration is None:
                 duration = self.long_press_duration
             logger.debug(f"Long press at a point x y {x} {y} for duration {duration}")
-            run_adb_command(
+            self._run_adb_command(
                 ["shell", "input", "swipe", str(x), str(y), str(x), str(y), str(duration)]
             )
             return True
@@ -299,38 +542,129 @@ class AndroidExecutor(Executor):
             logger.exception("Error in long_press_at_a_point")
             return False
 
+    def _screencap_command(self) -> List[str]:
+        if self.screenshot_mode == "raw":
+            # skips the full resolution PNG encode on the device and the decode here
+            return ["exec-out", "screencap"]
+        return ["exec-out", "screencap", "-p"]
+
+    def _frame_from_screencap(self, result: CompletedProcess) -> Optional[Frame]:
+        if result.returncode != 0:
+            return None
+        if self.screenshot_mode == "raw":
+            return Frame(parse_raw_screencap(result.stdout))
+        # the device already encoded a PNG, keep it so it is never re-encoded
+        return Frame(data=result.stdout, format="PNG")
+
+    def _capture_frame(self) -> Optional[Frame]:
+        """Captures the screen, either as a device-encoded PNG or as the raw framebuffer."""
+        result = run_adb_command(self._screencap_command(), text_mode=False, **self._target())
+        return self._frame_from_screencap(result)
+
+    async def _capture_frame_async(self) -> Optional[Frame]:
+        result = await run_adb_command_async(
+            self._screencap_command(), text_mode=False, **self._target()
+        )
+        return self._frame_from_screencap(result)
+
+    # screencap can't scale on the device, the raw framebuffer is its cheapest capture
+    PROBE_COMMAND = ["exec-out", "screencap"]
+
+    @property
+    def has_screen_probe(self) -> bool:
+        # raw frames already skip the PNG encode, a probe would only add a capture
+        return self.screenshot_mode != "raw"
+
+    @staticmethod
+    def _image_from_probe(result: CompletedProcess) -> Optional[Image.Image]:
+        if result.returncode != 0:
+            return None
+        try:
+            return parse_raw_screencap(result.stdout)
+        except (ValueError, struct.error) as e:
+            logger.warning(f"Unreadable raw screencap: {e}")
+            return None
+
+    def _probe_screen(self) -> Optional[Image.Image]:
+        """The raw framebuffer, without the PNG encode on the device and the decode here."""
+        result = run_adb_command(self.PROBE_COMMAND, text_mode=False, **self._target())
+        return self._image_from_probe(result)
+
+    async def _probe_screen_async(self) -> Optional[Image.Image]:
+        result = await run_adb_command_async(self.PROBE_COMMAND, text_mode=False, **self._target())
+        return self._image_from_probe(result)
+
+    # dumping to /dev/tty streams the XML back instead of writing a file on the device
+    HIERARCHY_COMMAND = ["exec-out", "uiautomator", "dump", "/dev/tty"]
+
+    @staticmethod
+    def _hierarchy_from_dump(result: CompletedProcess) -> Optional[str]:
+        if result.returncode != 0 or "<hierarchy" not in result.stdout:
+            return None
+        return result.stdout
+
+    def _dump_hierarchy(self) -> Optional[str]:
+        # not through the persistent shell, a dump that hangs would take the session with it
+        try:
+            result = run_adb_command(
+                self.HIERARCHY_COMMAND, timeout=self.hierarchy_timeout, **self._target()
+            )
+        except subprocess.TimeoutExpired:
+            return self._dump_timed_out()
+        return self._hierarchy_from_dump(result)
+
+    async def _dump_hierarchy_async(self) -> Optional[str]:
+        try:
+            result = await run_adb_command_async(
+                self.HIERARCHY_COMMAND, timeout=self.hierarchy_timeout, **self._target()
+            )
+        except asyncio.TimeoutError:
+            return self._dump_timed_out()
+        return self._hierarchy_from_dump(result)
+
+    def _dump_timed_out(self) -> Optional[str]:
+        # uiautomator waits for the screen to be idle, which an animation can keep it from
+        record_adb_failure(self.serial, self.HIERARCHY_COMMAND)
+        logger.warning(f"uiautomator dump did not finish within {self.hierarchy_timeout}s")
+        return None
+
     def screenshot(
         self, observation: str, as_base64: bool = False, use_tempfile: bool = False
     ) -> Union[Image.Image, str, tuple]:
         try:
             logger.debug(f"Take a screenshot use_tempfile={use_tempfile}")
-            result = run_adb_command(["exec-out", "screencap", "-p"], text_mode=False)
-            if result.returncode != 0:
+            frame = self._capture_frame()
+            if frame is None:
                 return "" if as_base64 or use_tempfile else None
 
-            screenshot = Image.open(io.BytesIO(result.stdout))
-
             if use_tempfile or self.screenshot_as_tempfile:
-                with NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-                    screenshot.save(temp_file, format="PNG")
-                    temp_file_path = temp_file.name
-                return temp_file_path
+                return self.codec.path(frame)
 
             if as_base64 or self.screenshot_as_base64:
-                buffered = io.BytesIO()
-                screenshot.save(buffered, format="PNG")
-                base64_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                return base64_str
+                return self.codec.base64(frame)
 
-            return screenshot
+            return frame.image
         except Exception as e:
             logger.exception("Error in screenshot")
             return "" if as_base64 or use_tempfile else None
 
+    def _probe_screen_size(self) -> Tuple[int, int]:
+        # a captured frame has the exact pixel size in the current orientation
+        if self._frame is not None:
+            return self._frame.size
+        result = self._run_adb_command(["shell", "wm", "size"])
+        # Example output: 'Physical size: 1080x1920', plus 'Override size: ...' if one is set
+        sizes = dict(re.findall(r"(Physical|Override) size: (\d+x\d+)", result.stdout))
+        size = sizes.get("Override") or sizes.get("Physical")
+        if size is None:
+            raise RuntimeError(f"Failed to parse screen size from adb output: {result.stdout}")
+        width, height = map(int, size.split("x"))
+        return width, height
+
     def run_shell_command(self, command: str) -> bool:
         try:
             logger.debug(f"Run shell command {command}")
-            result = run_adb_command(["shell", command])
+            result = self._run_adb_command(["shell", command])
             logger.info(result)
             return True
         except Exception as e:
@@ -0,0 +1,140 @@
+import asyncio
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, List, Optional
+
+from . import logger
+from .android import run_adb_command_async
+from ..config.yaml_loader import load_yaml
+
+
+def parse_adb_devices(output: str) -> List[str]:
+    """Serials of the devices and emulators that ``adb devices`` lists as ready."""
+    serials = []
+    for line in output.splitlines()[1:]:
+        parts = line.split()
+        # offline and unauthorized devices cannot take commands
+        if len(parts) >= 2 and parts[1] == "device":
+            serials.append(parts[0])
+    return serials
+
+
+async def list_devices() -> List[str]:
+    result = await run_adb_command_async(["devices"])
+    if result.returncode != 0:
+        return []
+    return parse_adb_devices(result.stdout)
+
+
+class DevicePool:
+    """
+    Leases attached Android devices to tasks, one task per device at a time.
+
+    Tasks waiting for a device are served first come, first served, and released devices go
+    to the back of the line so work is spread over the whole farm. ``max_concurrency`` caps
+    the number of leases out at once (0 means one per device).
+    """
+
+    def __init__(self, serials: Optional[List[str]] = None, max_concurrency: int = 0):
+        self.serials: List[str] = []
+        self.max_concurrency = max_concurrency
+        self._free: Deque[str] = deque()
+        self._leased = set()
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._fixed = serials is not None
+        if serials:
+            self._add(serials)
+
+    @classmethod
+    def from_config(cls) -> "DevicePool":
+        """Builds the pool from the ``executor.android`` section of models.yaml."""
+        config_path = os.path.join(os.path.dirname(__file__), "..", "config", "models.yaml")
+        android_config = load_yaml(config_path).get("executor", {}).get("android", {})
+        # an empty device list means every device adb can see
+        return cls(android_config.get("devices") or None, android_config.get("max_concurrency", 0))
+
+    def _add(self, serials: List[str]):
+        for serial in serials:
+            if serial not in self.serials:
+                self.serials.append(serial)
+                self._free.append(serial)
+
+    async def refresh(self) -> List[str]:
+        """Picks up newly attached devices and forgets the ones that went away."""
+        if self._fixed:
+            return self.serials
+        attached = await list_devices()
+        gone = [serial for serial in self.serials if serial not in attached]
+        for serial in gone:
+            logger.info(f"Device {serial} is no longer attached")
+            self.serials.remove(serial)
+            if serial in self._free:
+                self._free.remove(serial)
+        self._add(attached)
+        self._wake()
+        return self.serials
+
+    @property
+    def available(self) -> int:
+        return len(self._free)
+
+    @property
+    def in_use(self) -> int:
+        return len(self._leased)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _can_lease(self) -> bool:
+        if not self._free:
+            return False
+        return not self.max_concurrency or len(self._leased) < self.max_concurrency
+
+    def _wake(self):
+        while self._waiters and self._can_lease():
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(self._take())
+
+    def _take(self) -> str:
+        serial = self._free.popleft()
+        self._leased.add(serial)
+        return serial
+
+    async def acquire(self) -> str:
+        if not self.serials:
+            await self.refresh()
+        if not self.serials:
+            raise RuntimeError("No Android devices attached")
+        # don't let a newcomer overtake tasks that are already waiting
+        if not self._waiters and self._can_lease():
+            return self._take()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # the device was handed over just as the wait was cancelled
+                self.release(waiter.result())
+            elif waiter in self._waiters:
+                self._waiters.remove(waiter)
+            raise
+
+    def release(self, serial: str):
+        self._leased.discard(serial)
+        if serial in self.serials and serial not in self._free:
+            self._free.append(serial)
+        self._wake()
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[str]:
+        serial = await self.acquire()
+        logger.debug(f"Leased device {serial}")
+        try:
+            yield serial
+        finally:
+            self.release(serial)
+            logger.debug(f"Released device {serial}")
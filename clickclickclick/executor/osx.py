@@ -1,11 +1,9 @@
 from . import Executor
-from typing import List, Union
+from typing import List, Optional, Tuple, Union
 import logging
-import io
-import base64
 from PIL import Image
-from tempfile import NamedTemporaryFile
 from . import logger
+from ..screen import Frame
 
 try:
     import pyautogui
@@ -110,6 +108,13 @@ class MacExecutor(Executor):
     def minimize_app(self, observation: str) -> bool:
         raise NotImplementedError("Minimize app is not implemented on Mac")
 
+    def _capture_frame(self) -> Optional[Frame]:
+        return Frame(pyautogui.screenshot())
+
+    def _probe_screen_size(self) -> Tuple[int, int]:
+        width, height = pyautogui.size()
+        return width, height
+
     def screenshot(
         self, observation: str, as_base64: bool = False, use_tempfile: bool = False
     ) -> Union[Image.Image, str, tuple]:
@@ -126,20 +131,14 @@ class MacExecutor(Executor):
         """
         try:
             logger.debug(f"Take a screenshot use_tempfile={use_tempfile}")
-            screenshot = pyautogui.screenshot()
+            frame = self._capture_frame()
             if use_tempfile or self.screenshot_as_tempfile:
-                with NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-                    screenshot.save(temp_file, format="PNG")
-                    temp_file_path = temp_file.name
-                return temp_file_path
+                return self.codec.path(frame)
 
             if as_base64 or self.screenshot_as_base64:
-                buffered = io.BytesIO()
-                screenshot.save(buffered, format="PNG")
-                base64_str = base64.b64encode(buffered.getvalue()).decode("utf-8")
-                return base64_str
+                return self.codec.base64(frame)
 
-            return screenshot
+            return frame.image
         except Exception as e:
             logger.exception("Error in screenshot")
             return "" if as_base64 or use_tempfile else None
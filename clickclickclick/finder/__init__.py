@@ -1,11 +1,26 @@
 from abc import ABC, abstractmethod
-from typing import List
-import subprocess
-import re
+from typing import Dict, List
+import asyncio
 import base64
+import copy
 import json
 import logging
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
 from clickclickclick.executor import Executor
+from clickclickclick.finder.cache import ElementCache
+from clickclickclick.finder.hierarchy import UIIndex
+from clickclickclick.finder.tiling import (
+    TRUNCATED_PENALTY,
+    Detection,
+    best_detection,
+    tile_boxes,
+    truncated,
+)
+from clickclickclick.prompt_cache import PromptCacheStats
+from clickclickclick.screen import Frame, ImageCodec
+from clickclickclick.tracing import in_current_context, span
 from PIL import Image
 from pydantic import BaseModel
 
@@ -19,11 +34,48 @@ class FinderResponseLLM(BaseModel):
     xmax: int
 
 
+class FinderElementsResponseLLM(BaseModel):
+    elements: List[FinderResponseLLM]
+
+
+ELEMENT_SCHEMA = {
+    "type": "object",
+    "properties": {key: {"type": "integer"} for key in ("ymin", "ymax", "xmin", "xmax")},
+    "required": ["ymin", "ymax", "xmin", "xmax"],
+}
+NO_ELEMENT_RESPONSE = '{"ymin": 0, "xmin": 0, "ymax": 0, "xmax": 0}'
+
+
+def elements_schema(element_schema: dict = ELEMENT_SCHEMA) -> dict:
+    """Schema of a batch answer, one ``element_schema`` box per element in prompt order."""
+    return {
+        "type": "object",
+        "properties": {"elements": {"type": "array", "items": element_schema}},
+        "required": ["elements"],
+    }
+
+
 class BaseFinder(ABC):
     IMAGE_WIDTH = None
     IMAGE_HEIGHT = None
     OUTPUT_WIDTH = None
     OUTPUT_HEIGHT = None
+    # shared by all finders built from one config, see utils.get_finder
+    element_cache = None
+    # look elements up in the executor's UI hierarchy before asking the model
+    use_hierarchy = False
+    hierarchy_min_score = 0.8
+    # overlapping tiles along the long side of the screen, found concurrently and merged
+    tiles = 1
+    tile_overlap = 0.15
+    tile_workers = 4
+    # find a rough region on a coarse_size frame first, then the exact box in a refine_size
+    # patch of it; 0 sends the full screen in one pass
+    coarse_size = 0
+    refine_size = 384
+    refine_margin = 0.5
+    # how segments are encoded for the model, get_finder sets it from the config
+    codec = ImageCodec()
 
     def __init__(self, api_key, model_name, generation_config, system_prompt, executor: Executor):
         self.model_name = model_name
@@ -31,89 +83,440 @@ class BaseFinder(ABC):
         self.system_prompt = system_prompt
         self.executor = executor
 
+    def new_session(self, executor: Executor) -> "BaseFinder":
+        """A finder for a new task on ``executor`` that shares this one's model clients."""
+        session = copy.copy(self)
+        session.executor = executor
+        session._cache_stats = PromptCacheStats()
+        session._lookup_sources = Counter()
+        session._pass_stats = {}
+        return session
+
+    @property
+    def cache_stats(self) -> PromptCacheStats:
+        """Prompt cache hits and misses of the finder's requests in this task."""
+        if "_cache_stats" not in self.__dict__:
+            self._cache_stats = PromptCacheStats()
+        return self._cache_stats
+
+    @property
+    def lookup_sources(self) -> Counter:
+        """How many lookups of this task were answered by the cache, hierarchy and model."""
+        if "_lookup_sources" not in self.__dict__:
+            self._lookup_sources = Counter()
+        return self._lookup_sources
+
+    @property
+    def pass_stats(self) -> Dict[str, Counter]:
+        """Model lookups, seconds and image bytes uploaded per finder mode in this task."""
+        if "_pass_stats" not in self.__dict__:
+            self._pass_stats = {}
+        return self._pass_stats
+
+    @property
+    def mode(self) -> str:
+        if self.coarse_size:
+            return "coarse_to_fine"
+        return "tiled" if self.tiles > 1 else "single"
+
     def encode_image_to_base64(self, image_path):
         with open(image_path, "rb") as image_file:
             encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
         return encoded_string
 
-    def resize(self, image, new_size):
+    def resize(self, frame: Frame, new_size):
         if new_size:
             target_width, target_height = new_size, new_size
-            resized_image = image.resize((target_width, target_height), Image.Resampling.LANCZOS)
-            segments = [(resized_image, (0, 0, target_width, target_height))]
+            if self.tiles > 1:
+                segments = self.tile(frame, target_width, target_height)
+            else:
+                resized_frame = frame.resized(target_width, target_height)
+                segments = [(resized_frame, (0, 0, target_width, target_height))]
             total_width, total_height = target_width, target_height
         return segments, total_width, total_height
 
+    def tile(self, frame: Frame, target_width: int, target_height: int):
+        """
+        Segments of overlapping tiles, each resized to the model's input size.
+
+        Tiles keep the screen's aspect ratio close to square instead of squashing a tall
+        screen, their coordinates are in the finder's IMAGE_WIDTH x IMAGE_HEIGHT space.
+        """
+        width, height = frame.size
+        segments = []
+        for left, top, right, bottom in tile_boxes(width, height, self.tiles, self.tile_overlap):
+            crop = frame.image.crop((round(left), round(top), round(right), round(bottom)))
+            tile = Frame(crop.resize((target_width, target_height), Image.Resampling.LANCZOS))
+            coordinates = (
+                left * self.IMAGE_WIDTH / width,
+                top * self.IMAGE_HEIGHT / height,
+                right * self.IMAGE_WIDTH / width,
+                bottom * self.IMAGE_HEIGHT / height,
+            )
+            segments.append((tile, coordinates))
+        return segments
+
+    def coarse_segment(self, frame: Frame):
+        """The whole screen heavily downscaled, to find roughly where the element is."""
+        return (frame.resized(self.coarse_size), (0, 0, self.IMAGE_WIDTH, self.IMAGE_HEIGHT))
+
+    def refine_segment(self, frame: Frame, bounds: str):
+        """
+        A square patch of the full resolution screen around rough image space ``bounds``.
+
+        The patch is ``refine_margin`` of the element's size bigger on every side, so a
+        rough box that is a little off still contains the whole element.
+        """
+        width, height = frame.size
+        ymin, xmin, ymax, xmax = map(int, bounds.split(","))
+        top, bottom = ymin * height / self.IMAGE_HEIGHT, ymax * height / self.IMAGE_HEIGHT
+        left, right = xmin * width / self.IMAGE_WIDTH, xmax * width / self.IMAGE_WIDTH
+        side = max(bottom - top, right - left) * (1 + 2 * self.refine_margin)
+        side = min(max(side, self.refine_size), width, height)
+        left = min(max(0, (left + right - side) / 2), width - side)
+        top = min(max(0, (top + bottom - side) / 2), height - side)
+        box = (round(left), round(top), round(left + side), round(top + side))
+        patch = frame.image.crop(box).resize(
+            (self.refine_size, self.refine_size), Image.Resampling.LANCZOS
+        )
+        coordinates = (
+            box[0] * self.IMAGE_WIDTH / width,
+            box[1] * self.IMAGE_HEIGHT / height,
+            box[2] * self.IMAGE_WIDTH / width,
+            box[3] * self.IMAGE_HEIGHT / height,
+        )
+        return (Frame(patch), coordinates)
+
     @abstractmethod
     def process_segment(self, segment, model, prompt):
         pass
 
+    async def process_segment_async(self, segment, model, prompt):
+        """Async variant of process_segment, finders with an async client override it."""
+        return await asyncio.to_thread(self.process_segment, segment, model, prompt)
+
+    def process_segment_batch(self, segment, model, prompts: List[str]):
+        """
+        Locates all ``prompts`` in the segment, answering ``{"elements": [box, ...]}`` in order.
+
+        This asks for one prompt at a time, finders whose model can return a list override it
+        with a single request.
+        """
+        elements = []
+        for prompt in prompts:
+            response, coordinates = self.process_segment(segment, model, prompt)
+            try:
+                elements.append(json.loads(response))
+            except (ValueError, TypeError):
+                elements.append(json.loads(NO_ELEMENT_RESPONSE))
+        return json.dumps({"elements": elements}), segment[1]
+
+    async def process_segment_batch_async(self, segment, model, prompts: List[str]):
+        return await asyncio.to_thread(self.process_segment_batch, segment, model, prompts)
+
+    @staticmethod
+    def _tile_results(results) -> list:
+        # one failed tile shouldn't lose what the others found
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Error processing tile: {result}")
+        return [result for result in results if not isinstance(result, Exception)]
+
+    def process_segments(self, segments, prompt, process=None) -> list:
+        """Sends the segments to the model, tiles concurrently on a bounded thread pool."""
+        process_segment = process or self.process_segment
+
+        def process(segment):
+            with span("finder.process_segment", segments=len(segments)):
+                return process_segment(segment, self.model_name, prompt)
+
+        if len(segments) == 1:
+            return [process(segments[0])]
+        with ThreadPoolExecutor(max_workers=min(len(segments), self.tile_workers)) as pool:
+            futures = [pool.submit(in_current_context(process), segment) for segment in segments]
+            return self._tile_results([future.exception() or future.result() for future in futures])
+
+    async def process_segments_async(self, segments, prompt, process=None) -> list:
+        process_segment = process or self.process_segment_async
+
+        async def traced(segment):
+            with span("finder.process_segment", segments=len(segments)):
+                return await process_segment(segment, self.model_name, prompt)
+
+        if len(segments) == 1:
+            return [await traced(segments[0])]
+        semaphore = asyncio.Semaphore(self.tile_workers)
+
+        async def process(segment):
+            async with semaphore:
+                return await traced(segment)
+
+        results = await asyncio.gather(*map(process, segments), return_exceptions=True)
+        return self._tile_results(results)
+
     def find_element(self, prompt, observation: str) -> str:
-        new_size = self.IMAGE_WIDTH  # assuming square image size
         logger.info(prompt)
-        screenshot = self.executor.screenshot(observation, False, True)
-        image = Image.open(screenshot)
+        # reuse the frame the planner saw in this step instead of capturing the screen again
+        frame = self.executor.current_frame(observation)
+        if frame is None:
+            logger.error("No screenshot available for the finder")
+            return "0,0,0,0"
+        cached = self._cached_element(frame, prompt)
+        if cached is not None:
+            return cached
+        if self.use_hierarchy:
+            found = self._hierarchy_element(self.executor.ui_hierarchy(), prompt)
+            if found is not None:
+                return found
+        return self._model_element(frame, prompt)
+
+    async def find_element_async(self, prompt, observation: str) -> str:
+        logger.info(prompt)
+        frame = await self.executor.current_frame_async(observation)
+        if frame is None:
+            logger.error("No screenshot available for the finder")
+            return "0,0,0,0"
+        cached = self._cached_element(frame, prompt)
+        if cached is not None:
+            return cached
+        if self.use_hierarchy:
+            found = self._hierarchy_element(await self.executor.ui_hierarchy_async(), prompt)
+            if found is not None:
+                return found
+        return await self._model_element_async(frame, prompt)
 
-        segments, total_width, total_height = self.resize(image, new_size=new_size)
+    def find_elements(self, prompts: List[str], observation: str) -> List[str]:
+        """
+        Bounds of several elements of the current screen, in the order of ``prompts``.
 
-        results = [self.process_segment(segments[0], self.model_name, prompt)]
-        i = 0
-        ans = "0,0,0,0"
-        for response, coordinates in results:
-            i += 1
-            print(coordinates, i)
+        Elements that the cache or the UI hierarchy don't know are located together, in one
+        model request per segment where the finder overrides ``process_segment_batch``.
+        """
+        prompts = list(prompts)
+        logger.info(prompts)
+        frame = self.executor.current_frame(observation)
+        if frame is None:
+            logger.error("No screenshot available for the finder")
+            return ["0,0,0,0"] * len(prompts)
+        found = self._cached_elements(frame, prompts)
+        missing = [prompt for prompt in dict.fromkeys(prompts) if prompt not in found]
+        if missing and self.use_hierarchy:
+            found.update(self._hierarchy_elements(self.executor.ui_hierarchy(), missing))
+            missing = [prompt for prompt in missing if prompt not in found]
+        if len(missing) > 1:
+            started = time.monotonic()
+            segments, total_width, total_height = self.resize(frame, new_size=self.IMAGE_WIDTH)
+            results = self.process_segments(segments, missing, self.process_segment_batch)
+            found.update(self._batch_elements(frame, missing, segments, results, started))
+        else:
+            for prompt in missing:
+                found[prompt] = self._model_element(frame, prompt)
+        return [found[prompt] for prompt in prompts]
+
+    async def find_elements_async(self, prompts: List[str], observation: str) -> List[str]:
+        prompts = list(prompts)
+        logger.info(prompts)
+        frame = await self.executor.current_frame_async(observation)
+        if frame is None:
+            logger.error("No screenshot available for the finder")
+            return ["0,0,0,0"] * len(prompts)
+        found = self._cached_elements(frame, prompts)
+        missing = [prompt for prompt in dict.fromkeys(prompts) if prompt not in found]
+        if missing and self.use_hierarchy:
+            hierarchy = await self.executor.ui_hierarchy_async()
+            found.update(self._hierarchy_elements(hierarchy, missing))
+            missing = [prompt for prompt in missing if prompt not in found]
+        if len(missing) > 1:
+            started = time.monotonic()
+            segments, total_width, total_height = self.resize(frame, new_size=self.IMAGE_WIDTH)
+            results = await self.process_segments_async(
+                segments, missing, self.process_segment_batch_async
+            )
+            found.update(self._batch_elements(frame, missing, segments, results, started))
+        else:
+            for prompt in missing:
+                found[prompt] = await self._model_element_async(frame, prompt)
+        return [found[prompt] for prompt in prompts]
+
+    def _cached_elements(self, frame: Frame, prompts: List[str]) -> Dict[str, str]:
+        found = {prompt: self._cached_element(frame, prompt) for prompt in dict.fromkeys(prompts)}
+        return {prompt: bounds for prompt, bounds in found.items() if bounds is not None}
+
+    def _hierarchy_elements(self, hierarchy, prompts: List[str]) -> Dict[str, str]:
+        found = {prompt: self._hierarchy_element(hierarchy, prompt) for prompt in prompts}
+        return {prompt: bounds for prompt, bounds in found.items() if bounds is not None}
+
+    def _model_element(self, frame: Frame, prompt: str) -> str:
+        started = time.monotonic()
+        if self.coarse_size:
+            coarse = self.coarse_segment(frame)
+            rough = self._parse_results(self.process_segments([coarse], prompt))
+            if rough != "0,0,0,0":
+                refine = self.refine_segment(frame, rough)
+                bounds = self._parse_results(self.process_segments([refine], prompt))
+                self._record_pass(started, [coarse, refine])
+                return self._cache_element(frame, prompt, self._refined(rough, bounds), started)
+            logger.info(f"{prompt} not found on the coarse frame, trying the full screen")
+            segments = [coarse]
+        else:
+            segments = []
+
+        full, total_width, total_height = self.resize(frame, new_size=self.IMAGE_WIDTH)
+        results = self.process_segments(full, prompt)
+        self._record_pass(started, segments + full)
+        return self._cache_element(frame, prompt, self._parse_results(results), started)
+
+    async def _model_element_async(self, frame: Frame, prompt: str) -> str:
+        started = time.monotonic()
+        if self.coarse_size:
+            coarse = self.coarse_segment(frame)
+            rough = self._parse_results(await self.process_segments_async([coarse], prompt))
+            if rough != "0,0,0,0":
+                refine = self.refine_segment(frame, rough)
+                bounds = self._parse_results(await self.process_segments_async([refine], prompt))
+                self._record_pass(started, [coarse, refine])
+                return self._cache_element(frame, prompt, self._refined(rough, bounds), started)
+            logger.info(f"{prompt} not found on the coarse frame, trying the full screen")
+            segments = [coarse]
+        else:
+            segments = []
+
+        full, total_width, total_height = self.resize(frame, new_size=self.IMAGE_WIDTH)
+        results = await self.process_segments_async(full, prompt)
+        self._record_pass(started, segments + full)
+        return self._cache_element(frame, prompt, self._parse_results(results), started)
+
+    @staticmethod
+    def _batch_answer(response: str, index: int) -> str:
+        """The ``index``-th box of a batch response, as a single element response."""
+        try:
+            data = json.loads(response)
+            elements = data.get("elements", []) if isinstance(data, dict) else data
+            return json.dumps(elements[index])
+        except (ValueError, IndexError, TypeError, KeyError):
+            return NO_ELEMENT_RESPONSE
+
+    def _batch_elements(self, frame: Frame, prompts, segments, results, started) -> dict:
+        self._record_pass(started, segments, mode="batch")
+        found = {}
+        for index, prompt in enumerate(prompts):
+            answers = [(self._batch_answer(response, index), box) for response, box in results]
+            found[prompt] = self._cache_element(
+                frame, prompt, self._parse_results(answers), started
+            )
+        return found
+
+    @staticmethod
+    def _refined(rough: str, bounds: str) -> str:
+        # the rough box is still a usable answer if the patch didn't show the element
+        return rough if bounds == "0,0,0,0" else bounds
 
+    def _record_pass(self, started: float, segments, mode=None):
+        mode = mode or self.mode
+        seconds = time.monotonic() - started
+        # the encoded image, base64 encoded uploads send a third more
+        uploaded = sum(len(self.codec.encode(segment[0])) for segment in segments)
+        stats = self.pass_stats.setdefault(mode, Counter())
+        stats.update(lookups=1, seconds=seconds, bytes=uploaded)
+        logger.info(
+            f"{mode} lookup took {seconds:.2f}s and uploaded {uploaded / 1024:.0f} KiB "
+            f"in {len(segments)} images"
+        )
+
+    def _answered(self, source: str, prompt: str, bounds: str) -> str:
+        self.lookup_sources[source] += 1
+        logger.info(f"Found {prompt} at {bounds} using the {source}")
+        return bounds
+
+    def _cached_element(self, frame: Frame, prompt: str):
+        if self.element_cache is None:
+            return None
+        # cached bounds are in image space, so is the frame they're checked against
+        bounds = self.element_cache.get(frame.resized(self.IMAGE_WIDTH), prompt)
+        if bounds is not None:
+            return self._answered("cache", prompt, bounds)
+        return None
+
+    def _cache_element(self, frame: Frame, prompt: str, bounds: str, started: float) -> str:
+        if self.element_cache is not None:
+            self.element_cache.put(
+                frame.resized(self.IMAGE_WIDTH), prompt, bounds, time.monotonic() - started
+            )
+        return self._answered("model", prompt, bounds)
+
+    def _hierarchy_element(self, hierarchy, prompt: str):
+        """Bounds of the element in the UI hierarchy, in the finder's image space."""
+        if not hierarchy:
+            return None
+        # the planner often asks for several elements of one screen, index it once
+        if self.__dict__.get("_ui_index", (None, None))[0] is not hierarchy:
+            try:
+                self._ui_index = (hierarchy, UIIndex.from_xml(hierarchy))
+            except Exception as e:
+                logger.warning(f"Could not parse the UI hierarchy: {e}")
+                return None
+        node = self._ui_index[1].find(prompt, self.hierarchy_min_score)
+        if node is None:
+            return None
+        screen_x, screen_y = self.executor.screen_size
+        left, top, right, bottom = node.bounds
+        bounds = [
+            top * self.IMAGE_HEIGHT / screen_y,
+            left * self.IMAGE_WIDTH / screen_x,
+            bottom * self.IMAGE_HEIGHT / screen_y,
+            right * self.IMAGE_WIDTH / screen_x,
+        ]
+        return self._answered("hierarchy", prompt, ",".join(map(str, map(int, bounds))))
+
+    def _parse_results(self, results) -> str:
+        """
+        Merges the segment responses into ymin,xmin,ymax,xmax bounds in image space.
+
+        Boxes from overlapping tiles go through non-maximum suppression; boxes cut off by a
+        tile edge count for less, and a ``confidence`` in the response is used when the
+        model gives one.
+        """
+        frame_box = (0, 0, self.IMAGE_WIDTH, self.IMAGE_HEIGHT)
+        detections = []
+        for response, coordinates in results:
+            logger.debug(f"Segment {coordinates}: {response}")
             try:
                 response_dict = json.loads(response)
                 ymin = int(response_dict["ymin"])
                 xmin = int(response_dict["xmin"])
                 ymax = int(response_dict["ymax"])
                 xmax = int(response_dict["xmax"])
-                if ymin == 0 and xmin == 0 and xmax == 0 and ymax == 0:
-                    continue
-                orig_left, orig_top, _, _ = coordinates
-
-                y_min_percent = (orig_top + ymin) / self.OUTPUT_HEIGHT * self.IMAGE_HEIGHT
-                x_min_percent = (orig_left + xmin) / self.OUTPUT_WIDTH * self.IMAGE_WIDTH
-                y_max_percent = (orig_top + ymax) / self.OUTPUT_HEIGHT * self.IMAGE_HEIGHT
-                x_max_percent = (orig_left + xmax) / self.OUTPUT_WIDTH * self.IMAGE_WIDTH
-                ans = ",".join(
-                    map(
-                        str,
-                        map(
-                            int,
-                            [
-                                y_min_percent,
-                                x_min_percent,
-                                y_max_percent,
-                                x_max_percent,
-                            ],
-                        ),
-                    )
-                )
-                print(ans)
-            except json.JSONDecodeError:
-                print("Could not decode response")
-
-        return ans
+                confidence = float(response_dict.get("confidence", 1.0))
+            except (ValueError, TypeError, KeyError) as e:
+                # a malformed answer for one tile is a miss there, the other tiles still count
+                logger.warning(f"Could not decode response: {e}")
+                continue
+            if ymin == 0 and xmin == 0 and xmax == 0 and ymax == 0:
+                continue
+
+            left, top, right, bottom = coordinates
+            scale_y = (bottom - top) / self.OUTPUT_HEIGHT
+            scale_x = (right - left) / self.OUTPUT_WIDTH
+            box = (
+                top + ymin * scale_y,
+                left + xmin * scale_x,
+                top + ymax * scale_y,
+                left + xmax * scale_x,
+            )
+            if truncated(box, coordinates, frame_box):
+                confidence *= TRUNCATED_PENALTY
+            detections.append(Detection(box, confidence))
+
+        best = best_detection(detections)
+        if best is None:
+            return "0,0,0,0"
+        return ",".join(map(str, map(int, best.box)))
 
     def scale_coordinates(self, coordinates: List[int]) -> List[int]:
-        try:
-            # Execute adb shell command to get the screen size
-            result = subprocess.run(["adb", "shell", "wm", "size"], stdout=subprocess.PIPE)
-            output = result.stdout.decode()
-            # Example output format: 'Physical size: 1080x1920'
-            match = re.search(r"Physical size: (\d+)x(\d+)", output)
-            if match:
-                screen_x, screen_y = map(int, match.groups())
-            else:
-                raise Exception("Failed to parse screen size from adb output.")
-        except Exception as e:
-            # Attempt to get screen size using pyautogui (for desktops)
-            import pyautogui
-            screen_x, screen_y = pyautogui.size()
+        # cached by the executor, so scaling never waits on adb or the window server
+        screen_x, screen_y = self.executor.screen_size
 
-        print(f"Screen size: x y {screen_x} {screen_y}")
+        logger.debug(f"Screen size: x y {screen_x} {screen_y}")
         scaling_x = screen_x / self.IMAGE_WIDTH
         scaling_y = screen_y / self.IMAGE_HEIGHT
         coordinates[0] = int(coordinates[0] * scaling_y)
@@ -127,3 +530,20 @@ class BaseFinder(ABC):
             coordinates[2], coordinates[3] = coordinates[3], coordinates[2]
 
         return coordinates
+
+
+def configure_finder(finder: BaseFinder, config) -> BaseFinder:
+    """Applies the config's FINDER_* and image settings to ``finder``."""
+    # sessions copy the finder, so they all share this cache
+    finder.element_cache = ElementCache.from_config(config)
+    finder.use_hierarchy = config.FINDER_USE_HIERARCHY
+    finder.hierarchy_min_score = config.FINDER_HIERARCHY_MIN_SCORE
+    finder_config = config.models.get("finder_config") or {}
+    finder.tiles = finder_config.get("tiles", config.FINDER_TILES)
+    finder.tile_overlap = config.FINDER_TILE_OVERLAP
+    finder.tile_workers = config.FINDER_TILE_WORKERS
+    finder.coarse_size = finder_config.get("coarse_size", config.FINDER_COARSE_SIZE)
+    finder.refine_size = finder_config.get("refine_size", config.FINDER_REFINE_SIZE)
+    finder.refine_margin = config.FINDER_REFINE_MARGIN
+    finder.codec = ImageCodec.from_config(config, "finder_config", max_dimension=False)
+    return finder
@@ -1,11 +1,22 @@
 import anthropic
-from . import BaseFinder, FinderResponseLLM
+from . import BaseFinder, FinderResponseLLM, elements_schema, logger
 from clickclickclick.config import BaseConfig
 from clickclickclick.executor import Executor
-from tempfile import NamedTemporaryFile
 import json
 
 
+COORDINATES_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "ymin": {"type": "integer", "description": "Top coordinate"},
+        "ymax": {"type": "integer", "description": "Bottom coordinate"},
+        "xmin": {"type": "integer", "description": "Left coordinate"},
+        "xmax": {"type": "integer", "description": "Right coordinate"}
+    },
+    "required": ["ymin", "ymax", "xmin", "xmax"]
+}
+
+
 class AnthropicFinder(BaseFinder):
 
     def __init__(self, c: BaseConfig, executor: Executor):
@@ -13,6 +24,7 @@ class AnthropicFinder(BaseFinder):
         system_prompt = prompts["finder-system-prompt"]
         finder_config = c.models.get("finder_config")
         self.element_finder_prompt = c.element_finder_prompt
+        self.elements_finder_prompt = c.elements_finder_prompt
         self.IMAGE_WIDTH = finder_config.get("image_width")
         self.IMAGE_HEIGHT = finder_config.get("image_height")
         self.OUTPUT_WIDTH = finder_config.get("output_width")
@@ -21,16 +33,21 @@ class AnthropicFinder(BaseFinder):
         model_name = finder_config.get("model_name")
         generation_config = finder_config.get("generation_config")
         super().__init__(api_key, model_name, generation_config, system_prompt, executor)
-        self.client = anthropic.Anthropic(api_key=api_key)
-
-    def process_segment(self, segment, model_name, prompt):
-        segment_image, coordinates = segment
-
-        with NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-            segment_image.save(temp_file, format="PNG")
-            temp_file_path = temp_file.name
+        base_url = finder_config.get("base_url") or None
+        self.client = anthropic.Anthropic(api_key=api_key, base_url=base_url)
+        self.async_client = anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url)
+        # the system prompt and tool are the same for every element, cache them
+        self.system = [{"type": "text", "text": system_prompt}]
+        if finder_config.get("prompt_cache", True):
+            self.system[0]["cache_control"] = {"type": "ephemeral"}
 
-        encoded_image = self.encode_image_to_base64(temp_file_path)
+    def _request(self, segment, model_name, prompt, batch=False) -> dict:
+        segment_frame, coordinates = segment
+        encoded_image = self.codec.base64(segment_frame)
+        if batch:
+            text = self.elements_finder_prompt(prompt)
+        else:
+            text = self.element_finder_prompt(prompt)
 
         # Create the message with image and text
         message = {
@@ -40,53 +57,88 @@ class AnthropicFinder(BaseFinder):
                     "type": "image",
                     "source": {
                         "type": "base64",
-                        "media_type": "image/png",
+                        "media_type": self.codec.mime_type(segment_frame),
                         "data": encoded_image,
                     },
                 },
-                {"type": "text", "text": self.element_finder_prompt(prompt)},
+                {"type": "text", "text": text},
             ],
         }
 
-        # Define the response schema as a tool
-        tools = [
-            {
-                "name": "return_coordinates",
-                "description": "Return the bounding box coordinates of the found element",
-                "input_schema": {
-                    "type": "object",
-                    "properties": {
-                        "ymin": {"type": "integer", "description": "Top coordinate"},
-                        "ymax": {"type": "integer", "description": "Bottom coordinate"},
-                        "xmin": {"type": "integer", "description": "Left coordinate"},
-                        "xmax": {"type": "integer", "description": "Right coordinate"}
-                    },
-                    "required": ["ymin", "ymax", "xmin", "xmax"]
+        # Define the response schema as a tool, a batch returns a list of boxes in prompt order
+        if batch:
+            tools = [
+                {
+                    "name": "return_coordinates",
+                    "description": "Return the bounding box coordinates of every element, in order",
+                    "input_schema": elements_schema(COORDINATES_SCHEMA)
+                }
+            ]
+        else:
+            tools = [
+                {
+                    "name": "return_coordinates",
+                    "description": "Return the bounding box coordinates of the found element",
+                    "input_schema": COORDINATES_SCHEMA
                 }
-            }
-        ]
+            ]
 
+        return dict(
+            model=model_name,
+            max_tokens=1024,
+            system=self.system,
+            messages=[message],
+            tools=tools,
+            tool_choice={"type": "tool", "name": "return_coordinates"}
+        )
+
+    def process_segment(self, segment, model_name, prompt):
+        coordinates = segment[1]
         try:
-            response = self.client.messages.create(
-                model=model_name,
-                max_tokens=1024,
-                system=self.system_prompt,
-                messages=[message],
-                tools=tools,
-                tool_choice={"type": "tool", "name": "return_coordinates"}
-            )
+            response = self.client.messages.create(**self._request(segment, model_name, prompt))
+            return self._handle_response(response, coordinates)
+        except Exception as e:
+            logger.warning(f"Error processing segment: {e}")
+            return ('{"ymin": 0, "xmin": 0, "ymax": 0, "xmax": 0}', coordinates)
 
-            # Extract tool use from response
-            for content in response.content:
-                if content.type == "tool_use" and content.name == "return_coordinates":
-                    coords = content.input
-                    response_text = json.dumps(coords)
-                    print(response_text, " resp text")
-                    return (response_text, coordinates)
-            
-            # Fallback if no tool use found
+    async def process_segment_async(self, segment, model_name, prompt):
+        coordinates = segment[1]
+        try:
+            request = self._request(segment, model_name, prompt)
+            response = await self.async_client.messages.create(**request)
+            return self._handle_response(response, coordinates)
+        except Exception as e:
+            logger.warning(f"Error processing segment: {e}")
             return ('{"ymin": 0, "xmin": 0, "ymax": 0, "xmax": 0}', coordinates)
-            
+
+    def process_segment_batch(self, segment, model_name, prompts):
+        coordinates = segment[1]
+        try:
+            request = self._request(segment, model_name, prompts, batch=True)
+            return self._handle_response(self.client.messages.create(**request), coordinates)
         except Exception as e:
-            print("Error processing segment:", e)
-            return ('{"ymin": 0, "xmin": 0, "ymax": 0, "xmax": 0}', coordinates) 
\ No newline at end of file
+            logger.warning(f"Error processing segment: {e}")
+            return ('{"elements": []}', coordinates)
+
+    async def process_segment_batch_async(self, segment, model_name, prompts):
+        coordinates = segment[1]
+        try:
+            request = self._request(segment, model_name, prompts, batch=True)
+            response = await self.async_client.messages.create(**request)
+            return self._handle_response(response, coordinates)
+        except Exception as e:
+            logger.warning(f"Error processing segment: {e}")
+            return ('{"elements": []}', coordinates)
+
+    def _handle_response(self, response, coordinates):
+        self.cache_stats.record_anthropic(response.usage)
+        # Extract tool use from response
+        for content in response.content:
+            if content.type == "tool_use" and content.name == "return_coordinates":
+                coords = content.input
+                response_text = json.dumps(coords)
+                logger.debug(f"{response_text} resp text")
+                return (response_text, coordinates)
+
+        # Fallback if no tool use found
+        return ('{"ymin": 0, "xmin": 0, "ymax": 0, "xmax": 0}', coordinates)
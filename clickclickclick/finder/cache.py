@@ -0,0 +1,128 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from PIL import Image
+
+from clickclickclick.screen import Frame, hamming_distance
+
+NO_ELEMENT = "0,0,0,0"
+# words that don't change which element is meant
+FILLER_WORDS = {"a", "an", "the", "button", "icon"}
+# pixels around a hit that have to look the same for the cached box to be reused
+REGION_MARGIN = 4
+REGION_THUMBNAIL = 8
+# largest grey level difference between the cached and the current area
+REGION_TOLERANCE = 24
+
+
+def normalize_prompt(prompt: str) -> str:
+    words = re.sub(r"[^\w\s]", " ", prompt.lower()).split()
+    return " ".join(word for word in words if word not in FILLER_WORDS) or prompt.lower()
+
+
+def region_thumbnail(frame: Frame, bounds: str) -> Optional[bytes]:
+    """Small grey thumbnail of the area around a ymin,xmin,ymax,xmax box, None if it's empty."""
+    ymin, xmin, ymax, xmax = map(int, bounds.split(","))
+    width, height = frame.size
+    box = (
+        max(0, xmin - REGION_MARGIN),
+        max(0, ymin - REGION_MARGIN),
+        min(width, xmax + REGION_MARGIN),
+        min(height, ymax + REGION_MARGIN),
+    )
+    if box[0] >= box[2] or box[1] >= box[3]:
+        return None
+    size = (REGION_THUMBNAIL, REGION_THUMBNAIL)
+    return frame.image.crop(box).resize(size, Image.Resampling.BOX).convert("L").tobytes()
+
+
+def same_region(a: bytes, b: bytes) -> bool:
+    return max(abs(x - y) for x, y in zip(a, b)) <= REGION_TOLERANCE
+
+
+class ElementCache:
+    """
+    LRU cache of element bounds keyed by the screen's fingerprint and the element prompt.
+
+    A screen matches when its fingerprint is within ``max_distance`` bits of the cached one
+    and the area around the cached box still looks the same, so a changed clock in the
+    status bar still hits but a scrolled list or a moved element doesn't. Entries expire
+    after ``ttl`` seconds.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 300, max_distance: int = 8):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        # (prompt, screen fingerprint) -> (bounds, region thumbnail, stored at, model seconds)
+        self._entries: "OrderedDict[Tuple[str, int], tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @classmethod
+    def from_config(cls, c) -> Optional["ElementCache"]:
+        if not c.FINDER_CACHE_SIZE:
+            return None
+        return cls(c.FINDER_CACHE_SIZE, c.FINDER_CACHE_TTL, c.FINDER_CACHE_MAX_DISTANCE)
+
+    def _lookup(self, prompt: str, fingerprint: int) -> Optional[tuple]:
+        key = (prompt, fingerprint)
+        if key in self._entries:
+            return key
+        # the caches are small, a scan for a near match is cheaper than any model call
+        for candidate in self._entries:
+            if candidate[0] == prompt and (
+                hamming_distance(candidate[1], fingerprint) <= self.max_distance
+            ):
+                return candidate
+        return None
+
+    def get(self, frame: Frame, prompt: str) -> Optional[str]:
+        """The cached bounds of ``prompt`` on this screen, or None on a miss."""
+        prompt = normalize_prompt(prompt)
+        now = time.monotonic()
+        with self._lock:
+            key = self._lookup(prompt, frame.fingerprint)
+            if key is not None:
+                bounds, region, stored_at, seconds = self._entries[key]
+                if now - stored_at > self.ttl:
+                    del self._entries[key]
+                elif same_region(region_thumbnail(frame, bounds), region):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.saved_seconds += seconds
+                    return bounds
+            self.misses += 1
+            return None
+
+    def put(self, frame: Frame, prompt: str, bounds: str, seconds: float = 0.0):
+        """Stores the bounds the model found, ``seconds`` is what the model call took."""
+        if bounds == NO_ELEMENT:
+            # "not found" is often a loading screen, asking again is the right thing to do
+            return
+        region = region_thumbnail(frame, bounds)
+        if region is None:
+            return
+        key = (normalize_prompt(prompt), frame.fingerprint)
+        with self._lock:
+            self._entries[key] = (bounds, region, time.monotonic(), seconds)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
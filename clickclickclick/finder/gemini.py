@@ -1,18 +1,20 @@
 import google.generativeai as genai
-from . import BaseFinder
+from . import BaseFinder, elements_schema, logger
 from clickclickclick.config import BaseConfig
 from clickclickclick.executor import Executor
-from tempfile import NamedTemporaryFile
-from PIL import Image
+from clickclickclick.planner.gemini import configure_client
 
 
 class GeminiFinder(BaseFinder):
+    # requests go over REST to a configured base_url, see configure_client
+    rest_transport = False
 
     def __init__(self, c: BaseConfig, executor: Executor):
         prompts = c.prompts
         system_prompt = prompts["finder-system-prompt"]
         finder_config = c.models.get("finder_config")
         self.element_finder_prompt = c.element_finder_prompt
+        self.elements_finder_prompt = c.elements_finder_prompt
         self.IMAGE_WIDTH = finder_config.get("image_width")
         self.IMAGE_HEIGHT = finder_config.get("image_height")
         self.OUTPUT_WIDTH = finder_config.get("output_width")
@@ -21,33 +23,94 @@ class GeminiFinder(BaseFinder):
         model_name = finder_config.get("model_name")
         generation_config = finder_config.get("generation_config")
         super().__init__(api_key, model_name, generation_config, system_prompt, executor)
-        genai.configure(api_key=api_key)
+        self.rest_transport = configure_client(finder_config)
         self.model = genai.GenerativeModel(
             model_name=model_name,
             generation_config=generation_config,
             system_instruction=system_prompt,
         )
 
+    def _image_part(self, frame) -> dict:
+        # the frame's cached encoding, the SDK would re-encode a PIL image on every attempt
+        return {"mime_type": self.codec.mime_type(frame), "data": self.codec.encode(frame)}
+
     def process_segment(self, segment, model, prompt, retries=3):
         attempt = 0
-        segment_image, coordinates = segment
+        segment_frame, coordinates = segment
+        image_part = self._image_part(segment_frame)
         while attempt < retries:
             try:
-                with NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-                    segment_image.save(temp_file, format="PNG")
-                    temp_file_path = temp_file.name
-
-                with Image.open(temp_file_path) as segment_image:
-                    response = self.model.generate_content(
-                        [segment_image, self.element_finder_prompt(prompt)]
-                    )
-                    response_text = response.text
-                    print(response_text, " resp text")
-                    return (response_text, coordinates)
+                response = self.model.generate_content(
+                    [image_part, self.element_finder_prompt(prompt)]
+                )
+                self.cache_stats.record_gemini(response.usage_metadata)
+                response_text = response.text
+                logger.debug(f"{response_text} resp text")
+                return (response_text, coordinates)
             except Exception as e:
-                # Log the exception or handle it as necessary
-                print(f"Attempt {attempt + 1} failed with exception: {e}")
+                logger.warning(f"Attempt {attempt + 1} failed with exception: {e}")
 
                 # Increment the attempt counter
                 attempt += 1
         raise Exception("Failed to process segment after several retries")
+
+    async def process_segment_async(self, segment, model, prompt, retries=3):
+        if self.rest_transport:
+            return await super().process_segment_async(segment, model, prompt)
+        segment_frame, coordinates = segment
+        image_part = self._image_part(segment_frame)
+        for attempt in range(retries):
+            try:
+                response = await self.model.generate_content_async(
+                    [image_part, self.element_finder_prompt(prompt)]
+                )
+                self.cache_stats.record_gemini(response.usage_metadata)
+                response_text = response.text
+                logger.debug(f"{response_text} resp text")
+                return (response_text, coordinates)
+            except Exception as e:
+                logger.warning(f"Attempt {attempt + 1} failed with exception: {e}")
+        raise Exception("Failed to process segment after several retries")
+
+    def _batch_generation_config(self, prompts) -> dict:
+        # merged into the model's generation config for this request only
+        generation_config = {
+            "response_mime_type": "application/json",
+            "response_schema": elements_schema(),
+        }
+        max_output_tokens = (self.generation_config or {}).get("max_output_tokens")
+        if max_output_tokens:
+            generation_config["max_output_tokens"] = max_output_tokens * len(prompts)
+        return generation_config
+
+    def process_segment_batch(self, segment, model, prompts, retries=3):
+        segment_frame, coordinates = segment
+        image_part = self._image_part(segment_frame)
+        for attempt in range(retries):
+            try:
+                response = self.model.generate_content(
+                    [image_part, self.elements_finder_prompt(prompts)],
+                    generation_config=self._batch_generation_config(prompts),
+                )
+                self.cache_stats.record_gemini(response.usage_metadata)
+                return (response.text, coordinates)
+            except Exception as e:
+                logger.warning(f"Attempt {attempt + 1} failed with exception: {e}")
+        raise Exception("Failed to process segment after several retries")
+
+    async def process_segment_batch_async(self, segment, model, prompts, retries=3):
+        if self.rest_transport:
+            return await super().process_segment_batch_async(segment, model, prompts)
+        segment_frame, coordinates = segment
+        image_part = self._image_part(segment_frame)
+        for attempt in range(retries):
+            try:
+                response = await self.model.generate_content_async(
+                    [image_part, self.elements_finder_prompt(prompts)],
+                    generation_config=self._batch_generation_config(prompts),
+                )
+                self.cache_stats.record_gemini(response.usage_metadata)
+                return (response.text, coordinates)
+            except Exception as e:
+                logger.warning(f"Attempt {attempt + 1} failed with exception: {e}")
+        raise Exception("Failed to process segment after several retries")
@@ -0,0 +1,136 @@
+import re
+import xml.etree.ElementTree as ElementTree
+from collections import defaultdict
+from dataclasses import dataclass
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+
+from .cache import normalize_prompt
+
+BOUNDS_PATTERN = re.compile(r"\[(-?\d+),(-?\d+)\]\[(-?\d+),(-?\d+)\]")
+# two matches closer than this are too ambiguous to pick one without looking at the screen
+AMBIGUITY_MARGIN = 0.05
+
+
+@dataclass
+class UINode:
+    """An element of a ``uiautomator dump``, bounds are (left, top, right, bottom) pixels."""
+
+    text: str
+    content_desc: str
+    resource_id: str
+    class_name: str
+    clickable: bool
+    bounds: Tuple[int, int, int, int]
+
+    @property
+    def labels(self) -> List[str]:
+        """Normalized names a prompt can refer to this element by."""
+        labels = [self.text, self.content_desc]
+        if self.resource_id:
+            # com.android.settings:id/search_bar -> search bar
+            labels.append(self.resource_id.rsplit("/", 1)[-1].replace("_", " "))
+        return [normalize_prompt(label) for label in labels if label and label.strip()]
+
+    @property
+    def visible(self) -> bool:
+        left, top, right, bottom = self.bounds
+        return right > left and bottom > top
+
+
+def parse_bounds(bounds: str) -> Optional[Tuple[int, int, int, int]]:
+    match = BOUNDS_PATTERN.fullmatch(bounds.strip())
+    if match is None:
+        return None
+    return tuple(map(int, match.groups()))
+
+
+def parse_hierarchy(xml: str) -> List[UINode]:
+    """Parses ``uiautomator dump`` output, skipping elements without usable bounds."""
+    # the dump to /dev/tty is followed by "UI hierchary dumped to: /dev/tty"
+    xml = xml[xml.find("<") : xml.rfind(">") + 1]
+    nodes = []
+    for element in ElementTree.fromstring(xml).iter("node"):
+        bounds = parse_bounds(element.get("bounds", ""))
+        if bounds is None:
+            continue
+        node = UINode(
+            text=element.get("text", ""),
+            content_desc=element.get("content-desc", ""),
+            resource_id=element.get("resource-id", ""),
+            class_name=element.get("class", ""),
+            clickable=element.get("clickable") == "true",
+            bounds=bounds,
+        )
+        if node.visible and node.labels:
+            nodes.append(node)
+    return nodes
+
+
+def score(label: str, prompt: str) -> float:
+    if label == prompt:
+        return 1.0
+    return SequenceMatcher(None, label, prompt).ratio()
+
+
+class UIIndex:
+    """
+    Labels of a UI hierarchy indexed for fuzzy lookups by a finder prompt.
+
+    Exact labels are a dict lookup; otherwise only elements sharing a word with the prompt
+    are scored, so a lookup never walks the whole tree.
+    """
+
+    def __init__(self, nodes: List[UINode]):
+        self.nodes = nodes
+        self._exact: Dict[str, List[int]] = defaultdict(list)
+        self._words: Dict[str, Set[int]] = defaultdict(set)
+        for i, node in enumerate(nodes):
+            for label in node.labels:
+                self._exact[label].append(i)
+                for word in label.split():
+                    self._words[word].add(i)
+
+    @classmethod
+    def from_xml(cls, xml: str) -> "UIIndex":
+        return cls(parse_hierarchy(xml))
+
+    def _candidates(self, prompt: str) -> Set[int]:
+        if prompt in self._exact:
+            return set(self._exact[prompt])
+        candidates = set()
+        for word in prompt.split():
+            candidates |= self._words.get(word, set())
+        return candidates
+
+    def find(self, prompt: str, min_score: float = 0.8) -> Optional[UINode]:
+        """The element best matching ``prompt``, None if nothing or more than one matches."""
+        prompt = normalize_prompt(prompt)
+        scored = []
+        for i in self._candidates(prompt):
+            node = self.nodes[i]
+            best = max(score(label, prompt) for label in node.labels)
+            if best >= min_score:
+                # a clickable element wins over a label inside it with the same score
+                scored.append((best, node.clickable, node))
+        if not scored:
+            return None
+        scored.sort(key=lambda item: item[:2], reverse=True)
+        best_score, _, best = scored[0]
+        for other_score, _, other in scored[1:]:
+            if best_score - other_score >= AMBIGUITY_MARGIN:
+                break
+            if not _contains(best.bounds, other.bounds) and not _contains(
+                other.bounds, best.bounds
+            ):
+                return None
+        return best
+
+
+def _contains(outer: Tuple[int, int, int, int], inner: Tuple[int, int, int, int]) -> bool:
+    return (
+        outer[0] <= inner[0]
+        and outer[1] <= inner[1]
+        and outer[2] >= inner[2]
+        and outer[3] >= inner[3]
+    )
@@ -1,36 +1,32 @@
 from clickclickclick.config import BaseConfig
-from . import BaseFinder, logger
-from ollama import Client
+from . import BaseFinder, elements_schema, logger
+from ollama import AsyncClient, Client
 from clickclickclick.executor import Executor
-from tempfile import NamedTemporaryFile
 
 
 class OllamaFinder(BaseFinder):
 
     def __init__(self, c: BaseConfig, executor: Executor, host=None):
-        if host is None:
-            host = "http://localhost:11434"
+        finder_config = c.models.get("finder_config")
+        # the client falls back to OLLAMA_HOST, then to http://localhost:11434
+        host = host or finder_config.get("host") or None
         self.client = Client(host=host)
+        self.async_client = AsyncClient(host=host)
 
         self.executor = executor
         prompts = c.prompts
         self.element_finder_prompt = c.element_finder_prompt
+        self.elements_finder_prompt = c.elements_finder_prompt
         self.system_prompt = prompts["finder-system-prompt"]
-        finder_config = c.models.get("finder_config")
         self.IMAGE_WIDTH = finder_config.get("image_width")
         self.IMAGE_HEIGHT = finder_config.get("image_height")
         self.OUTPUT_WIDTH = finder_config.get("output_width")
         self.OUTPUT_HEIGHT = finder_config.get("output_height")
         self.model_name = finder_config.get("model_name")
 
-    def process_segment(self, segment, model_name, prompt):
-        segment_image, coordinates = segment
-
-        with NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-            segment_image.save(temp_file, format="PNG")
-            temp_file_path = temp_file.name
-
-        response = self.client.chat(
+    def _request(self, segment, prompt, text=None) -> dict:
+        segment_frame, coordinates = segment
+        return dict(
             model=self.model_name,
             messages=[
                 {
@@ -39,15 +35,38 @@ class OllamaFinder(BaseFinder):
                 },
                 {
                     "role": "user",
-                    "content": self.element_finder_prompt(prompt),
-                    "images": [temp_file_path],
+                    "content": text or self.element_finder_prompt(prompt),
+                    "images": [self.codec.encode(segment_frame)],
                 },
             ],
         )
+
+    def process_segment(self, segment, model_name, prompt):
+        response = self.client.chat(**self._request(segment, prompt))
+        return self._handle_response(response, segment[1])
+
+    async def process_segment_async(self, segment, model_name, prompt):
+        response = await self.async_client.chat(**self._request(segment, prompt))
+        return self._handle_response(response, segment[1])
+
+    def _batch_request(self, segment, prompts) -> dict:
+        # constrain the answer to the batch schema instead of trusting the prompt alone
+        request = self._request(segment, None, text=self.elements_finder_prompt(prompts))
+        return dict(request, format=elements_schema())
+
+    def process_segment_batch(self, segment, model_name, prompts):
+        response = self.client.chat(**self._batch_request(segment, prompts))
+        return self._handle_response(response, segment[1])
+
+    async def process_segment_batch_async(self, segment, model_name, prompts):
+        response = await self.async_client.chat(**self._batch_request(segment, prompts))
+        return self._handle_response(response, segment[1])
+
+    def _handle_response(self, response, coordinates):
         try:
             response_text = response["message"]["content"]
             logger.debug(response_text)
             return (response_text, coordinates)
-        except Exception as e:
-            logger.error("Error processing segment:", e)
+        except Exception:
+            logger.exception("Error processing segment")
             return ("", coordinates)
@@ -6,7 +6,6 @@ try:
     from mlx_vlm.utils import load_config
 except Exception as e:
     print(f"warn: mlx-vlm import issue {e}")
-from tempfile import NamedTemporaryFile
 import re
 import json
 import os
@@ -92,13 +91,11 @@ class MLXFinder(BaseFinder):
     # Example usage
     def process_segment(self, segment, model_name, prompt):
         prompt = f'UI bounds of "{prompt}" as ymin=,ymax=,xmin=,xmax= format strictly.  '
-        segment_image, coordinates = segment
-        with NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-            segment_image.save(temp_file, format="PNG")
-            temp_file_path = temp_file.name
-            response_text = self.process_image(temp_file_path, prompt)
-            response_json_str = extract_coordinates(response_text)
+        segment_frame, coordinates = segment
+        # mlx-vlm loads images from a path
+        response_text = self.process_image(self.codec.path(segment_frame), prompt)
+        response_json_str = extract_coordinates(response_text)
 
-            return (response_json_str, coordinates)
+        return (response_json_str, coordinates)
 
 # Example instantiation and usage would resemble how you manage the base classes and client interactions.
\ No newline at end of file
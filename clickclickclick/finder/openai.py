@@ -1,8 +1,8 @@
 import openai
-from . import BaseFinder, FinderResponseLLM
+from . import BaseFinder, FinderElementsResponseLLM, FinderResponseLLM, logger
 from clickclickclick.config import BaseConfig
 from clickclickclick.executor import Executor
-from tempfile import NamedTemporaryFile
+from clickclickclick.planner.openai import make_async_client
 
 
 class OpenAIFinder(BaseFinder):
@@ -12,6 +12,7 @@ class OpenAIFinder(BaseFinder):
         system_prompt = prompts["finder-system-prompt"]
         finder_config = c.models.get("finder_config")
         self.element_finder_prompt = c.element_finder_prompt
+        self.elements_finder_prompt = c.elements_finder_prompt
         self.IMAGE_WIDTH = finder_config.get("image_width")
         self.IMAGE_HEIGHT = finder_config.get("image_height")
         self.OUTPUT_WIDTH = finder_config.get("output_width")
@@ -27,17 +28,24 @@ class OpenAIFinder(BaseFinder):
         base_url = finder_config.get("base_url")
         if base_url:
             openai.base_url = base_url
+        self.finder_config = finder_config
+        self._async_client = None
 
-    def process_segment(self, segment, model_name, prompt):
-        segment_image, coordinates = segment
-
-        with NamedTemporaryFile(delete=False, suffix=".png") as temp_file:
-            segment_image.save(temp_file, format="PNG")
-            temp_file_path = temp_file.name
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = make_async_client(self.finder_config)
+        return self._async_client
 
-        encoded_image = self.encode_image_to_base64(temp_file_path)
+    def _request(
+        self, segment, model_name, prompt, text=None, response_format=FinderResponseLLM
+    ) -> dict:
+        segment_frame, coordinates = segment
+        image_url = self.codec.data_url(segment_frame)
+        if text is None:
+            text = self.element_finder_prompt(prompt)
 
-        response = openai.beta.chat.completions.parse(
+        return dict(
             model=model_name,
             messages=[
                 {"role": "system", "content": self.system_prompt},
@@ -48,19 +56,49 @@ class OpenAIFinder(BaseFinder):
                             "type": "image_url",
                             "image_url": {
                                 "detail": "low",
-                                "url": f"data:image/png;base64,{encoded_image}",
+                                "url": image_url,
                             },
                         },
-                        {"type": "text", "text": self.element_finder_prompt(prompt)},
+                        {"type": "text", "text": text},
                     ],
                 },
             ],
-            response_format=FinderResponseLLM,
+            response_format=response_format,
         )
+
+    def _batch_request(self, segment, model_name, prompts) -> dict:
+        return self._request(
+            segment,
+            model_name,
+            None,
+            text=self.elements_finder_prompt(prompts),
+            response_format=FinderElementsResponseLLM,
+        )
+
+    def process_segment(self, segment, model_name, prompt):
+        response = openai.beta.chat.completions.parse(**self._request(segment, model_name, prompt))
+        return self._handle_response(response, segment[1])
+
+    async def process_segment_async(self, segment, model_name, prompt):
+        request = self._request(segment, model_name, prompt)
+        response = await self.async_client.beta.chat.completions.parse(**request)
+        return self._handle_response(response, segment[1])
+
+    def process_segment_batch(self, segment, model_name, prompts):
+        request = self._batch_request(segment, model_name, prompts)
+        return self._handle_response(openai.beta.chat.completions.parse(**request), segment[1])
+
+    async def process_segment_batch_async(self, segment, model_name, prompts):
+        request = self._batch_request(segment, model_name, prompts)
+        response = await self.async_client.beta.chat.completions.parse(**request)
+        return self._handle_response(response, segment[1])
+
+    def _handle_response(self, response, coordinates):
+        self.cache_stats.record_openai(getattr(response, "usage", None))
         try:
             response_text = response.choices[0].message.content
-            print(response_text, " resp text")
+            logger.debug(f"{response_text} resp text")
             return (response_text, coordinates)
-        except Exception as e:
-            print("Error processing segment:", e)
+        except Exception:
+            logger.exception("Error processing segment")
             return ("", coordinates)
@@ -0,0 +1,84 @@
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+Box = Tuple[float, float, float, float]
+# a detection this close to a tile edge that isn't the screen edge is probably cut off
+EDGE_MARGIN = 0.01
+TRUNCATED_PENALTY = 0.5
+
+
+def tile_boxes(width: int, height: int, tiles: int, overlap: float = 0.15) -> List[Box]:
+    """
+    ``tiles`` overlapping (left, top, right, bottom) boxes along the long side of the screen.
+
+    Consecutive tiles share ``overlap`` of their length, so an element cut by one tile's edge
+    is whole in its neighbour. On a 1080x2400 phone three tiles are about 1080x960, close to
+    the square images the finder models expect.
+    """
+    if tiles <= 1:
+        return [(0, 0, width, height)]
+    length = max(width, height)
+    tile = length / (tiles - (tiles - 1) * overlap)
+    step = tile * (1 - overlap)
+    spans = [(i * step, min(length, i * step + tile)) for i in range(tiles)]
+    if width >= height:
+        return [(start, 0, end, height) for start, end in spans]
+    return [(0, start, width, end) for start, end in spans]
+
+
+@dataclass
+class Detection:
+    """A box in full screen image space, (ymin, xmin, ymax, xmax) like the finder output."""
+
+    box: Box
+    confidence: float = 1.0
+    # boxes of the same element found by other tiles
+    support: float = 0.0
+
+    @property
+    def score(self) -> float:
+        return self.confidence + self.support
+
+
+def iou(a: Box, b: Box) -> float:
+    ymin, xmin = max(a[0], b[0]), max(a[1], b[1])
+    ymax, xmax = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0.0, ymax - ymin) * max(0.0, xmax - xmin)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def truncated(box: Box, tile: Box, frame: Box) -> bool:
+    """Whether ``box`` touches an edge of its (left, top, right, bottom) tile inside the frame."""
+    left, top, right, bottom = tile
+    margin_y = (bottom - top) * EDGE_MARGIN
+    margin_x = (right - left) * EDGE_MARGIN
+    return (
+        (top > frame[1] and box[0] - top <= margin_y)
+        or (bottom < frame[3] and bottom - box[2] <= margin_y)
+        or (left > frame[0] and box[1] - left <= margin_x)
+        or (right < frame[2] and right - box[3] <= margin_x)
+    )
+
+
+def non_max_suppression(detections: List[Detection], threshold: float = 0.5) -> List[Detection]:
+    """
+    Keeps the most confident detection of every group overlapping by ``threshold`` IoU or more.
+
+    Suppressed detections count as support for the one that kept them, so an element found
+    by two overlapping tiles beats one that only a single tile saw.
+    """
+    kept: List[Detection] = []
+    for detection in sorted(detections, key=lambda d: d.confidence, reverse=True):
+        for keeper in kept:
+            if iou(keeper.box, detection.box) >= threshold:
+                keeper.support += detection.confidence
+                break
+        else:
+            kept.append(detection)
+    return sorted(kept, key=lambda d: d.score, reverse=True)
+
+
+def best_detection(detections: List[Detection], threshold: float = 0.5) -> Optional[Detection]:
+    kept = non_max_suppression(detections, threshold)
+    return kept[0] if kept else None
@@ -0,0 +1,256 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Generator, List, Optional
+from clickclickclick.screen.store import default_store
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+TIMED_OUT = "timed_out"
+FINISHED_STATES = (SUCCEEDED, FAILED, CANCELLED, TIMED_OUT)
+# seconds a stopped job waits for the step running on its worker thread before leaving it
+STOP_GRACE = 5.0
+
+
+class QueueFull(Exception):
+    """Raised when a job is submitted while the queue is at capacity."""
+
+
+class Job:
+    """A submitted task, its status and the events it produced so far."""
+
+    def __init__(self, request: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        # set once the job is cancelled or timed out, checked by the task on its worker thread
+        self.stop = threading.Event()
+        # task level statistics the handler wants to report, e.g. prompt cache hits
+        self.stats: Dict[str, Any] = {}
+        self.events: List[Dict[str, Any]] = []
+        self._changed = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATES
+
+    async def publish(self, event: Dict[str, Any]):
+        self.events.append({"job_id": self.id, "time": time.time(), **event})
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def set_status(self, status: str, **details):
+        self.status = status
+        if status == RUNNING:
+            self.started_at = time.time()
+        elif status in FINISHED_STATES:
+            self.finished_at = time.time()
+        await self.publish({"type": "status", "status": status, **details})
+
+    async def stream(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yields every event from the start of the job until it finishes."""
+        index = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: index < len(self.events) or self.finished)
+            while index < len(self.events):
+                index += 1
+                yield self.events[index - 1]
+            if self.finished:
+                return
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "steps": sum(1 for event in self.events if event["type"] == "step"),
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "stats": self.stats,
+        }
+
+
+class JobManager:
+    """
+    Runs submitted jobs on a fixed number of workers.
+
+    Jobs wait in a bounded queue; once it is full ``submit`` raises ``QueueFull`` so callers
+    can push back instead of piling up work. Finished jobs are kept for polling until
+    ``history`` newer ones have finished, their screenshots are deleted with them.
+    """
+
+    def __init__(
+        self,
+        handler: Callable[[Job], Awaitable[Any]],
+        workers: int = 4,
+        queue_size: int = 100,
+        history: int = 1000,
+    ):
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.history = history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+
+    def start(self):
+        self._queue = asyncio.Queue(self.queue_size)
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    @property
+    def queued(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def submit(self, request: Dict[str, Any]) -> Job:
+        job = Job(request)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"{self.queue_size} jobs are already queued")
+        self.jobs[job.id] = job
+        self._prune()
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancels a queued job right away, a running one before its next model call or action."""
+        job = self.jobs.get(job_id)
+        if job is None or job.finished:
+            return job
+        job.cancel_requested = True
+        job.stop.set()
+        if job.status == QUEUED:
+            await job.set_status(CANCELLED)
+        return job
+
+    def _prune(self):
+        finished = [job_id for job_id, job in self.jobs.items() if job.finished]
+        for job_id in finished[: max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+            default_store().discard(job_id)
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.cancel_requested:
+                    continue
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: Job):
+        await job.set_status(RUNNING)
+        try:
+            job.result = await self.handler(job)
+        except asyncio.CancelledError:
+            await job.set_status(CANCELLED)
+            raise
+        except Exception as e:
+            logger.exception(f"Job {job.id} failed")
+            job.error = str(e)
+            await job.set_status(FAILED, error=job.error)
+            return
+        if job.cancel_requested:
+            await job.set_status(CANCELLED)
+        elif job.status == RUNNING:
+            await job.set_status(SUCCEEDED if job.result else FAILED, result=job.result)
+
+
+def _advance(generator: Generator) -> tuple:
+    # StopIteration can't cross a thread boundary, hand back (done, value) instead
+    try:
+        return False, next(generator)
+    except StopIteration as e:
+        return True, e.value
+
+
+async def run_task_generator(job: Job, generator: Generator, timeout: float) -> Any:
+    """
+    Drives ``execute_task_with_generator`` in a worker thread, publishing a step event for
+    every screenshot it yields. Screenshots are kept out of the frame store's ring for as long
+    as the job is.
+
+    The generator should be created with ``stop=job.stop``, it is set once the job is
+    cancelled or times out so the step running on the worker thread sends nothing more to
+    the device. The timeout also covers a step stuck in a model request; the generator is
+    closed once its thread lets go of it, after up to ``STOP_GRACE`` seconds or in the
+    background.
+    """
+    deadline = time.monotonic() + timeout
+    step = 0
+    pending = None
+    try:
+        while True:
+            pending = asyncio.ensure_future(asyncio.to_thread(_advance, generator))
+            try:
+                done, value = await asyncio.wait_for(
+                    asyncio.shield(pending), max(0.0, deadline - time.monotonic())
+                )
+            except asyncio.TimeoutError:
+                logger.warning(f"Job {job.id} did not complete within {timeout}s")
+                await job.set_status(TIMED_OUT)
+                return None
+            pending = None
+            if done:
+                return value
+            for screenshot, observation in value:
+                step += 1
+                await job.publish(
+                    {
+                        "type": "step",
+                        "step": step,
+                        "screenshot": (
+                            default_store().keep(screenshot, f"{job.id}/{step}")
+                            if screenshot
+                            else screenshot
+                        ),
+                        "observation": observation,
+                    }
+                )
+            if job.cancel_requested:
+                return None
+    finally:
+        job.stop.set()
+        await _close_generator(generator, pending)
+
+
+async def _close_generator(generator: Generator, pending: Optional[asyncio.Future]):
+    # close() raises ValueError while the generator runs on the worker thread
+    if pending is not None and not pending.done():
+        try:
+            await asyncio.wait({pending}, timeout=STOP_GRACE)
+        except asyncio.CancelledError:
+            pending.add_done_callback(lambda _: generator.close())
+            raise
+        if not pending.done():
+            logger.warning(f"A stopped task is still busy after {STOP_GRACE}s, leaving it")
+            pending.add_done_callback(lambda _: generator.close())
+            return
+    generator.close()
@@ -0,0 +1,290 @@
+"""
+Counters, gauges and histograms of the task engine, served by the API at ``/metrics`` in the
+Prometheus text exposition format.
+
+Updating a metric takes a lock and a dict lookup. Stage durations come from the task traces
+(see ``clickclickclick.tracing``), which call ``observe_span`` as each span ends, so the
+instrumented code doesn't change. Task totals and token usage are recorded once per task.
+"""
+
+import bisect
+import math
+import os
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple, Union
+from clickclickclick import tracing
+from clickclickclick.config.conf_types import base_dir
+from clickclickclick.config.yaml_loader import load_yaml
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+# the outcome of a task that raised, next to the job states
+ERROR = "error"
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str]) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        if set(labels) != set(self.label_names):
+            raise ValueError(
+                f"{self.name} takes the labels {self.label_names}, got {tuple(labels)}"
+            )
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def samples(self) -> List[Tuple[str, str, float]]:
+        """(name suffix, formatted labels, value) of every sample."""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        lines += [
+            f"{self.name}{suffix}{labels} {_format_value(value)}"
+            for suffix, labels, value in self.samples()
+        ]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        return [("_total", _format_labels(self.label_names, key), value) for key, value in values]
+
+
+class Gauge(Metric):
+    """A gauge set directly or, with ``function``, read when the metrics are collected."""
+
+    type = "gauge"
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._function: Optional[Callable[[], Union[float, Dict[LabelValues, float]]]] = None
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def set_function(self, function: Callable[[], Union[float, Dict[LabelValues, float]]]):
+        """``function`` returns the value, or a value per tuple of label values."""
+        self._function = function
+
+    def samples(self):
+        if self._function is not None:
+            values = self._function()
+            values = values.items() if isinstance(values, dict) else [((), values)]
+        else:
+            with self._lock:
+                values = list(self._values.items())
+        return [("", _format_labels(self.label_names, key), value) for key, value in values]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets: Iterable[float] = ()):
+        super().__init__(name, documentation, labels)
+        self.buckets = sorted(buckets) + [math.inf]
+        # per label values: the count in each bucket (not cumulative), the sum and the count
+        self._values: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = ([0] * len(self.buckets), [0.0, 0])
+            counts, totals = self._values[key]
+            counts[index] += 1
+            totals[0] += value
+            totals[1] += 1
+
+    def count(self, **labels) -> int:
+        values = self._values.get(self._key(labels))
+        return values[1][1] if values else 0
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            values = [
+                (key, list(counts), list(totals)) for key, (counts, totals) in self._values.items()
+            ]
+        for key, counts, (total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.label_names + ("le",), key + (_format_value(bound),))
+                samples.append(("_bucket", labels, cumulative))
+            labels = _format_labels(self.label_names, key)
+            samples += [("_sum", labels, total), ("_count", labels, count)]
+        return samples
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.metrics) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+MODEL_LABELS = ("planner_model", "finder_model")
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+JOBS_QUEUED = REGISTRY.register(Gauge("clickclickclick_jobs_queued", "Jobs waiting for a worker."))
+JOBS_RUNNING = REGISTRY.register(Gauge("clickclickclick_jobs_running", "Jobs being run."))
+DEVICES = REGISTRY.register(
+    Gauge("clickclickclick_devices", "Attached devices by lease state.", ("state",))
+)
+TASKS = REGISTRY.register(
+    Counter(
+        "clickclickclick_tasks",
+        "Finished tasks by outcome, error when the task raised.",
+        MODEL_LABELS + ("serial", "status"),
+    )
+)
+TASK_DURATION = REGISTRY.register(
+    Histogram(
+        "clickclickclick_task_duration_seconds",
+        "Wall time of a task.",
+        MODEL_LABELS + ("serial",),
+        (1, 5, 10, 30, 60, 120, 300, 600, 1200),
+    )
+)
+TASK_STEPS = REGISTRY.register(
+    Histogram(
+        "clickclickclick_task_steps",
+        "Steps (planner turns) per task.",
+        MODEL_LABELS,
+        (1, 2, 3, 5, 8, 13, 21, 34, 55),
+    )
+)
+STAGE_DURATION = REGISTRY.register(
+    Histogram(
+        "clickclickclick_stage_duration_seconds",
+        "Time spent per stage of a task, e.g. planner.llm_response or executor.capture.",
+        ("stage",) + MODEL_LABELS + ("serial",),
+        SECONDS_BUCKETS,
+    )
+)
+MODEL_TOKENS = REGISTRY.register(
+    Counter(
+        "clickclickclick_model_input_tokens",
+        "Input tokens sent to the models, kind is input (all of them) or cached.",
+        ("role", "model", "kind"),
+    )
+)
+ADB_FAILURES = REGISTRY.register(
+    Counter(
+        "clickclickclick_adb_failures",
+        "adb commands that failed, by device and adb command.",
+        ("serial", "command"),
+    )
+)
+
+
+def _declared_tools() -> FrozenSet[str]:
+    """The tool stages, ``tool.<name>``, of the functions declared to the planners."""
+    directory = os.path.join(base_dir, "function_declarations")
+    names = set()
+    for file_name in os.listdir(directory):
+        if file_name.endswith(".yaml"):
+            declarations = load_yaml(os.path.join(directory, file_name))
+            names.update(f"tool.{fn['name']}" for fn in declarations["function_declarations"])
+    return frozenset(names)
+
+
+TOOL_STAGES = _declared_tools()
+
+
+def _stage(name: str) -> str:
+    # the planners can answer with any function name, keep those out of the label values
+    if name.startswith("tool.") and name not in TOOL_STAGES:
+        return "tool.other"
+    return name
+
+
+def _model_labels(trace: tracing.TaskTrace) -> Dict[str, str]:
+    return {name: trace.labels.get(name, "") for name in MODEL_LABELS}
+
+
+def observe_span(trace: tracing.TaskTrace, span: tracing.Span):
+    STAGE_DURATION.observe(
+        span.duration,
+        stage=_stage(span.name),
+        serial=trace.labels.get("serial", ""),
+        **_model_labels(trace),
+    )
+
+
+def record_task(trace: tracing.TaskTrace, status: str, planner=None, finder=None):
+    """Records a finished task: its outcome, duration, steps and the tokens it used."""
+    labels = _model_labels(trace)
+    serial = trace.labels.get("serial", "")
+    durations = trace.durations()
+    TASKS.inc(status=status, serial=serial, **labels)
+    if durations.get("task"):
+        TASK_DURATION.observe(durations["task"][0], serial=serial, **labels)
+    TASK_STEPS.observe(len(durations.get("task.step", [])), **labels)
+    for role, component in (("planner", planner), ("finder", finder)):
+        if component is None:
+            continue
+        stats = component.cache_stats
+        model = labels[f"{role}_model"]
+        MODEL_TOKENS.inc(stats.input_tokens, role=role, model=model, kind="input")
+        MODEL_TOKENS.inc(stats.cached_tokens, role=role, model=model, kind="cached")
+
+
+def record_adb_failure(serial: Optional[str], command: List[str]):
+    ADB_FAILURES.inc(serial=serial or "default", command=command[0] if command else "")
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+tracing.add_observer(observe_span)
@@ -0,0 +1,520 @@
+"""
+A local stand-in for the OpenAI, Anthropic, Gemini and Ollama APIs, for load and throughput
+tests of the task engine without a network or API keys.
+
+It speaks each provider's wire format on the paths the SDKs call:
+
+* OpenAI chat completions at ``/v1/chat/completions`` (``base_url: http://host:port/v1/``)
+* Anthropic messages at ``/v1/messages`` (``base_url: http://host:port``)
+* Gemini ``generateContent`` and ``cachedContents`` at ``/v1beta/...`` over REST
+  (``base_url: http://host:port``)
+* Ollama chat at ``/api/chat`` (``host: http://host:port``)
+
+so the planners and finders run unchanged, through their real clients and HTTP. Planner
+requests are answered with the tool calls of a ``MockScript``, one step per request; tasks
+are told apart by their prompt and a request without an assistant turn starts the script
+again. Finder requests are answered with the scripted box of the element they ask for.
+Every response waits ``latency`` seconds plus up to ``jitter``, and ``error_rate`` of the
+requests fail with ``error_status`` in the provider's error format.
+
+    python -m clickclickclick.mock_provider --port 8090 --latency 800 --error-rate 0.02
+"""
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+import click
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+# (ymin, xmin, ymax, xmax) as fractions of the image the finder was sent
+Box = Tuple[float, float, float, float]
+Action = Tuple[str, dict]
+
+FINISHED: Action = ("task_finished", {"reason": "mock script finished", "observation": "done"})
+DEFAULT_STEPS: List[List[Action]] = [
+    [("find_element_and_click", {"prompt": "Settings", "observation": "the home screen"})],
+    [("swipe_up", {"observation": "the settings list"})],
+    [("find_element_and_click", {"prompt": "Display", "observation": "the settings list"})],
+]
+# the finder's output space of each provider, boxes are scaled to it
+OUTPUT_SIZES = {"openai": (512, 512), "anthropic": (512, 512), "gemini": (1000, 1000)}
+DEFAULT_OUTPUT_SIZE = (1000, 1000)
+ERROR_STATUSES = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE"}
+
+# the element names in the finder prompts, see BaseConfig.element_finder_prompt
+ELEMENT_PATTERN = re.compile(r'If "(.*)" is present')
+ELEMENTS_PATTERN = re.compile(r'^\d+\. "(.*)"$', re.MULTILINE)
+
+
+@dataclass
+class MockScript:
+    """
+    What the mock models answer: the planner's actions per step and the finder's element
+    boxes. Elements that aren't scripted are found at ``default_box``, or not at all if it is
+    None. Once the steps run out the planner finishes the task.
+    """
+
+    steps: List[List[Action]] = field(default_factory=lambda: list(DEFAULT_STEPS))
+    elements: Dict[str, Box] = field(default_factory=dict)
+    default_box: Optional[Box] = (0.45, 0.45, 0.55, 0.55)
+
+    @classmethod
+    def load(cls, path: str) -> "MockScript":
+        with open(path) as file:
+            data = json.load(file)
+        return cls(
+            steps=[[(name, args) for name, args in step] for step in data.get("steps", [])],
+            elements={name: tuple(box) for name, box in data.get("elements", {}).items()},
+            default_box=tuple(data["default_box"]) if data.get("default_box") else None,
+        )
+
+    @classmethod
+    def from_session(cls, session) -> "MockScript":
+        """The actions and elements of a recorded ``clickclickclick.replay.ReplaySession``."""
+        width, height = session.screen_size
+        elements = {}
+        for step in session.steps:
+            for name, (left, top, right, bottom) in step.elements.items():
+                elements[name] = (top / height, left / width, bottom / height, right / width)
+        return cls([list(step.actions) for step in session.steps], elements, None)
+
+    def actions(self, step: int) -> List[Action]:
+        if step >= len(self.steps):
+            return [FINISHED]
+        return [(name, dict(args)) for name, args in self.steps[step]]
+
+    def box(self, element: str) -> Optional[Box]:
+        return self.elements.get(element, self.default_box)
+
+
+@dataclass
+class Turn:
+    """What the mock needs of a request, whatever the provider's format."""
+
+    planner: bool
+    # the first user text, the task prompt of a planner request
+    task: str
+    # the last user text, the finder prompt of a finder request
+    text: str
+    # whether the conversation has a model turn already
+    answered: bool
+
+
+class MockProvider:
+    """The scripted answers, the injected latency and errors, and request counts."""
+
+    def __init__(
+        self,
+        script: Optional[MockScript] = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        output_sizes: Optional[Dict[str, Tuple[int, int]]] = None,
+        seed: Optional[int] = None,
+    ):
+        self.script = script or MockScript()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.output_sizes = {**OUTPUT_SIZES, **(output_sizes or {})}
+        self.stats = Counter()
+        self._random = random.Random(seed)
+        self._steps: Dict[Tuple[str, str], int] = {}
+        self._cached: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    async def wait(self):
+        with self._lock:
+            seconds = self.latency + self._random.uniform(0, self.jitter)
+        await asyncio.sleep(seconds)
+
+    def failing(self) -> bool:
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def planner_actions(self, provider: str, turn: Turn) -> List[Action]:
+        key = (provider, turn.task)
+        with self._lock:
+            # a conversation without a model turn is a new task
+            step = self._steps.get(key, 0) if turn.answered else 0
+            self._steps[key] = step + 1
+        return self.script.actions(step)
+
+    def finder_boxes(self, provider: str, turn: Turn) -> Tuple[List[dict], bool]:
+        """The boxes of the elements asked for and whether it was a batch request."""
+        names = ELEMENTS_PATTERN.findall(turn.text)
+        batch = bool(names)
+        if not batch:
+            match = ELEMENT_PATTERN.search(turn.text)
+            names = [match.group(1) if match else ""]
+        width, height = self.output_sizes.get(provider, DEFAULT_OUTPUT_SIZE)
+        boxes = []
+        for name in names:
+            ymin, xmin, ymax, xmax = self.script.box(name) or (0, 0, 0, 0)
+            boxes.append(
+                {
+                    "ymin": round(ymin * height),
+                    "xmin": round(xmin * width),
+                    "ymax": round(ymax * height),
+                    "xmax": round(xmax * width),
+                }
+            )
+        return boxes, batch
+
+    def record(self, provider: str, turn: Turn, failed: bool = False):
+        with self._lock:
+            self.stats[f"{provider}.{'planner' if turn.planner else 'finder'}"] += 1
+            if failed:
+                self.stats[f"{provider}.errors"] += 1
+
+    def cache(self, content: dict) -> dict:
+        name = f"cachedContents/mock-{uuid.uuid4().hex[:12]}"
+        with self._lock:
+            self._cached[name] = content
+        return dict(content, name=name)
+
+    def cached(self, name: str) -> dict:
+        with self._lock:
+            return self._cached.get(name, {})
+
+
+def _texts(content) -> List[str]:
+    """The text parts of an OpenAI, Anthropic, Gemini or Ollama message's content."""
+    if isinstance(content, str):
+        return [content]
+    texts = []
+    for part in content or []:
+        if isinstance(part, str):
+            texts.append(part)
+        elif isinstance(part, dict) and isinstance(part.get("text"), str):
+            texts.append(part["text"])
+    return texts
+
+
+def _turn(messages: List[dict], planner: bool, model_role: str, content_key: str) -> Turn:
+    user_texts = [
+        text
+        for message in messages
+        if message.get("role") == "user"
+        for text in _texts(message.get(content_key))
+    ]
+    return Turn(
+        planner=planner,
+        task=user_texts[0] if user_texts else "",
+        text=user_texts[-1] if user_texts else "",
+        answered=any(message.get("role") == model_role for message in messages),
+    )
+
+
+def _input_tokens(body: bytes) -> int:
+    # about four bytes a token, images included; enough for the prompt cache and metrics
+    return max(1, len(body) // 4)
+
+
+def _id(prefix: str) -> str:
+    return f"{prefix}{uuid.uuid4().hex[:24]}"
+
+
+def openai_response(provider: MockProvider, body: dict, tokens: int) -> dict:
+    turn = _turn(body.get("messages", []), bool(body.get("tools")), "assistant", "content")
+    message = {"role": "assistant", "content": None, "refusal": None}
+    if turn.planner:
+        message["tool_calls"] = [
+            {
+                "id": _id("call_"),
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps(args)},
+            }
+            for name, args in provider.planner_actions("openai", turn)
+        ]
+        finish_reason = "tool_calls"
+    else:
+        boxes, batch = provider.finder_boxes("openai", turn)
+        message["content"] = json.dumps({"elements": boxes} if batch else boxes[0])
+        finish_reason = "stop"
+    provider.record("openai", turn)
+    return {
+        "id": _id("chatcmpl-"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": tokens,
+            "completion_tokens": 20,
+            "total_tokens": tokens + 20,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        },
+    }
+
+
+def anthropic_response(provider: MockProvider, body: dict, tokens: int) -> dict:
+    tool_choice = body.get("tool_choice") or {}
+    planner = bool(body.get("tools")) and tool_choice.get("name") != "return_coordinates"
+    turn = _turn(body.get("messages", []), planner, "assistant", "content")
+    if turn.planner:
+        actions = provider.planner_actions("anthropic", turn)
+    else:
+        boxes, batch = provider.finder_boxes("anthropic", turn)
+        actions = [("return_coordinates", {"elements": boxes} if batch else boxes[0])]
+    provider.record("anthropic", turn)
+    return {
+        "id": _id("msg_"),
+        "type": "message",
+        "role": "assistant",
+        "model": body.get("model", "mock"),
+        "content": [
+            {"type": "tool_use", "id": _id("toolu_"), "name": name, "input": args}
+            for name, args in actions
+        ],
+        "stop_reason": "tool_use",
+        "stop_sequence": None,
+        "usage": {
+            "input_tokens": tokens,
+            "output_tokens": 20,
+            "cache_creation_input_tokens": 0,
+            "cache_read_input_tokens": 0,
+        },
+    }
+
+
+def gemini_response(provider: MockProvider, body: dict, tokens: int) -> dict:
+    cached = provider.cached(body.get("cachedContent", ""))
+    planner = bool(body.get("tools") or cached.get("tools"))
+    turn = _turn(body.get("contents", []), planner, "model", "parts")
+    if turn.planner:
+        parts = [
+            {"functionCall": {"name": name, "args": args}}
+            for name, args in provider.planner_actions("gemini", turn)
+        ]
+    else:
+        boxes, batch = provider.finder_boxes("gemini", turn)
+        parts = [{"text": json.dumps({"elements": boxes} if batch else boxes[0])}]
+    provider.record("gemini", turn)
+    cached_tokens = _input_tokens(json.dumps(cached).encode()) if cached else 0
+    return {
+        "candidates": [
+            {"content": {"role": "model", "parts": parts}, "finishReason": "STOP", "index": 0}
+        ],
+        "usageMetadata": {
+            "promptTokenCount": tokens + cached_tokens,
+            "cachedContentTokenCount": cached_tokens,
+            "candidatesTokenCount": 20,
+            "totalTokenCount": tokens + cached_tokens + 20,
+        },
+        "modelVersion": "mock",
+    }
+
+
+def ollama_response(provider: MockProvider, body: dict, tokens: int) -> dict:
+    turn = _turn(body.get("messages", []), bool(body.get("tools")), "assistant", "content")
+    message = {"role": "assistant", "content": ""}
+    if turn.planner:
+        message["tool_calls"] = [
+            {"function": {"name": name, "arguments": args}}
+            for name, args in provider.planner_actions("ollama", turn)
+        ]
+    else:
+        boxes, batch = provider.finder_boxes("ollama", turn)
+        message["content"] = json.dumps({"elements": boxes} if batch else boxes[0])
+    provider.record("ollama", turn)
+    return {
+        "model": body.get("model", "mock"),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "message": message,
+        "done": True,
+        "done_reason": "stop",
+        "prompt_eval_count": tokens,
+        "eval_count": 20,
+    }
+
+
+def error_response(provider_name: str, status: int) -> JSONResponse:
+    message = f"Injected error from the mock {provider_name} provider"
+    if provider_name == "openai":
+        error = {"error": {"message": message, "type": "server_error", "code": status}}
+    elif provider_name == "anthropic":
+        kind = "rate_limit_error" if status == 429 else "api_error"
+        error = {"type": "error", "error": {"type": kind, "message": message}}
+    elif provider_name == "gemini":
+        error = {
+            "error": {
+                "code": status,
+                "message": message,
+                "status": ERROR_STATUSES.get(status, "UNKNOWN"),
+            }
+        }
+    else:
+        error = {"error": message}
+    return JSONResponse(error, status_code=status)
+
+
+def create_app(provider: Optional[MockProvider] = None) -> FastAPI:
+    provider = provider or MockProvider()
+    app = FastAPI(title="clickclickclick mock provider")
+    app.state.provider = provider
+
+    async def answer(provider_name: str, request: Request, respond) -> JSONResponse:
+        raw = await request.body()
+        body = json.loads(raw or b"{}")
+        await provider.wait()
+        if provider.failing():
+            with provider._lock:
+                provider.stats[f"{provider_name}.errors"] += 1
+            return error_response(provider_name, provider.error_status)
+        return JSONResponse(respond(provider, body, _input_tokens(raw)))
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        return await answer("openai", request, openai_response)
+
+    @app.post("/v1/messages")
+    async def anthropic_messages(request: Request):
+        return await answer("anthropic", request, anthropic_response)
+
+    @app.post("/v1beta/models/{model}:generateContent")
+    async def gemini_generate(model: str, request: Request):
+        return await answer("gemini", request, gemini_response)
+
+    @app.post("/v1beta/cachedContents")
+    async def gemini_cache(request: Request):
+        content = await request.json()
+        # the API answers with the expiry time only, never the ttl it was given
+        content.pop("ttl", None)
+        expires = time.gmtime(time.time() + 3600)
+        return JSONResponse(
+            dict(
+                provider.cache(content),
+                createTime=time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                updateTime=time.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                expireTime=time.strftime("%Y-%m-%dT%H:%M:%SZ", expires),
+                usageMetadata={"totalTokenCount": _input_tokens(json.dumps(content).encode())},
+            )
+        )
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        return await answer("ollama", request, ollama_response)
+
+    @app.get("/stats")
+    async def stats():
+        """Requests answered per provider and role, and the errors injected."""
+        return dict(provider.stats)
+
+    return app
+
+
+class MockProviderServer:
+    """
+    Serves a MockProvider with uvicorn on a background thread, e.g. in tests and benchmarks.
+    Port 0 picks a free port, ``url`` is the address to point the models at.
+    """
+
+    def __init__(
+        self, provider: Optional[MockProvider] = None, host: str = "127.0.0.1", port: int = 0
+    ):
+        self.provider = provider or MockProvider()
+        self.host = host
+        self.port = port
+        self._server: Optional[uvicorn.Server] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 10.0) -> "MockProviderServer":
+        config = uvicorn.Config(
+            create_app(self.provider), host=self.host, port=self.port, log_level="warning"
+        )
+        self._server = uvicorn.Server(config)
+        self._thread = threading.Thread(target=self._server.run, name="mock-provider", daemon=True)
+        self._thread.start()
+        deadline = time.monotonic() + timeout
+        while not self._server.started:
+            if not self._thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError(f"The mock provider did not start on {self.url}")
+            time.sleep(0.01)
+        self.port = self._server.servers[0].sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.should_exit = True
+            self._thread.join()
+            self._server = self._thread = None
+
+    def __enter__(self) -> "MockProviderServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def point_models_at(c, url: str, planner_model: str, finder_model: str):
+    """
+    Points the config's planner and finder at the mock provider at ``url``. Models without
+    an API key get a placeholder one, the SDKs refuse to start without.
+    """
+    for section, model in (("planner_config", planner_model), ("finder_config", finder_model)):
+        model_config = c.models.get(section)
+        model = model.lower()
+        if model_config is None:
+            continue
+        if model == "ollama":
+            model_config["host"] = url
+            continue
+        if model == "openai":
+            model_config["base_url"] = f"{url}/v1/"
+            model_config["api_type"] = "openai"
+        elif model in ("anthropic", "gemini"):
+            model_config["base_url"] = url
+        else:
+            raise ValueError(f"The mock provider doesn't speak the {model} API")
+        model_config["api_key"] = model_config.get("api_key") or "mock"
+
+
+@click.command()
+@click.option("--host", default="127.0.0.1", help="Address to listen on.")
+@click.option("--port", default=8090, help="Port to listen on.")
+@click.option("--script", "script_path", type=click.Path(exists=True), help="MockScript JSON.")
+@click.option(
+    "--session",
+    type=click.Path(exists=True, file_okay=False),
+    help="Answer with the actions and elements of a recorded replay session.",
+)
+@click.option("--latency", default=0.0, help="Milliseconds every response waits.")
+@click.option("--jitter", default=0.0, help="Up to this many more milliseconds, at random.")
+@click.option("--error-rate", default=0.0, help="Fraction of the requests that fail.")
+@click.option("--error-status", default=500, help="HTTP status of the failed requests.")
+@click.option("--seed", type=int, help="Seed of the latency jitter and the errors.")
+def main(host, port, script_path, session, latency, jitter, error_rate, error_status, seed):
+    if session:
+        from clickclickclick.replay import ReplaySession
+
+        script = MockScript.from_session(ReplaySession.load(session))
+    else:
+        script = MockScript.load(script_path) if script_path else MockScript()
+    provider = MockProvider(
+        script, latency / 1000, jitter / 1000, error_rate, error_status, seed=seed
+    )
+    click.echo(
+        f"Mock provider on http://{host}:{port}, point OpenAI at http://{host}:{port}/v1/ and "
+        f"Anthropic, Gemini and Ollama at http://{host}:{port}"
+    )
+    uvicorn.run(create_app(provider), host=host, port=port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
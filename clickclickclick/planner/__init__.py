@@ -1,15 +1,93 @@
 from abc import ABC, abstractmethod
-from typing import Any
+from typing import Any, Dict, List
+import asyncio
+import copy
 import logging
+from .history import ChatHistory
+from clickclickclick.prompt_cache import PromptCacheStats
+from clickclickclick.screen import ImageCodec
 
 logger = logging.getLogger(__name__)
 
+NO_SCREENSHOT = "No screenshot available - device may not be connected"
+UNCHANGED_SCREEN = (
+    "The screen did not visibly change after the last action, the last screenshot is still current"
+)
+
 
 class Planner(ABC):
+    # how screenshots are encoded for the model, get_planner sets it from the config
+    codec = ImageCodec()
+    _screen_unchanged = False
+
+    def reset(self):
+        """Starts a new conversation, planners seed their history with the system prompt."""
+        self.chat_history = ChatHistory()
+
+    def new_session(self, executor=None) -> "Planner":
+        """
+        A planner for a new task that shares this one's clients and prepared prompts and tools,
+        only the chat history is its own.
+        """
+        session = copy.copy(self)
+        if executor is not None and hasattr(session, "executor"):
+            session.executor = executor
+        session.reset()
+        session._cache_stats = PromptCacheStats()
+        session._step_timings = []
+        return session
+
+    @property
+    def cache_stats(self) -> PromptCacheStats:
+        """Prompt cache hits and misses of the planner's requests in this task."""
+        if "_cache_stats" not in self.__dict__:
+            self._cache_stats = PromptCacheStats()
+        return self._cache_stats
+
+    @property
+    def step_timings(self) -> List[Dict[str, float]]:
+        """Seconds each step of this task spent preparing the screenshot and on the request."""
+        if "_step_timings" not in self.__dict__:
+            self._step_timings = []
+        return self._step_timings
+
     @abstractmethod
     def llm_response(self, prompt, screenshot) -> str:
         pass
 
+    async def llm_response_async(self, prompt, screenshot) -> str:
+        """Async variant of llm_response, planners with an async client override it."""
+        return await asyncio.to_thread(self.llm_response, prompt, screenshot)
+
+    def prepare_screenshot(self, screenshot):
+        """
+        Encodes the screenshot the way the next request sends it. The frame caches the result,
+        so this can run ahead of the request while the previous step is wrapped up.
+        """
+        self.codec.base64(screenshot)
+
+    def no_screenshot_text(self) -> str:
+        """The text planners send when a step has no new screenshot."""
+        return UNCHANGED_SCREEN if self._screen_unchanged else NO_SCREENSHOT
+
+    def llm_response_unchanged(self, prompt):
+        """
+        Asks for the next action on a screen that looks like the last one. The planner is told
+        so in text and the screenshot already in its history is not sent again.
+        """
+        self._screen_unchanged = True
+        try:
+            return self.llm_response(prompt, None)
+        finally:
+            self._screen_unchanged = False
+
+    async def llm_response_unchanged_async(self, prompt):
+        self._screen_unchanged = True
+        try:
+            return await self.llm_response_async(prompt, None)
+        finally:
+            self._screen_unchanged = False
+
     @abstractmethod
     def add_finder_message(self, message):
         pass
@@ -1,8 +1,10 @@
 import anthropic
-from typing import Any
+from typing import Any, Optional
 from . import Planner, logger
+from .history import ChatHistory
 import json
 from clickclickclick.config import BaseConfig
+from clickclickclick.screen import Frame
 
 
 class AnthropicPlanner(Planner):
@@ -16,12 +18,40 @@ class AnthropicPlanner(Planner):
         api_key = planner_config.get("api_key")
         self.model_name = planner_config.get("model_name")
         self.functions = c.function_declarations
+        self.history_token_budget = planner_config.get(
+            "history_token_budget", c.PLANNER_HISTORY_TOKEN_BUDGET
+        )
 
-        self.client = anthropic.Anthropic(api_key=api_key)
+        # another endpoint speaking the Messages API, e.g. the mock provider
+        base_url = planner_config.get("base_url") or None
+        self.client = anthropic.Anthropic(api_key=api_key, base_url=base_url)
+        self.async_client = anthropic.AsyncAnthropic(api_key=api_key, base_url=base_url)
         self.system_instruction = system_instruction
-        self.chat_history = []
 
-    def build_prompt(self, query_text=None, base64_image=None):
+        # Convert function declarations to Anthropic tool format
+        self.tools = []
+        for fn in self.functions:
+            tool = {
+                "name": fn["name"],
+                "description": fn["description"],
+                "input_schema": fn["parameters"]
+            }
+            self.tools.append(tool)
+        # tools and system prompt are the same on every step, the breakpoint caches both
+        self.system = [{"type": "text", "text": system_instruction}]
+        if planner_config.get("prompt_cache", True):
+            self.system[0]["cache_control"] = {"type": "ephemeral"}
+        self.reset()
+
+    def reset(self):
+        # the system prompt is sent separately, so only the task prompt gets pinned
+        self.chat_history = ChatHistory(self.history_token_budget, self._text_message)
+
+    @staticmethod
+    def _text_message(text: str) -> dict:
+        return {"role": "user", "content": [{"type": "text", "text": text}]}
+
+    def build_prompt(self, query_text=None, base64_image=None, media_type="image/png"):
         # Handle case when base64_image is None or empty
         if not base64_image:
             if query_text is None:
@@ -29,7 +59,7 @@ class AnthropicPlanner(Planner):
                     {
                         "role": "user",
                         "content": [
-                            {"type": "text", "text": "No screenshot available - device may not be connected"},
+                            {"type": "text", "text": self.no_screenshot_text()},
                         ],
                     }
                 ]
@@ -53,7 +83,7 @@ class AnthropicPlanner(Planner):
                             "type": "image",
                             "source": {
                                 "type": "base64",
-                                "media_type": "image/png",
+                                "media_type": media_type,
                                 "data": base64_image,
                             },
                         }
@@ -70,7 +100,7 @@ class AnthropicPlanner(Planner):
                             "type": "image",
                             "source": {
                                 "type": "base64",
-                                "media_type": "image/png",
+                                "media_type": media_type,
                                 "data": base64_image,
                             },
                         },
@@ -78,50 +108,34 @@ class AnthropicPlanner(Planner):
                 }
             ]
 
-    def llm_response(self, prompt=None, screenshot=None) -> list[tuple[str, dict]]:
-        # Remove all prev screenshots from chat history
-        new_chat_history = []
-        for message in self.chat_history:
-            if message["role"] == "user" and any(
-                item["type"] == "image" for item in message["content"] if isinstance(item, dict)
-            ):
-                filtered_content = [
-                    item for item in message["content"] if isinstance(item, dict) and item["type"] != "image"
-                ]
-                if filtered_content:
-                    new_chat_history.append({"role": message["role"], "content": filtered_content})
-            else:
-                new_chat_history.append(message)
-        
-        # Append the current prompt to the chat history
+    def _prepare_request(self, prompt=None, screenshot: Optional[Frame] = None) -> dict:
+        if prompt and self.chat_history.task_prompt is None:
+            self.chat_history.set_task(prompt, self.build_prompt(prompt)[0])
+        # the task prompt is pinned, only send a prompt along if it is a different one
+        query_text = None if prompt == self.chat_history.task_prompt else prompt
+
+        # Append the current prompt, this strips the previous screenshot from chat history
         if screenshot:
-            prompt_with_image = self.build_prompt(prompt, f"{screenshot}")
-            new_chat_history.extend(prompt_with_image)
+            self.chat_history.append_screenshot(
+                self.build_prompt(
+                    query_text, self.codec.base64(screenshot), self.codec.mime_type(screenshot)
+                )[0]
+            )
         else:
-            new_chat_history.extend(self.build_prompt(prompt))
-        
-        self.chat_history = new_chat_history
-
-        # Convert function declarations to Anthropic tool format
-        tools = []
-        for fn in self.functions:
-            tool = {
-                "name": fn["name"],
-                "description": fn["description"],
-                "input_schema": fn["parameters"]
-            }
-            tools.append(tool)
+            self.chat_history.append(self.build_prompt(query_text)[0])
 
-        response = self.client.messages.create(
+        return dict(
             model=self.model_name,
             max_tokens=1024,
-            system=self.system_instruction,
-            messages=self.chat_history,
-            tools=tools,
+            system=self.system,
+            messages=self.chat_history.messages(),
+            tools=self.tools,
             tool_choice={"type": "any"}
         )
-        
+
+    def _handle_response(self, response) -> list[tuple[str, dict]]:
         print(response)
+        self.cache_stats.record_anthropic(response.usage)
         
         list_of_functions_to_call = []
         
@@ -149,8 +163,21 @@ class AnthropicPlanner(Planner):
             list_of_functions_to_call.append((None, None))
         return list_of_functions_to_call
 
+    def llm_response(
+        self, prompt=None, screenshot: Optional[Frame] = None
+    ) -> list[tuple[str, dict]]:
+        response = self.client.messages.create(**self._prepare_request(prompt, screenshot))
+        return self._handle_response(response)
+
+    async def llm_response_async(
+        self, prompt=None, screenshot: Optional[Frame] = None
+    ) -> list[tuple[str, dict]]:
+        request = self._prepare_request(prompt, screenshot)
+        response = await self.async_client.messages.create(**request)
+        return self._handle_response(response)
+
     def add_finder_message(self, message):
-        self.chat_history.append({"role": "user", "content": [{"type": "text", "text": message}]})
+        self.chat_history.append(self._text_message(message))
 
     def task_finished(self, reason: str, observation: str):
         logger.info(f"Task finished with reason: {reason}") 
\ No newline at end of file
@@ -0,0 +1,184 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Optional
+
+from . import logger
+from clickclickclick.config import BaseConfig
+from clickclickclick.executor import Executor
+from clickclickclick.finder import BaseFinder
+from clickclickclick.screen import Frame, SettleDetector
+from clickclickclick.tracing import TaskTrace, activate, finish_trace, span
+from . import Planner
+from .loop import StepTracker
+from .pipeline import FramePrefetcherAsync
+from .task import (
+    BATCH_FINDER_FUNCTIONS,
+    FINDER_FUNCTIONS,
+    _process_finder_output,
+    get_function,
+    log_prompt_cache_stats,
+    record_settle,
+)
+
+
+async def parse_and_execute_async(
+    function_name: str,
+    function_args: dict,
+    executor: Executor,
+    planner: Planner,
+    finder: BaseFinder,
+) -> Any:
+    args = function_args if function_args is not None else {}
+    with span(f"tool.{function_name}"):
+        if function_name in BATCH_FINDER_FUNCTIONS:
+            return (await finder.find_elements_async(**args), function_name)
+        if function_name in FINDER_FUNCTIONS:
+            return (await finder.find_element_async(**args), function_name)
+
+        func = get_function(function_name, executor, planner, finder)
+        # device actions are short adb calls, run them off the loop so other tasks keep going
+        return (await asyncio.to_thread(func, **args), function_name)
+
+
+async def capture_settled_frame_async(
+    executor: Executor, c: BaseConfig, settle: bool = True
+) -> Optional[Frame]:
+    if not c.SETTLE_MAX_WAIT:
+        with span("step.sleep"):
+            await asyncio.sleep(c.TASK_DELAY)
+        return await executor.capture_frame_async("Planner took screenshot")
+    if not settle:
+        return await executor.capture_frame_async("Planner took screenshot")
+    with span("step.settle"):
+        result = await SettleDetector.from_config(c).wait_async(
+            lambda: executor.capture_frame_async("Planner took screenshot"),
+            executor.probe_screen_async if executor.has_screen_probe else None,
+        )
+    record_settle(executor, result, c)
+    return result.frame
+
+
+def frame_prefetcher_async(
+    executor: Executor, planner: Planner, c: BaseConfig, enabled: bool = True
+) -> FramePrefetcherAsync:
+    return FramePrefetcherAsync(
+        lambda settle: capture_settled_frame_async(executor, c, settle),
+        planner.prepare_screenshot,
+        executor.pipeline_stats,
+        enabled=enabled and c.PIPELINE_CAPTURE,
+    )
+
+
+async def planner_response_async(
+    planner: Planner, prompt: str, frame: Optional[Frame], tracker: StepTracker
+):
+    changed = tracker.observe(frame)
+    with span("planner.llm_response", planner=type(planner).__name__, unchanged=not changed):
+        if changed:
+            return await planner.llm_response_async(prompt, frame)
+        return await planner.llm_response_unchanged_async(prompt)
+
+
+async def _execute_task_step_async(
+    prompt: str,
+    executor: Executor,
+    planner: Planner,
+    finder: BaseFinder,
+    c: BaseConfig,
+    tracker: Optional[StepTracker] = None,
+    prefetcher: Optional[FramePrefetcherAsync] = None,
+) -> bool:
+    """Execute a single step of the task without blocking the event loop."""
+    with span("task.step"):
+        tracker = tracker or StepTracker(c, executor.screen_stats)
+        prefetcher = prefetcher or frame_prefetcher_async(executor, planner, c, enabled=False)
+        frame = await prefetcher.frame(settle=bool(tracker.steps))
+        logger.info("Generated screenshot")
+
+        llm_responses = await planner_response_async(planner, prompt, frame, tracker)
+        loop = asyncio.get_running_loop()
+        for index, (func_name, func_args) in enumerate(llm_responses):
+            logger.debug(f"Executing {func_name} with {func_args}")
+            tracker.acted(func_name, func_args)
+            # the step's last action starts capturing the next frame
+            dispatched = prefetcher.start if index == len(llm_responses) - 1 else None
+
+            try:
+                execution_output, executed_fn_name = await parse_and_execute_async(
+                    func_name, func_args, executor, planner, finder
+                )
+
+                if executed_fn_name == "task_finished":
+                    return True
+
+                if executed_fn_name in FINDER_FUNCTIONS:
+                    await asyncio.to_thread(
+                        _process_finder_output,
+                        executed_fn_name,
+                        execution_output,
+                        func_args,
+                        executor,
+                        finder,
+                        planner,
+                        # the finder output is processed on a worker thread
+                        dispatched and (lambda: loop.call_soon_threadsafe(dispatched)),
+                    )
+
+            except Exception as e:
+                logger.error(f"Error executing function {func_name}: {e}")
+                continue
+            finally:
+                # a frame already being captured is the next step's, it mustn't be dropped
+                if not prefetcher.started:
+                    executor.invalidate_frame()
+            if dispatched:
+                dispatched()
+
+        return False
+
+
+async def execute_task_async(
+    prompt: str,
+    executor: Executor,
+    planner: Planner,
+    finder: BaseFinder,
+    c: BaseConfig,
+    trace: Optional[TaskTrace] = None,
+) -> bool:
+    """
+    Execute a task on the running event loop.
+
+    Model calls use the providers' async clients and screenshots use async adb I/O, so a
+    single process can drive many tasks concurrently, e.g. with ``asyncio.gather``.
+    """
+    trace = trace or TaskTrace()
+    prefetcher = frame_prefetcher_async(executor, planner, c)
+    try:
+        with activate(trace), span("task", prompt=prompt):
+            tracker = StepTracker(c, executor.screen_stats)
+            while True:
+                if await _execute_task_step_async(
+                    prompt, executor, planner, finder, c, tracker, prefetcher
+                ):
+                    return True
+
+    except asyncio.CancelledError:
+        logger.info("Task execution cancelled")
+        raise
+    except Exception as e:
+        logger.exception(f"An error occurred during task execution: {e}")
+        return False
+    finally:
+        await prefetcher.close()
+        log_prompt_cache_stats(planner, finder)
+        finish_trace(trace, c)
+
+
+async def execute_with_timeout_async(
+    task: Callable[..., Awaitable[Any]], timeout: float, *args, **kwargs
+) -> Optional[Any]:
+    """Runs an async task with a timeout, cancelling it (and its in-flight I/O) on expiry."""
+    try:
+        return await asyncio.wait_for(task(*args, **kwargs), timeout)
+    except asyncio.TimeoutError:
+        logger.exception("Task did not complete within the timeout period.")
+        return None
@@ -1,28 +1,60 @@
+import asyncio
+import time
+from datetime import timedelta
 import google.generativeai as genai
-from google.generativeai.types import FunctionDeclaration, Tool, File
+from google.generativeai import caching
+from google.generativeai.types import FunctionDeclaration, Tool
 from google.generativeai.protos import FunctionCallingConfig, ToolConfig
-from typing import Any
-from PIL import Image
-import tempfile
+from typing import Any, Optional
 from clickclickclick.config import BaseConfig
+from clickclickclick.screen import Frame
 from . import Planner, logger
+from .history import ChatHistory
+
+# recreate the cached content a bit before it expires instead of sending a request that fails
+CACHE_REFRESH_MARGIN = 60
+# the smallest prompt a model caches (gemini-1.5 models), set prompt_cache_min_tokens per model
+CACHE_MIN_TOKENS = 32768
+
+
+def configure_client(model_config: dict) -> bool:
+    """
+    Configures the genai client for a planner or finder. ``base_url`` points it at another
+    endpoint, e.g. the mock provider, over REST instead of gRPC. Returns whether it did; the
+    SDK has no async REST client, async requests then run the sync one on a worker thread.
+    """
+    base_url = model_config.get("base_url")
+    if base_url:
+        genai.configure(
+            api_key=model_config.get("api_key"),
+            transport="rest",
+            client_options={"api_endpoint": base_url},
+        )
+    else:
+        genai.configure(api_key=model_config.get("api_key"))
+    return bool(base_url)
 
 
 class GeminiPlanner(Planner):
+    # requests go over REST to a configured base_url, see configure_client
+    rest_transport = False
+
     def __init__(self, c: BaseConfig):
         prompts = c.prompts
         system_instruction = (
             f"{prompts['common-planner-prompt']}\n{prompts['specific-planner-prompt']}"
         )
         planner_config = c.models.get("planner_config")
-        api_key = planner_config.get("api_key")
         model_name = planner_config.get("model_name")
         generation_config = planner_config.get("generation_config")
+        self.history_token_budget = planner_config.get(
+            "history_token_budget", c.PLANNER_HISTORY_TOKEN_BUDGET
+        )
 
         function_declarations = c.function_declarations
         logger.info("Gemini Planner init")
-        genai.configure(api_key=api_key)
-        self.chat_history = []
+        self.rest_transport = configure_client(planner_config)
+        self.reset()
         # Create FunctionDeclaration objects
         self.functions = []
         for func in function_declarations:
@@ -47,43 +79,141 @@ class GeminiPlanner(Planner):
                 # the provided function calls will be predicted.
             )
         )
-        self.model = genai.GenerativeModel(
+        self.model_kwargs = dict(
             model_name=model_name,
             generation_config=generation_config,
             system_instruction=system_instruction,
             tools=[all_functions_tool],
             tool_config=tool_config,
         )
+        self.prompt_cache = planner_config.get("prompt_cache", False)
+        self.prompt_cache_ttl = planner_config.get("prompt_cache_ttl", 3600)
+        self.prompt_cache_min_tokens = planner_config.get(
+            "prompt_cache_min_tokens", CACHE_MIN_TOKENS
+        )
+        # shared with the sessions copied from this planner, so they all use one cache and
+        # a prompt the model can't cache isn't tried again by every task
+        self._model = {"model": None, "expires_at": None, "cacheable": None}
 
-    def llm_response(self, prompt=None, screenshot=None) -> list[tuple[str, dict]]:
-        # Remove any previous screenshots from the chat history
-        self.chat_history = [
-            message
-            for message in self.chat_history
-            if not (
-                message.get("role") == "user" and isinstance(message.get("parts", [{}])[0], File)
+    def _cacheable(self) -> bool:
+        """Whether the system prompt and tools reach the model's minimum cacheable size."""
+        try:
+            tokens = genai.GenerativeModel(**self.model_kwargs).count_tokens(".").total_tokens
+        except Exception as e:
+            logger.warning(f"Could not count the Gemini prompt tokens, trying the cache: {e}")
+            return True
+        if tokens < self.prompt_cache_min_tokens:
+            logger.info(
+                f"Gemini prompt of {tokens} tokens is below the {self.prompt_cache_min_tokens} "
+                "the model caches, sending the full prompt"
             )
-        ]
-        # todo
-        assert screenshot.endswith(".png")
-
-        with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as temp_file:
-            temp_file_path = temp_file.name
-
-        # Resize the image
-        with Image.open(screenshot) as img:
-            # Example resize operation, may need to adjust size
-            img = img.resize((768, 768))  # todo from config
-            img.save(temp_file_path)
-
-        file = genai.upload_file(temp_file_path, mime_type="image/png")
-        # Append the current screenshot to the chat history
-        self.chat_history.append({"role": "user", "parts": [file]})
-
-        logger.info(self.chat_history)
-        self.chat_session = self.model.start_chat(history=self.chat_history)
-        response = self.chat_session.send_message(f"{prompt}")  # Adjust as needed
+            return False
+        return True
+
+    def _create_model(self):
+        if self.prompt_cache and self._model["cacheable"] is None:
+            self._model["cacheable"] = self._cacheable()
+        if self.prompt_cache and self._model["cacheable"]:
+            kwargs = self.model_kwargs
+            try:
+                # system prompt and tools are uploaded once and referenced by every request
+                cached_content = caching.CachedContent.create(
+                    model=kwargs["model_name"],
+                    system_instruction=kwargs["system_instruction"],
+                    tools=kwargs["tools"],
+                    tool_config=kwargs["tool_config"],
+                    ttl=timedelta(seconds=self.prompt_cache_ttl),
+                )
+                self._model["expires_at"] = (
+                    time.monotonic() + self.prompt_cache_ttl - CACHE_REFRESH_MARGIN
+                )
+                return genai.GenerativeModel.from_cached_content(
+                    cached_content, generation_config=kwargs["generation_config"]
+                )
+            except Exception as e:
+                logger.warning(f"Gemini prompt cache unavailable, sending the full prompt: {e}")
+                self._model["cacheable"] = False
+        self._model["expires_at"] = None
+        return genai.GenerativeModel(**self.model_kwargs)
+
+    @property
+    def model(self):
+        expires_at = self._model["expires_at"]
+        if self._model["model"] is None or (expires_at and time.monotonic() > expires_at):
+            self._model["model"] = self._create_model()
+        return self._model["model"]
+
+    def reset(self):
+        self.chat_history = ChatHistory(self.history_token_budget, self._text_message)
+        self._chat_session = None
+
+    @staticmethod
+    def _text_message(text: str) -> dict:
+        return {"role": "user", "parts": [text]}
+
+    def _image_part(self, screenshot: Frame) -> dict:
+        # sent inline with the message, resized and encoded in memory and cached by the frame
+        resized = screenshot.resized(768, 768)  # todo from config
+        return {"mime_type": self.codec.mime_type(resized), "data": self.codec.encode(resized)}
+
+    def prepare_screenshot(self, screenshot: Frame):
+        self._image_part(screenshot)
+
+    @property
+    def chat_session(self):
+        # one chat per task, started again only when the model is, e.g. for a new prompt cache
+        model = self.model
+        if self._chat_session is None or self._chat_session.model is not model:
+            self._chat_session = model.start_chat()
+        return self._chat_session
+
+    def _prepare_chat(self, screenshot: Optional[Frame]):
+        started = time.perf_counter()
+        # Append the current screenshot to the chat history, the previous one is removed
+        if screenshot:
+            self.chat_history.append_screenshot(
+                {"role": "user", "parts": [self._image_part(screenshot)]}
+            )
+        else:
+            self.chat_history.append(self._text_message(self.no_screenshot_text()))
+        image_seconds = time.perf_counter() - started
+
+        session = self.chat_session
+        # the history holds the latest screenshot only and the turns within the token budget
+        session.history = self.chat_history.messages()
+        return session, image_seconds
+
+    def _record_step(self, image_seconds: float, started: float):
+        request_seconds = time.perf_counter() - started
+        self.step_timings.append({"image": image_seconds, "request": request_seconds})
+        logger.info(
+            f"Screenshot sent inline after {image_seconds * 1000:.0f} ms, "
+            f"the request took {request_seconds:.2f}s"
+        )
+
+    def llm_response(
+        self, prompt=None, screenshot: Optional[Frame] = None
+    ) -> list[tuple[str, dict]]:
+        session, image_seconds = self._prepare_chat(screenshot)
+        started = time.perf_counter()
+        response = session.send_message(f"{prompt}")  # Adjust as needed
+        self._record_step(image_seconds, started)
+        return self._handle_response(prompt, response)
+
+    async def llm_response_async(
+        self, prompt=None, screenshot: Optional[Frame] = None
+    ) -> list[tuple[str, dict]]:
+        if self.rest_transport:
+            return await super().llm_response_async(prompt, screenshot)
+        session, image_seconds = self._prepare_chat(screenshot)
+        started = time.perf_counter()
+        response = await session.send_message_async(f"{prompt}")
+        self._record_step(image_seconds, started)
+        return self._handle_response(prompt, response)
+
+    def _handle_response(self, prompt, response) -> list[tuple[str, dict]]:
         logger.info(response)
+        self.cache_stats.record_gemini(response.usage_metadata)
         for i in range(len(response.candidates[0].content.parts)):
             try:
                 function_call = response.candidates[0].content.parts[i].function_call
@@ -93,12 +223,8 @@ class GeminiPlanner(Planner):
         function_name = function_call.name
 
         # user prompt needs to be only inserted one time
-        if not any(
-            message.get("parts", [None])[0] == prompt
-            for message in self.chat_history
-            if message.get("role") == "user"
-        ):
-            self.chat_history.append({"role": "user", "parts": [prompt]})
+        if self.chat_history.task_prompt is None:
+            self.chat_history.set_task(prompt, self._text_message(prompt))
 
         args = function_call.args
         d = {key: args[key] for key in args}
@@ -114,7 +240,7 @@ class GeminiPlanner(Planner):
         return [(function_name, {key: args[key] for key in args})]
 
     def add_finder_message(self, message):
-        self.chat_history.append({"role": "user", "parts": [message]})
+        self.chat_history.append(self._text_message(message))
 
     def task_finished(self, reason, observation: str):
         logger.info(f"Task finished, reason: {reason}")
@@ -0,0 +1,167 @@
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+Message = Dict[str, Any]
+
+# rough token cost of a low detail screenshot, only one is ever kept in the history
+IMAGE_TOKENS = 500
+CHARS_PER_TOKEN = 4
+# how many dropped messages the compaction summary lists
+SUMMARY_LINES = 10
+SUMMARY_LINE_CHARS = 120
+
+TEXT_ITEM_TYPES = ("text",)
+
+
+def _items(message: Message) -> list:
+    """The parts of a message in any of the provider formats, text content is one item."""
+    content = message.get("content", message.get("parts"))
+    if content is None:
+        return []
+    if isinstance(content, str):
+        return [content] if content else []
+    return list(content)
+
+
+def _is_text(item) -> bool:
+    return isinstance(item, str) or (isinstance(item, dict) and item.get("type") in TEXT_ITEM_TYPES)
+
+
+def message_text(message: Message) -> str:
+    texts = []
+    for item in _items(message):
+        if isinstance(item, str):
+            texts.append(item)
+        elif _is_text(item):
+            texts.append(item.get("text", ""))
+    return " ".join(texts)
+
+
+def count_images(message: Message) -> int:
+    return len(message.get("images") or []) + sum(
+        1 for item in _items(message) if not _is_text(item)
+    )
+
+
+def estimate_tokens(message: Message) -> int:
+    """A cheap estimate, about four characters per token plus a flat cost per image."""
+    return len(message_text(message)) // CHARS_PER_TOKEN + count_images(message) * IMAGE_TOKENS
+
+
+def strip_images(message: Message, caption: Optional[str] = None):
+    """
+    Removes screenshots from a message in place (OpenAI, Anthropic, Ollama and Gemini).
+
+    A ``caption`` that only described the screenshot is removed with it.
+    """
+    message.pop("images", None)
+    for key in ("content", "parts"):
+        if isinstance(message.get(key), list):
+            message[key] = [item for item in message[key] if _is_text(item)]
+    if caption is not None and message_text(message) == caption:
+        message["content" if "content" in message else "parts"] = []
+
+
+def is_empty(message: Message) -> bool:
+    return not message.get("images") and not _items(message)
+
+
+class ChatHistory:
+    """
+    Planner chat history with a token budget.
+
+    Pinned messages (the system and task prompts) are always sent first and don't count
+    against ``token_budget``. Other messages are appended in O(1); when their estimated size
+    goes over the budget the oldest ones are dropped and listed in a short summary instead. Only the latest screenshot is kept:
+    adding a screenshot strips the previous one, without walking the whole history.
+    """
+
+    def __init__(
+        self,
+        token_budget: Optional[int] = None,
+        text_message: Callable[[str], Message] = lambda text: {"role": "user", "content": text},
+    ):
+        self.token_budget = token_budget
+        self.text_message = text_message
+        self.pinned: List[Message] = []
+        self.task_prompt = None
+        # [message, tokens] entries, the list is shared with _screenshot to update it in place
+        self._turns: Deque[list] = deque()
+        self._tokens = 0
+        self._screenshot = None
+        self._caption = None
+        self._dropped = 0
+        self._summary_lines: Deque[str] = deque(maxlen=SUMMARY_LINES)
+
+    def pin(self, message: Message):
+        self.pinned.append(message)
+
+    def set_task(self, prompt: str, message: Message):
+        """Pins the task prompt so it is sent once instead of with every screenshot."""
+        self.task_prompt = prompt
+        self.pin(message)
+
+    def _add(self, message: Message) -> list:
+        entry = [message, estimate_tokens(message)]
+        self._turns.append(entry)
+        self._tokens += entry[1]
+        return entry
+
+    def append(self, message: Message):
+        self._add(message)
+        self._compact()
+
+    def append_screenshot(self, message: Message, caption: Optional[str] = None):
+        if self._screenshot is not None:
+            previous, tokens = self._screenshot
+            strip_images(previous, self._caption)
+            self._screenshot[1] = estimate_tokens(previous)
+            self._tokens += self._screenshot[1] - tokens
+        self._screenshot = self._add(message)
+        self._caption = caption
+        self._compact()
+
+    def _summary(self) -> Optional[Message]:
+        if not self._dropped:
+            return None
+        lines = "\n".join(self._summary_lines)
+        return self.text_message(
+            f"{self._dropped} earlier messages of this task were dropped to save context. "
+            f"The latest of them were:\n{lines}"
+        )
+
+    def _compact(self):
+        if self.token_budget is None:
+            return
+        # never drop the latest screenshot, the model needs it for the current step
+        while self._tokens > self.token_budget and self._turns[0] is not self._screenshot:
+            message, tokens = self._turns.popleft()
+            self._tokens -= tokens
+            if is_empty(message):
+                continue
+            self._dropped += 1
+            self._summary_lines.append(
+                f"{message.get('role')}: {message_text(message)[:SUMMARY_LINE_CHARS]}"
+            )
+
+    @property
+    def tokens(self) -> int:
+        return self._tokens
+
+    def messages(self) -> List[Message]:
+        """The messages to send, in order."""
+        messages = list(self.pinned)
+        summary = self._summary()
+        if summary is not None:
+            messages.append(summary)
+        messages.extend(message for message, _ in self._turns if not is_empty(message))
+        return messages
+
+    def __iter__(self) -> Iterator[Message]:
+        return iter(self.messages())
+
+    def __len__(self) -> int:
+        return len(self.messages())
+
+    def __getitem__(self, index):
+        return self.messages()[index]
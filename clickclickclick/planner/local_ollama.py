@@ -1,56 +1,89 @@
-from ollama import Client
-from typing import Any
+from ollama import AsyncClient, Client
+from typing import Any, Optional
 from . import Planner, logger
+from .history import ChatHistory
 from clickclickclick.config import BaseConfig
 from clickclickclick.executor import Executor
+from clickclickclick.screen import Frame
 
 
 class OllamaPlanner(Planner):
     def __init__(self, c: BaseConfig, executor: Executor, host=None):
-        if host is None:
-            host = "http://localhost:11434"
         prompts = c.prompts
         system_prompt = f"{prompts['common-planner-prompt']}\n{prompts['specific-planner-prompt']}"
         planner_config = c.models.get("planner_config")
+        # the client falls back to OLLAMA_HOST, then to http://localhost:11434
+        host = host or planner_config.get("host") or None
         self.client = Client(host=host)
+        self.async_client = AsyncClient(host=host)
         self.model_name = planner_config.get("model_name")
         function_declarations = c.function_declarations
         self.executor = executor
-        self.chat_history = [
-            {
-                "role": "system",
-                "content": system_prompt,  # + "\nHere is a exact list of functions in JSON format that you can invoke.\n\n{functions}\n , Make sure you do not use any other function.".format(functions=function_declarations),
-            }
-        ]
+        self.system_prompt = system_prompt
+        self.history_token_budget = planner_config.get(
+            "history_token_budget", c.PLANNER_HISTORY_TOKEN_BUDGET
+        )
+        self.reset()
         # Create tool representations directly
         self.tools = []
         for func in function_declarations:
             tool = {"type": "function", "function": func}
             self.tools.append(tool)
 
-    def llm_response(self, prompt=None, screenshot=None) -> list[tuple[str, dict]]:
-        # Remove items with 'images' key from chat history
-        self.chat_history = [entry for entry in self.chat_history if "images" not in entry]
+    def reset(self):
+        self.chat_history = ChatHistory(self.history_token_budget, self._text_message)
+        self.chat_history.pin(
+            {
+                "role": "system",
+                "content": self.system_prompt,  # + "\nHere is a exact list of functions in JSON format that you can invoke.\n\n{functions}\n , Make sure you do not use any other function.".format(functions=function_declarations),
+            }
+        )
+
+    @staticmethod
+    def _text_message(text: str) -> dict:
+        return {"role": "user", "content": text}
+
+    def prepare_screenshot(self, screenshot: Frame):
+        # the client sends the encoded bytes, it base64 encodes them itself
+        self.codec.encode(screenshot)
+
+    def _prepare_request(self, prompt=None, screenshot: Optional[Frame] = None) -> dict:
+        if prompt and self.chat_history.task_prompt is None:
+            self.chat_history.set_task(prompt, self._text_message(prompt))
+        # the task prompt is pinned, only send a prompt along if it is a different one
+        query_text = None if prompt == self.chat_history.task_prompt else prompt
 
         if screenshot:
-            self.chat_history.append(
+            # this strips the images of the previous screenshot message
+            caption = None if query_text else "New screenshot for the task attached"
+            self.chat_history.append_screenshot(
                 {
                     "role": "user",
-                    "content": prompt or "New screenshot for the task attached",
-                    "images": [screenshot],
-                }
+                    "content": query_text or caption,
+                    "images": [self.codec.encode(screenshot)],
+                },
+                caption,
             )
         else:
-            self.chat_history.append({"role": "user", "content": prompt})
-        import time
+            self.chat_history.append(self._text_message(query_text or self.no_screenshot_text()))
+        return dict(model=self.model_name, messages=self.chat_history.messages(), tools=self.tools)
 
-        start_time = time.time()  # Record the start time
-        response = self.client.chat(
-            model=self.model_name, messages=self.chat_history, tools=self.tools
-        )
-        end_time = time.time()  # Record the end time
-        elapsed_time = end_time - start_time  # Calculate the elapsed time
-        print(f"Time required to run the statement: {elapsed_time} seconds")
+    def llm_response(
+        self, prompt=None, screenshot: Optional[Frame] = None
+    ) -> list[tuple[str, dict]]:
+        request = self._prepare_request(prompt, screenshot)
+        # the request's latency is in the step's trace, see clickclickclick.tracing
+        response = self.client.chat(**request)
+        return self._handle_response(response)
+
+    async def llm_response_async(
+        self, prompt=None, screenshot: Optional[Frame] = None
+    ) -> list[tuple[str, dict]]:
+        request = self._prepare_request(prompt, screenshot)
+        response = await self.async_client.chat(**request)
+        return self._handle_response(response)
+
+    def _handle_response(self, response) -> list[tuple[str, dict]]:
         print(response, "all res[ponse]")
         tool_calls = response["message"].get("tool_calls", [])
 
@@ -77,7 +110,7 @@ class OllamaPlanner(Planner):
         return response["message"]["content"]
 
     def add_finder_message(self, message):
-        self.chat_history.append({"role": "user", "content": message})
+        self.chat_history.append(self._text_message(message))
 
     def task_finished(self, reason, observation: str):
         logger.info(f"Task finished, reason: {reason}")
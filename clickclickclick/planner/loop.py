@@ -0,0 +1,96 @@
+import json
+from collections import Counter
+from typing import List, Optional, Tuple
+from clickclickclick.screen import Frame, visibly_changed
+from . import logger
+
+Action = Tuple[str, dict]
+
+
+class RepeatedActionError(RuntimeError):
+    """Raised when a task keeps repeating the same actions without any visible change."""
+
+
+def action_key(actions: List[Action]) -> tuple:
+    # the observation describes the screen, it isn't part of what was done
+    return tuple(
+        (
+            name,
+            json.dumps(
+                {key: value for key, value in (args or {}).items() if key != "observation"},
+                sort_keys=True,
+                default=str,
+            ),
+        )
+        for name, args in actions
+    )
+
+
+class LoopDetector:
+    """Counts the steps in a row that did the same thing without changing the screen."""
+
+    def __init__(self, max_repeats: int = 3):
+        self.max_repeats = max_repeats
+        self.repeats = 0
+        self._last = None
+
+    def record(self, actions: List[Action], changed: bool):
+        key = action_key(actions)
+        if changed or not actions:
+            self.repeats, self._last = 0, None
+        elif key == self._last:
+            self.repeats += 1
+        else:
+            self.repeats, self._last = 1, key
+
+    @property
+    def looping(self) -> bool:
+        return bool(self.max_repeats) and self.repeats >= self.max_repeats
+
+
+class StepTracker:
+    """
+    What a task did in its previous step, to tell whether the screen changed since.
+
+    ``observe`` compares each step's frame with the last one. A frame that looks the same
+    doesn't need to be sent to the planner again, and the same actions repeated on a screen
+    that never changes end the task with ``RepeatedActionError``.
+    """
+
+    def __init__(self, c, stats: Optional[Counter] = None):
+        self.skip_unchanged = c.SKIP_UNCHANGED_SCREENS
+        self.max_distance = c.UNCHANGED_MAX_DISTANCE
+        self.tolerance = c.UNCHANGED_TOLERANCE
+        self.loops = LoopDetector(c.LOOP_MAX_REPEATS)
+        self.stats = stats if stats is not None else Counter()
+        self.steps = 0
+        self.previous: Optional[Frame] = None
+        self.actions: List[Action] = []
+
+    def observe(self, frame: Optional[Frame]) -> bool:
+        """Returns whether the planner needs to see ``frame``, False if it shows nothing new."""
+        changed = (
+            frame is None
+            or self.previous is None
+            or visibly_changed(self.previous, frame, self.max_distance, self.tolerance)
+        )
+        if self.steps:
+            self.loops.record(self.actions, changed)
+        self.steps += 1
+        self.actions = []
+        if frame is not None:
+            self.previous = frame
+        self.stats.update(steps=1, unchanged=int(not changed))
+
+        if self.loops.looping:
+            self.stats.update(loops=1)
+            names = ", ".join(name for name, _ in self.loops._last)
+            raise RepeatedActionError(
+                f"Stopped after {self.loops.repeats} steps of {names} without a visible change"
+            )
+        if not changed:
+            logger.info("The screen did not visibly change since the last step")
+        return changed or not self.skip_unchanged
+
+    def acted(self, name: str, args: Optional[dict]):
+        self.actions.append((name, args or {}))
@@ -1,8 +1,36 @@
 import openai
-from typing import Any
+from functools import lru_cache
+from typing import Any, Optional
 from . import Planner, logger
+from .history import ChatHistory
 import json
 from clickclickclick.config import BaseConfig
+from clickclickclick.screen import Frame
+
+
+def make_async_client(model_config: dict):
+    """
+    Returns an async client with the same settings the module level client is given.
+
+    Planners, finders and their per-task sessions with the same settings share one client,
+    and with it one pool of warm connections.
+    """
+    return _async_client(
+        model_config.get("api_type"),
+        model_config.get("api_key"),
+        model_config.get("azure_endpoint"),
+        model_config.get("api_version"),
+        model_config.get("base_url"),
+    )
+
+
+@lru_cache(maxsize=None)
+def _async_client(api_type, api_key, azure_endpoint, api_version, base_url):
+    if api_type == "azure":
+        return openai.AsyncAzureOpenAI(
+            api_key=api_key, azure_endpoint=azure_endpoint, api_version=api_version
+        )
+    return openai.AsyncOpenAI(api_key=api_key, base_url=base_url)
 
 
 class ChatGPTPlanner(Planner):
@@ -13,6 +41,8 @@ class ChatGPTPlanner(Planner):
             f"{prompts['common-planner-prompt']}\n{prompts['specific-planner-prompt']}"
         )
         planner_config = c.models.get("planner_config")
+        self.planner_config = planner_config
+        self._async_client = None
         openai.api_key = planner_config.get("api_key")
         openai.azure_endpoint = planner_config.get("azure_endpoint")
         openai.api_type = planner_config.get("api_type")
@@ -22,11 +52,35 @@ class ChatGPTPlanner(Planner):
             openai.base_url = base_url
         self.model_name = planner_config.get("model_name")
         self.functions = c.function_declarations
+        self.history_token_budget = planner_config.get(
+            "history_token_budget", c.PLANNER_HISTORY_TOKEN_BUDGET
+        )
 
         self.system_instruction = system_instruction
-        self.chat_history = [{"role": "system", "content": system_instruction}]
+        # Built once so the cacheable prefix (tools, system prompt, then the pinned task prompt)
+        # is byte-for-byte the same on every request and OpenAI's automatic prompt caching hits
+        self.tools = [
+            {
+                "type": "function",
+                "function": {
+                    **fn,
+                    "parameters": {**fn["parameters"], "additionalProperties": False},
+                    "strict": True,
+                },
+            }
+            for fn in self.functions
+        ]
+        self.reset()
+
+    def reset(self):
+        self.chat_history = ChatHistory(self.history_token_budget, self._text_message)
+        self.chat_history.pin({"role": "system", "content": self.system_instruction})
+
+    @staticmethod
+    def _text_message(text: str) -> dict:
+        return {"role": "user", "content": [{"type": "text", "text": text}]}
 
-    def build_prompt(self, query_text=None, base64_image=None):
+    def build_prompt(self, query_text=None, base64_image=None, media_type="image/png"):
         # Handle case when base64_image is None or empty
         if not base64_image:
             if query_text is None:
@@ -34,7 +88,7 @@ class ChatGPTPlanner(Planner):
                     {
                         "role": "user",
                         "content": [
-                            {"type": "text", "text": "No screenshot available - device may not be connected"},
+                            {"type": "text", "text": self.no_screenshot_text()},
                         ],
                     }
                 ]
@@ -57,7 +111,7 @@ class ChatGPTPlanner(Planner):
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}",
+                                "url": f"data:{media_type};base64,{base64_image}",
                                 "detail": "low",
                             },
                         }
@@ -73,7 +127,7 @@ class ChatGPTPlanner(Planner):
                         {
                             "type": "image_url",
                             "image_url": {
-                                "url": f"data:image/png;base64,{base64_image}",
+                                "url": f"data:{media_type};base64,{base64_image}",
                                 "detail": "low",
                             },
                         },
@@ -81,48 +135,38 @@ class ChatGPTPlanner(Planner):
                 }
             ]
 
-    def llm_response(self, prompt=None, screenshot=None) -> list[tuple[str, dict]]:
-        # Remove all prev screenshots
-        new_chat_history = []
-        for message in self.chat_history:
-            if message["role"] == "user" and any(
-                item["type"] == "image_url" for item in message["content"]
-            ):
+    @property
+    def async_client(self):
+        # created on first use, inside the event loop that drives it
+        if self._async_client is None:
+            self._async_client = make_async_client(self.planner_config)
+        return self._async_client
 
-                filtered_content = [
-                    item for item in message["content"] if item["type"] != "image_url"
-                ]
-                new_chat_history.append({"role": message["role"], "content": filtered_content})
-
-            else:
-                new_chat_history.append(message)
-        # Append the current prompt to the chat history
+    def _prepare_request(self, prompt=None, screenshot: Optional[Frame] = None) -> dict:
+        if prompt and self.chat_history.task_prompt is None:
+            self.chat_history.set_task(prompt, self.build_prompt(prompt)[0])
+        # the task prompt is pinned, only send a prompt along if it is a different one
+        query_text = None if prompt == self.chat_history.task_prompt else prompt
+        # Append the current prompt, this strips the previous screenshot from the chat history
         if screenshot:
-            prompt_with_image = self.build_prompt(
-                prompt, f"{screenshot}"
-            )  # data:image/jpeg;base64,
-            new_chat_history.extend(prompt_with_image)
+            self.chat_history.append_screenshot(
+                self.build_prompt(
+                    query_text, self.codec.base64(screenshot), self.codec.mime_type(screenshot)
+                )[0]
+            )
         else:
-            new_chat_history.extend(self.build_prompt(prompt))
-        self.chat_history = new_chat_history
+            self.chat_history.append(self.build_prompt(query_text)[0])
 
-        completion = openai.chat.completions.create(
+        return dict(
             model=self.model_name,
-            messages=self.chat_history,
-            tools=[
-                {
-                    "type": "function",
-                    "function": {
-                        **fn,
-                        "parameters": {**fn["parameters"], "additionalProperties": False},
-                        "strict": True,
-                    },
-                }
-                for fn in self.functions
-            ],
-            tool_choice="required"
+            messages=self.chat_history.messages(),
+            tools=self.tools,
+            tool_choice="required",
         )
+
+    def _handle_completion(self, completion) -> list[tuple[str, dict]]:
         print(completion)
+        self.cache_stats.record_openai(completion.usage)
         response_message = completion.choices[0].message
         function_name = None
         function_args = None
@@ -149,8 +193,21 @@ class ChatGPTPlanner(Planner):
             list_of_functions_to_call.append((None, None))
         return list_of_functions_to_call
 
+    def llm_response(
+        self, prompt=None, screenshot: Optional[Frame] = None
+    ) -> list[tuple[str, dict]]:
+        completion = openai.chat.completions.create(**self._prepare_request(prompt, screenshot))
+        return self._handle_completion(completion)
+
+    async def llm_response_async(
+        self, prompt=None, screenshot: Optional[Frame] = None
+    ) -> list[tuple[str, dict]]:
+        request = self._prepare_request(prompt, screenshot)
+        completion = await self.async_client.chat.completions.create(**request)
+        return self._handle_completion(completion)
+
     def add_finder_message(self, message):
-        self.chat_history.append({"role": "user", "content": [{"type": "text", "text": message}]})
+        self.chat_history.append(self._text_message(message))
 
     def task_finished(self, reason: str, observation: str):
         logger.info(f"Task finished with reason: {reason}")
@@ -0,0 +1,153 @@
+import asyncio
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from clickclickclick.screen import Frame
+from clickclickclick.tracing import in_current_context, span
+from . import logger
+
+Timings = Dict[str, float]
+
+
+def record_pipeline(stats: Counter, timings: Timings):
+    # the part of capture and encoding that ran while the step was still being wrapped up
+    overlapped = max(0.0, timings["capture"] + timings["encode"] - timings["wait"])
+    stats.update(steps=1, overlapped=overlapped, **timings)
+    logger.info(
+        f"Next frame captured in {timings['capture']:.2f}s and encoded in "
+        f"{timings['encode'] * 1000:.0f} ms, the step waited {timings['wait']:.2f}s for it"
+    )
+
+
+class FramePrefetcher:
+    """
+    Captures and encodes the next step's frame while the current step is wrapped up.
+
+    ``start`` is called once the step's last action is dispatched. It runs ``capture`` (which
+    waits for the screen to settle) and ``prepare`` (which encodes the frame the way the planner
+    sends it, the frame caches the result) on a background thread. ``frame`` returns that frame
+    for the next step, or captures one right away when nothing was started. ``clock`` times
+    the capture, encoding and wait.
+    """
+
+    def __init__(
+        self,
+        capture: Callable[[bool], Optional[Frame]],
+        prepare: Callable[[Frame], Any],
+        stats: Optional[Counter] = None,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.capture = capture
+        self.prepare = prepare
+        self.stats = stats if stats is not None else Counter()
+        self.enabled = enabled
+        self.clock = clock
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._future: Optional[Future] = None
+
+    @property
+    def started(self) -> bool:
+        return self._future is not None
+
+    def _run(self, settle: bool) -> Tuple[Optional[Frame], Timings]:
+        with span("pipeline.prefetch"):
+            started = self.clock()
+            frame = self.capture(settle)
+            captured = self.clock()
+            if frame is not None:
+                try:
+                    self.prepare(frame)
+                except Exception:
+                    # the planner encodes the frame itself when it sends it
+                    logger.exception("Error preparing the next frame")
+        return frame, {"capture": captured - started, "encode": self.clock() - captured}
+
+    def start(self):
+        """Starts capturing the next frame, the screen is still settling from the last action."""
+        if not self.enabled or self.started:
+            return
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="frame-prefetch")
+        # the capture's spans belong to the step that started it
+        self._future = self._pool.submit(in_current_context(self._run), True)
+
+    def frame(self, settle: bool = True) -> Optional[Frame]:
+        """The next step's frame, the prefetched one if capturing it was started."""
+        if not self.started:
+            return self.capture(settle)
+        waiting = self.clock()
+        future, self._future = self._future, None
+        frame, timings = future.result()
+        timings["wait"] = self.clock() - waiting
+        record_pipeline(self.stats, timings)
+        return frame
+
+    def close(self):
+        """Waits for a capture still in flight, e.g. after the task finished, and stops the thread."""
+        self._future = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+
+class FramePrefetcherAsync:
+    """FramePrefetcher for the async engine, the capture runs as a task on the event loop."""
+
+    def __init__(
+        self,
+        capture: Callable[[bool], Awaitable[Optional[Frame]]],
+        prepare: Callable[[Frame], Any],
+        stats: Optional[Counter] = None,
+        enabled: bool = True,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        self.capture = capture
+        self.prepare = prepare
+        self.stats = stats if stats is not None else Counter()
+        self.enabled = enabled
+        self.clock = clock
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def started(self) -> bool:
+        return self._task is not None
+
+    async def _run(self, settle: bool) -> Tuple[Optional[Frame], Timings]:
+        with span("pipeline.prefetch"):
+            started = self.clock()
+            frame = await self.capture(settle)
+            captured = self.clock()
+            if frame is not None:
+                try:
+                    # encoding is CPU work, keep it off the loop
+                    await asyncio.to_thread(self.prepare, frame)
+                except Exception:
+                    logger.exception("Error preparing the next frame")
+        return frame, {"capture": captured - started, "encode": self.clock() - captured}
+
+    def start(self):
+        if not self.enabled or self.started:
+            return
+        self._task = asyncio.ensure_future(self._run(True))
+
+    async def frame(self, settle: bool = True) -> Optional[Frame]:
+        if not self.started:
+            return await self.capture(settle)
+        waiting = self.clock()
+        task, self._task = self._task, None
+        frame, timings = await task
+        timings["wait"] = self.clock() - waiting
+        record_pipeline(self.stats, timings)
+        return frame
+
+    async def close(self):
+        """Cancels a capture still in flight."""
+        task, self._task = self._task, None
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
@@ -1,22 +1,33 @@
 import re
+import threading
 import time
 from concurrent.futures import ThreadPoolExecutor, TimeoutError
-from typing import Callable, Any, Generator, List
+from typing import Callable, Any, Generator, List, Optional
 
 from . import logger
 from clickclickclick.config import BaseConfig
 from clickclickclick.executor import Executor
 from clickclickclick.finder import BaseFinder
+from clickclickclick.screen import Frame, SettleDetector, SettleResult
+from clickclickclick.screen.store import default_store
+from clickclickclick.tracing import TaskTrace, activate, finish_trace, span
 from . import Planner
-import tempfile
+from .loop import StepTracker
+from .pipeline import FramePrefetcher
 import base64
 
+FINDER_FUNCTIONS = [
+    "find_element_and_click",
+    "find_element_and_long_press",
+    "find_elements_and_click",
+]
+# finder functions that look up a list of prompts in one finder call
+BATCH_FINDER_FUNCTIONS = ["find_elements_and_click"]
+
 
 def create_tempfile_from_base64(base64_string):
-    tmp = tempfile.NamedTemporaryFile(delete=False)
-    tmp.write(base64.b64decode(base64_string))
-    tmp.close()
-    return tmp.name
+    # a file in the frame store's ring, it is deleted once newer frames are written
+    return default_store().write(base64.b64decode(base64_string), suffix="")
 
 
 def save_screenshot(screenshot, is_base64):
@@ -33,9 +44,35 @@ def _process_finder_output(
     executor: Executor,
     finder: BaseFinder,
     planner: Planner,
+    dispatched: Optional[Callable[[], None]] = None,
 ) -> None:
-    """Process finder output and execute appropriate action."""
-    if executed_fn_name not in ["find_element_and_click", "find_element_and_long_press"]:
+    """
+    Process finder output and execute appropriate action. ``dispatched`` is called once the
+    action is sent to the device, before the message for the planner is built.
+    """
+    if executed_fn_name not in FINDER_FUNCTIONS:
+        return
+
+    if executed_fn_name in BATCH_FINDER_FUNCTIONS:
+        try:
+            for ui_element, output in zip(func_args.get("prompts", []), execution_output):
+                if output == "0,0,0,0":
+                    # later clicks usually only make sense after the earlier ones
+                    planner.add_finder_message(
+                        f"The {ui_element} was not found, it and the elements after it were not clicked"
+                    )
+                    return
+                _process_finder_output(
+                    "find_element_and_click",
+                    output,
+                    {"prompt": ui_element},
+                    executor,
+                    finder,
+                    planner,
+                )
+        finally:
+            if dispatched is not None:
+                dispatched()
         return
 
     logger.info(f"Executed Finder with output: {execution_output}")
@@ -49,11 +86,15 @@ def _process_finder_output(
         center_y = (coordinates[1] + coordinates[3]) // 2
 
         if executed_fn_name == "find_element_and_click":
-            executor.click_at_a_point(center_x, center_y, "Clicking center right away")
+            with span("executor.click_at_a_point"):
+                executor.click_at_a_point(center_x, center_y, "Clicking center right away")
             message_text = "and it has been clicked"
         elif executed_fn_name == "find_element_and_long_press":
-            executor.long_press_at_a_point(center_x, center_y, "Long pressing center")
+            with span("executor.long_press_at_a_point"):
+                executor.long_press_at_a_point(center_x, center_y, "Long pressing center")
             message_text = "and it has been long pressed"
+        if dispatched is not None:
+            dispatched()
 
         scaled_output = ",".join(map(str, scaled_coordinates))
         message = f"The UI bounds of the {ui_element} is {scaled_output} {message_text}"
@@ -63,50 +104,149 @@ def _process_finder_output(
         logger.error(f"Invalid finder output format: {execution_output}, error: {e}")
 
 
-def _execute_task_step(
-    prompt: str, executor: Executor, planner: Planner, finder: BaseFinder, c: BaseConfig
-) -> bool:
-    """Execute a single step of the task."""
-    screenshot = executor.screenshot(
-        "Planner took screenshot",
-        executor.screenshot_as_base64,
-        executor.screenshot_as_tempfile,
+def prompt_cache_stats(planner: Planner, finder: BaseFinder) -> dict:
+    return {
+        "planner": planner.cache_stats.to_dict(),
+        "finder": finder.cache_stats.to_dict(),
+    }
+
+
+def log_prompt_cache_stats(planner: Planner, finder: BaseFinder):
+    logger.info(f"Prompt cache, planner: {planner.cache_stats}, finder: {finder.cache_stats}")
+
+
+def record_settle(executor: Executor, result: SettleResult, c: BaseConfig):
+    # saved against the fixed TASK_DELAY sleep and the capture after it, which the wait's own
+    # final capture replaces; negative when a slow screen needed longer
+    saved = c.TASK_DELAY + result.capture_seconds - result.seconds
+    executor.settle_stats.update(
+        steps=1,
+        settled=int(result.settled),
+        captures=result.captures,
+        seconds=result.seconds,
+        saved=saved,
+    )
+    logger.info(
+        f"Screen {'settled' if result.settled else 'still changing'} after {result.seconds:.2f}s "
+        f"and {result.captures} captures, {saved:+.2f}s against TASK_DELAY"
     )
-    logger.info("Generated screenshot")
-    time.sleep(c.TASK_DELAY)
 
-    llm_responses = planner.llm_response(prompt, screenshot)
-    for func_name, func_args in llm_responses:
-        logger.debug(f"Executing {func_name} with {func_args}")
 
-        try:
-            execution_output, executed_fn_name = parse_and_execute(
-                func_name, func_args, executor, planner, finder
-            )
+def capture_settled_frame(
+    executor: Executor, c: BaseConfig, settle: bool = True
+) -> Optional[Frame]:
+    """
+    Lets the previous action settle and captures the frame that planner and finder share.
+    Before the first step there was no action, the screen is captured right away.
+    """
+    if not c.SETTLE_MAX_WAIT:
+        with span("step.sleep"):
+            time.sleep(c.TASK_DELAY)
+        return executor.capture_frame("Planner took screenshot")
+    if not settle:
+        return executor.capture_frame("Planner took screenshot")
+    with span("step.settle"):
+        result = SettleDetector.from_config(c).wait(
+            lambda: executor.capture_frame("Planner took screenshot"),
+            executor.probe_screen if executor.has_screen_probe else None,
+        )
+    record_settle(executor, result, c)
+    return result.frame
+
+
+def frame_prefetcher(
+    executor: Executor, planner: Planner, c: BaseConfig, enabled: bool = True
+) -> FramePrefetcher:
+    """Captures and encodes each step's frame while the step before is still wrapped up."""
+    return FramePrefetcher(
+        lambda settle: capture_settled_frame(executor, c, settle),
+        planner.prepare_screenshot,
+        executor.pipeline_stats,
+        enabled=enabled and c.PIPELINE_CAPTURE,
+    )
 
-            if executed_fn_name == "task_finished":
-                return True
 
-            if executed_fn_name in ["find_element_and_click", "find_element_and_long_press"]:
-                _process_finder_output(
-                    executed_fn_name, execution_output, func_args, executor, finder, planner
+def planner_response(planner: Planner, prompt: str, frame: Optional[Frame], tracker: StepTracker):
+    """Asks the planner for the step's actions, without the screenshot if nothing changed."""
+    changed = tracker.observe(frame)
+    with span("planner.llm_response", planner=type(planner).__name__, unchanged=not changed):
+        if changed:
+            return planner.llm_response(prompt, frame)
+        return planner.llm_response_unchanged(prompt)
+
+
+def _execute_task_step(
+    prompt: str,
+    executor: Executor,
+    planner: Planner,
+    finder: BaseFinder,
+    c: BaseConfig,
+    tracker: Optional[StepTracker] = None,
+    prefetcher: Optional[FramePrefetcher] = None,
+) -> bool:
+    """Execute a single step of the task."""
+    with span("task.step"):
+        tracker = tracker or StepTracker(c, executor.screen_stats)
+        prefetcher = prefetcher or frame_prefetcher(executor, planner, c, enabled=False)
+        frame = prefetcher.frame(settle=bool(tracker.steps))
+        logger.info("Generated screenshot")
+
+        llm_responses = planner_response(planner, prompt, frame, tracker)
+        for index, (func_name, func_args) in enumerate(llm_responses):
+            logger.debug(f"Executing {func_name} with {func_args}")
+            tracker.acted(func_name, func_args)
+            # the step's last action starts capturing the next frame
+            dispatched = prefetcher.start if index == len(llm_responses) - 1 else None
+
+            try:
+                execution_output, executed_fn_name = parse_and_execute(
+                    func_name, func_args, executor, planner, finder
                 )
 
-        except Exception as e:
-            logger.error(f"Error executing function {func_name}: {e}")
-            continue
+                if executed_fn_name == "task_finished":
+                    return True
+
+                if executed_fn_name in FINDER_FUNCTIONS:
+                    _process_finder_output(
+                        executed_fn_name,
+                        execution_output,
+                        func_args,
+                        executor,
+                        finder,
+                        planner,
+                        dispatched,
+                    )
+
+            except Exception as e:
+                logger.error(f"Error executing function {func_name}: {e}")
+                continue
+            finally:
+                # a frame already being captured is the next step's, it mustn't be dropped
+                if not prefetcher.started:
+                    executor.invalidate_frame()
+            if dispatched:
+                dispatched()
 
-    return False
+        return False
 
 
 def execute_task(
-    prompt: str, executor: Executor, planner: Planner, finder: BaseFinder, c: BaseConfig
+    prompt: str,
+    executor: Executor,
+    planner: Planner,
+    finder: BaseFinder,
+    c: BaseConfig,
+    trace: Optional[TaskTrace] = None,
 ) -> bool:
     """Execute a task with proper error handling and logging."""
+    trace = trace or TaskTrace()
+    prefetcher = frame_prefetcher(executor, planner, c)
     try:
-        while True:
-            if _execute_task_step(prompt, executor, planner, finder, c):
-                return True
+        with activate(trace), span("task", prompt=prompt):
+            tracker = StepTracker(c, executor.screen_stats)
+            while True:
+                if _execute_task_step(prompt, executor, planner, finder, c, tracker, prefetcher):
+                    return True
 
     except KeyboardInterrupt:
         logger.info("Task execution interrupted by user")
@@ -114,55 +254,88 @@ def execute_task(
     except Exception as e:
         logger.exception(f"An error occurred during task execution: {e}")
         return False
+    finally:
+        prefetcher.close()
+        log_prompt_cache_stats(planner, finder)
+        finish_trace(trace, c)
 
 
 def execute_task_with_generator(
-    prompt: str, executor: Executor, planner: Planner, finder: BaseFinder, c: BaseConfig
+    prompt: str,
+    executor: Executor,
+    planner: Planner,
+    finder: BaseFinder,
+    c: BaseConfig,
+    trace: Optional[TaskTrace] = None,
+    stop: Optional[threading.Event] = None,
 ) -> Generator[List[str], None, bool]:
-    """Execute a task with generator for streaming results."""
+    """
+    Execute a task with generator for streaming results.
+
+    Each resumption may run in another context (the API advances it on worker threads), so
+    the trace is made current again for each part of a step instead of across the yields.
+    Once ``stop`` is set the task ends before its next model request or device action.
+    """
+    trace = trace or TaskTrace()
+    task = trace.begin("task", prompt=prompt)
+    prefetcher = frame_prefetcher(executor, planner, c)
     try:
         observation = ""
+        tracker = StepTracker(c, executor.screen_stats)
         while True:
-            screenshot = executor.screenshot(
-                "Planner took screenshot",
-                executor.screenshot_as_base64,
-                executor.screenshot_as_tempfile,
-            )
+            step = trace.begin("task.step", task)
+            with activate(trace, step):
+                frame = prefetcher.frame(settle=bool(tracker.steps))
             logger.info("Generated screenshot")
-            time.sleep(c.TASK_DELAY)
 
             # Yield screenshot for streaming
-            if executor.screenshot_as_base64:
-                yield [(create_tempfile_from_base64(screenshot), observation)]
-            else:
-                yield [(screenshot, observation)]
+            yield [(frame.path if frame else None, observation)]
 
             # Execute task step
-            llm_responses = planner.llm_response(prompt, screenshot)
-            for func_name, func_args in llm_responses:
-                logger.debug(f"Executing {func_name} with {func_args}")
-
-                try:
-                    execution_output, executed_fn_name = parse_and_execute(
-                        func_name, func_args, executor, planner, finder
-                    )
-
-                    if executed_fn_name == "task_finished":
-                        return True
-
-                    if executed_fn_name in [
-                        "find_element_and_click",
-                        "find_element_and_long_press",
-                    ]:
-                        _process_finder_output(
-                            executed_fn_name, execution_output, func_args, executor, finder, planner
+            with activate(trace, step):
+                if stop is not None and stop.is_set():
+                    logger.info("Task stopped")
+                    return False
+                llm_responses = planner_response(planner, prompt, frame, tracker)
+                for index, (func_name, func_args) in enumerate(llm_responses):
+                    if stop is not None and stop.is_set():
+                        logger.info("Task stopped")
+                        return False
+                    logger.debug(f"Executing {func_name} with {func_args}")
+                    tracker.acted(func_name, func_args)
+                    dispatched = prefetcher.start if index == len(llm_responses) - 1 else None
+
+                    try:
+                        execution_output, executed_fn_name = parse_and_execute(
+                            func_name, func_args, executor, planner, finder
                         )
 
-                except Exception as e:
-                    logger.error(f"Error executing function {func_name}: {e}")
-                    continue
-
-                observation = func_args.get("observation", "")
+                        if executed_fn_name == "task_finished":
+                            return True
+
+                        if executed_fn_name in FINDER_FUNCTIONS:
+                            _process_finder_output(
+                                executed_fn_name,
+                                execution_output,
+                                func_args,
+                                executor,
+                                finder,
+                                planner,
+                                dispatched,
+                            )
+
+                    except Exception as e:
+                        logger.error(f"Error executing function {func_name}: {e}")
+                        continue
+                    finally:
+                        if not prefetcher.started:
+                            executor.invalidate_frame()
+                    if dispatched:
+                        dispatched()
+
+                    observation = func_args.get("observation", "")
+
+            trace.end(step)
 
     except KeyboardInterrupt:
         logger.info("Task execution interrupted by user")
@@ -170,6 +343,10 @@ def execute_task_with_generator(
     except Exception as e:
         logger.exception(f"An error occurred during task execution: {e}")
         raise e
+    finally:
+        prefetcher.close()
+        log_prompt_cache_stats(planner, finder)
+        finish_trace(trace, c)
 
 
 # TODO: move to utils
@@ -191,7 +368,8 @@ def parse_and_execute(
     args = function_args if function_args is not None else []
 
     func = get_function(func_name, executor, planner, finder)
-    return (func(**args), func_name)
+    with span(f"tool.{func_name}"):
+        return (func(**args), func_name)
 
 
 def get_function(
@@ -201,6 +379,7 @@ def get_function(
         "screenshot": executor.screenshot,
         "find_element_and_click": finder.find_element,
         "find_element_and_long_press": finder.find_element,
+        "find_elements_and_click": finder.find_elements,
         "move_mouse": executor.move_mouse,
         "click_mouse": executor.click_mouse,
         "type_text": executor.type_text,
@@ -0,0 +1,60 @@
+from typing import Optional
+
+
+class PromptCacheStats:
+    """Provider-side prompt cache hits and misses of one task, per planner or finder."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.cached_tokens = 0
+        self.input_tokens = 0
+
+    def record(self, cached_tokens: Optional[int], input_tokens: Optional[int]):
+        """Records one request, ``input_tokens`` includes the ones read from the cache."""
+        cached_tokens = cached_tokens or 0
+        if cached_tokens:
+            self.hits += 1
+        else:
+            self.misses += 1
+        self.cached_tokens += cached_tokens
+        self.input_tokens += input_tokens or 0
+
+    def record_anthropic(self, usage):
+        # anthropic reports cached, newly cached and uncached input tokens separately
+        cached = getattr(usage, "cache_read_input_tokens", None) or 0
+        created = getattr(usage, "cache_creation_input_tokens", None) or 0
+        self.record(cached, (getattr(usage, "input_tokens", None) or 0) + cached + created)
+
+    def record_openai(self, usage):
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        self.record(getattr(details, "cached_tokens", None), usage.prompt_tokens)
+
+    def record_gemini(self, usage_metadata):
+        if usage_metadata is None:
+            return
+        self.record(
+            getattr(usage_metadata, "cached_content_token_count", None),
+            getattr(usage_metadata, "prompt_token_count", None),
+        )
+
+    @property
+    def hit_rate(self) -> float:
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cached_tokens": self.cached_tokens,
+            "input_tokens": self.input_tokens,
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"{self.hits} hits, {self.misses} misses, "
+            f"{self.cached_tokens}/{self.input_tokens} input tokens cached"
+        )
@@ -0,0 +1,64 @@
+import threading
+from typing import Dict, Tuple
+
+from clickclickclick.config import BaseConfig, get_config
+from clickclickclick.executor import Executor
+from clickclickclick.finder import BaseFinder
+from clickclickclick.planner import Planner
+from clickclickclick.utils import configure_executor, get_finder, get_planner
+
+Key = Tuple[str, str, str]
+
+
+class Registry:
+    """
+    Process-wide cache of configs, planners and finders per (platform, planner, finder).
+
+    The config YAMLs are parsed and the provider clients (and their connection pools, or
+    local model weights) are set up once per key. Each task gets a session: a cheap copy that
+    shares those and only owns its chat history and executor.
+    """
+
+    def __init__(self):
+        self._configs: Dict[Key, BaseConfig] = {}
+        self._planners: Dict[Key, Planner] = {}
+        self._finders: Dict[Key, BaseFinder] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(platform: str, planner_model: str, finder_model: str) -> Key:
+        return platform.lower(), planner_model.lower(), finder_model.lower()
+
+    def config(self, platform: str, planner_model: str, finder_model: str) -> BaseConfig:
+        key = self._key(platform, planner_model, finder_model)
+        with self._lock:
+            if key not in self._configs:
+                self._configs[key] = get_config(*key)
+            return self._configs[key]
+
+    def _prototypes(self, key: Key) -> Tuple[BaseConfig, Planner, BaseFinder]:
+        c = self.config(*key)
+        with self._lock:
+            if key not in self._planners:
+                self._planners[key] = get_planner(key[1], c, None)
+            if key not in self._finders:
+                self._finders[key] = get_finder(key[2], c, None)
+            return c, self._planners[key], self._finders[key]
+
+    def session(
+        self, platform: str, planner_model: str, finder_model: str, executor: Executor
+    ) -> Tuple[BaseConfig, Planner, BaseFinder]:
+        """Config, planner and finder for one task on ``executor``."""
+        key = self._key(platform, planner_model, finder_model)
+        c, planner, finder = self._prototypes(key)
+        configure_executor(planner_model, executor, planner.codec)
+        return c, planner.new_session(executor), finder.new_session(executor)
+
+    def clear(self):
+        with self._lock:
+            self._configs.clear()
+            self._planners.clear()
+            self._finders.clear()
+
+
+registry = Registry()
@@ -0,0 +1,567 @@
+"""
+Replays recorded device sessions through the real task loop without a device or a model.
+
+A ``ReplaySession`` is a task's screenshots, UI hierarchy dumps and the actions the planner
+took on each screen, plus where the elements the finder located were. ``ReplayExecutor``
+serves the recorded screens in place of a device, ``ReplayPlanner`` and ``ReplayFinder``
+answer with the recorded actions and elements after a configurable latency, and
+``run_replay`` runs them through ``execute_task`` and reports steps per second, CPU time,
+peak memory and the bytes encoded per step. Everything else - settling, unchanged screen
+detection, the frame prefetch, encoding, the finder's hierarchy, cache and segment passes -
+is the code that runs against a real device, so regressions in it show up here.
+
+Sessions are recorded from a real task with ``SessionRecorder``, or generated with
+``synthetic_session`` for CI boxes without recordings.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+from clickclickclick.config import BaseConfig
+from clickclickclick.executor import Executor
+from clickclickclick.finder import NO_ELEMENT_RESPONSE, BaseFinder, configure_finder
+from clickclickclick.planner import Planner
+from clickclickclick.planner.task import execute_task
+from clickclickclick.screen import Frame, ImageCodec
+from clickclickclick.tracing import TaskTrace
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+SESSION_FILE = "session.json"
+FINISHED = ("task_finished", {"reason": "replay finished", "observation": "replay finished"})
+# planner functions that don't act on the device
+NO_DEVICE_ACTION = ("task_finished", "screenshot")
+
+Box = Tuple[int, int, int, int]
+
+
+@dataclass
+class RecordedStep:
+    """
+    One screen of a session: the PNG the device showed, its UI hierarchy, the actions the
+    planner took on it and the (left, top, right, bottom) screen pixels of the elements the
+    finder was asked for.
+    """
+
+    frame: bytes
+    hierarchy: Optional[str] = None
+    actions: List[Tuple[str, dict]] = field(default_factory=list)
+    elements: Dict[str, Box] = field(default_factory=dict)
+
+    @property
+    def device_actions(self) -> int:
+        """How many actions the executor is sent for the step's planner actions."""
+        count = 0
+        for name, args in self.actions:
+            if name == "find_elements_and_click":
+                count += len(args.get("prompts", []))
+            elif name not in NO_DEVICE_ACTION:
+                count += 1
+        return count
+
+    def contains(self, x: int, y: int) -> bool:
+        """Whether the point is on one of the step's elements."""
+        return any(
+            left <= x <= right and top <= y <= bottom
+            for left, top, right, bottom in self.elements.values()
+        )
+
+
+@dataclass
+class ReplaySession:
+    prompt: str
+    screen_size: Tuple[int, int]
+    steps: List[RecordedStep] = field(default_factory=list)
+
+    @classmethod
+    def load(cls, directory: str) -> "ReplaySession":
+        with open(os.path.join(directory, SESSION_FILE)) as file:
+            data = json.load(file)
+        steps = []
+        for step in data["steps"]:
+            with open(os.path.join(directory, step["frame"]), "rb") as file:
+                frame = file.read()
+            hierarchy = None
+            if step.get("hierarchy"):
+                with open(os.path.join(directory, step["hierarchy"])) as file:
+                    hierarchy = file.read()
+            steps.append(
+                RecordedStep(
+                    frame,
+                    hierarchy,
+                    [(name, args) for name, args in step["actions"]],
+                    {prompt: tuple(box) for prompt, box in step.get("elements", {}).items()},
+                )
+            )
+        return cls(data["prompt"], tuple(data["screen_size"]), steps)
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        steps = []
+        for index, step in enumerate(self.steps):
+            frame = f"{index:03d}.png"
+            with open(os.path.join(directory, frame), "wb") as file:
+                file.write(step.frame)
+            hierarchy = None
+            if step.hierarchy:
+                hierarchy = f"{index:03d}.xml"
+                with open(os.path.join(directory, hierarchy), "w") as file:
+                    file.write(step.hierarchy)
+            steps.append(
+                {
+                    "frame": frame,
+                    "hierarchy": hierarchy,
+                    "actions": [[name, args] for name, args in step.actions],
+                    "elements": {prompt: list(box) for prompt, box in step.elements.items()},
+                }
+            )
+        data = {"prompt": self.prompt, "screen_size": list(self.screen_size), "steps": steps}
+        with open(os.path.join(directory, SESSION_FILE), "w") as file:
+            json.dump(data, file, indent=2)
+
+
+def _plain(value):
+    # planner SDKs hand out their own map and list types, the session is plain JSON
+    if isinstance(value, Mapping):
+        return {str(key): _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)) or (
+        hasattr(value, "__iter__") and not isinstance(value, (str, bytes))
+    ):
+        return [_plain(item) for item in value]
+    return value
+
+
+class SessionRecorder:
+    """
+    Records a task on a real device as a ReplaySession.
+
+    It wraps the planner's ``llm_response`` and the finder's lookups of this task's instances,
+    so the task runs as usual: each planner request records the screen it was sent with its
+    UI hierarchy and actions, each lookup the screen pixels of the element it found.
+    """
+
+    def __init__(self, prompt: str, executor: Executor, planner: Planner, finder: BaseFinder):
+        self.executor = executor
+        self.finder = finder
+        self.session = ReplaySession(prompt, executor.screen_size)
+        self._wrap(planner, finder)
+
+    def _wrap(self, planner: Planner, finder: BaseFinder):
+        llm_response = planner.llm_response
+        find_element = finder.find_element
+        find_elements = finder.find_elements
+
+        def recorded_llm_response(prompt, screenshot):
+            actions = llm_response(prompt, screenshot)
+            self._record_step(screenshot, actions)
+            return actions
+
+        def recorded_find_element(prompt, observation):
+            bounds = find_element(prompt, observation)
+            self._record_element(prompt, bounds)
+            return bounds
+
+        def recorded_find_elements(prompts, observation):
+            found = find_elements(prompts, observation)
+            for prompt, bounds in zip(prompts, found):
+                self._record_element(prompt, bounds)
+            return found
+
+        planner.llm_response = recorded_llm_response
+        finder.find_element = recorded_find_element
+        finder.find_elements = recorded_find_elements
+
+    def _record_step(self, screenshot: Optional[Frame], actions):
+        if screenshot is not None:
+            frame = screenshot.png
+        elif self.session.steps:
+            # the screen did not change, the planner was not sent it again
+            frame = self.session.steps[-1].frame
+        else:
+            frame = self.executor.current_frame("Recording the screen").png
+        self.session.steps.append(
+            RecordedStep(
+                frame,
+                self.executor.ui_hierarchy(),
+                [(name, _plain(args or {})) for name, args in actions],
+            )
+        )
+
+    def _record_element(self, prompt: str, bounds: str):
+        if not self.session.steps or bounds == "0,0,0,0":
+            return
+        # image space ymin,xmin,ymax,xmax to screen pixels
+        screen_x, screen_y = self.session.screen_size
+        ymin, xmin, ymax, xmax = map(int, bounds.split(","))
+        scale_x = screen_x / self.finder.IMAGE_WIDTH
+        scale_y = screen_y / self.finder.IMAGE_HEIGHT
+        self.session.steps[-1].elements[prompt] = (
+            round(xmin * scale_x),
+            round(ymin * scale_y),
+            round(xmax * scale_x),
+            round(ymax * scale_y),
+        )
+
+    def save(self, directory: str):
+        self.session.save(directory)
+
+
+class ReplayExecutor(Executor):
+    """
+    Shows a session's screens in place of a device. Once the planner answered a screen, it
+    moves on to the next recorded one with the last of the step's actions, so a finder lookup
+    after a swipe still sees the screen it was recorded on. Captures decode the recorded PNG
+    like a device capture does.
+    """
+
+    def __init__(
+        self, session: ReplaySession, capture_latency: float = 0.0, action_latency: float = 0.0
+    ):
+        super().__init__()
+        self.session = session
+        self.capture_latency = capture_latency
+        self.action_latency = action_latency
+        # the step the device shows and the one of the last captured frame
+        self.position = 0
+        self.shown_index: Optional[int] = None
+        # actions still to come before the device shows the next step
+        self._pending = 0
+        self.actions: List[Tuple[str, dict]] = []
+        self.missed_clicks = 0
+
+    @property
+    def shown(self) -> Optional[RecordedStep]:
+        if self.shown_index is None:
+            return None
+        return self.session.steps[self.shown_index]
+
+    @property
+    def finished(self) -> bool:
+        """Whether every recorded step was acted on."""
+        return self.position >= len(self.session.steps)
+
+    def answered(self, index: int):
+        """The planner answered step ``index``, the screen changes once its actions are sent."""
+        self._pending = self.session.steps[index].device_actions
+        if not self._pending:
+            self.position = index + 1
+
+    def _capture_frame(self) -> Optional[Frame]:
+        time.sleep(self.capture_latency)
+        self.shown_index = min(self.position, len(self.session.steps) - 1)
+        return Frame(data=self.session.steps[self.shown_index].frame)
+
+    def _dump_hierarchy(self) -> Optional[str]:
+        return self.shown.hierarchy if self.shown is not None else None
+
+    def _probe_screen_size(self) -> Tuple[int, int]:
+        return tuple(self.session.screen_size)
+
+    def _act(self, name: str, **args) -> bool:
+        time.sleep(self.action_latency)
+        self.actions.append((name, args))
+        if self._pending:
+            self._pending -= 1
+            if not self._pending:
+                self.position += 1
+        return True
+
+    def _tap(self, name: str, x: int, y: int) -> bool:
+        if self.shown is not None and not self.shown.contains(x, y):
+            logger.warning(f"{name} at {x},{y} is not on a recorded element")
+            self.missed_clicks += 1
+        return self._act(name, x=x, y=y)
+
+    def move_mouse(self, x: int, y: int, observation: str) -> bool:
+        return self._act("move_mouse", x=x, y=y)
+
+    def press_key(self, key: List[str], observation: str) -> bool:
+        return self._act("press_key", key=key)
+
+    def type_text(self, text: str, observation: str) -> bool:
+        return self._act("type_text", text=text)
+
+    def click_mouse(self, observation: str, button: str = "left") -> bool:
+        return self._act("click_mouse", button=button)
+
+    def double_click_mouse(self, button: str, observation: str) -> bool:
+        return self._act("double_click_mouse", button=button)
+
+    def scroll(self, clicks: int, observation: str) -> bool:
+        return self._act("scroll", clicks=clicks)
+
+    def swipe_right(self, observation: str) -> bool:
+        return self._act("swipe_right")
+
+    def swipe_left(self, observation: str) -> bool:
+        return self._act("swipe_left")
+
+    def swipe_up(self, observation: str) -> bool:
+        return self._act("swipe_up")
+
+    def swipe_down(self, observation: str) -> bool:
+        return self._act("swipe_down")
+
+    def volume_up(self, observation: str) -> bool:
+        return self._act("volume_up")
+
+    def volume_down(self, observation: str) -> bool:
+        return self._act("volume_down")
+
+    def navigate_back(self, observation: str) -> bool:
+        return self._act("navigate_back")
+
+    def minimize_app(self, observation: str) -> bool:
+        return self._act("minimize_app")
+
+    def screenshot(self, observation: str) -> str:
+        return self.current_frame(observation).path
+
+    def click_at_a_point(self, x: int, y: int, observation: str) -> bool:
+        return self._tap("click_at_a_point", x, y)
+
+    def long_press_at_a_point(self, x: int, y: int, observation: str) -> bool:
+        return self._tap("long_press_at_a_point", x, y)
+
+
+class ReplayPlanner(Planner):
+    """Answers with the actions recorded for the screen it is shown, after ``latency`` seconds."""
+
+    def __init__(self, executor: ReplayExecutor, latency: float = 0.0):
+        self.executor = executor
+        self.latency = latency
+        self.reset()
+        self.finder_messages: List[str] = []
+
+    def llm_response(self, prompt, screenshot):
+        if screenshot is not None:
+            # what a request with the screenshot costs on this side of the network
+            self.codec.base64(screenshot)
+        time.sleep(self.latency)
+        step = self.executor.shown
+        if step is None or self.executor.finished:
+            return [FINISHED]
+        self.executor.answered(self.executor.shown_index)
+        return [(name, dict(args)) for name, args in step.actions]
+
+    def add_finder_message(self, message):
+        self.finder_messages.append(message)
+
+    def task_finished(self, reason, observation: str = ""):
+        logger.info(f"Task finished, reason: {reason}")
+        return True
+
+
+class ReplayFinder(BaseFinder):
+    """
+    Answers each segment with the recorded element's box within it, after ``latency`` seconds.
+    Segments are encoded like a model request's image, elements that weren't recorded on the
+    screen are not found.
+    """
+
+    IMAGE_WIDTH = 768
+    IMAGE_HEIGHT = 768
+    OUTPUT_WIDTH = 1000
+    OUTPUT_HEIGHT = 1000
+
+    def __init__(self, executor: ReplayExecutor, latency: float = 0.0):
+        super().__init__(None, "replay", {}, "", executor)
+        self.latency = latency
+
+    def process_segment(self, segment, model, prompt):
+        segment_frame, coordinates = segment
+        self.codec.base64(segment_frame)
+        time.sleep(self.latency)
+        step = self.executor.shown
+        box = step.elements.get(prompt) if step is not None else None
+        if box is None:
+            return NO_ELEMENT_RESPONSE, coordinates
+        screen_x, screen_y = self.executor.screen_size
+        scale_x, scale_y = self.IMAGE_WIDTH / screen_x, self.IMAGE_HEIGHT / screen_y
+        left, top, right, bottom = coordinates
+        element = {
+            "ymin": (box[1] * scale_y - top) / (bottom - top) * self.OUTPUT_HEIGHT,
+            "xmin": (box[0] * scale_x - left) / (right - left) * self.OUTPUT_WIDTH,
+            "ymax": (box[3] * scale_y - top) / (bottom - top) * self.OUTPUT_HEIGHT,
+            "xmax": (box[2] * scale_x - left) / (right - left) * self.OUTPUT_WIDTH,
+        }
+        return json.dumps({key: round(value) for key, value in element.items()}), coordinates
+
+
+@dataclass
+class ReplayReport:
+    steps: int
+    finished: bool
+    seconds: float
+    cpu_seconds: float
+    # the process's peak resident memory so far, not only this run's
+    peak_rss: int
+    encoded_bytes: int
+    actions: int
+    missed_clicks: int
+    stages: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+    @property
+    def steps_per_second(self) -> float:
+        return self.steps / self.seconds if self.seconds else 0.0
+
+    @property
+    def cpu_seconds_per_step(self) -> float:
+        return self.cpu_seconds / self.steps if self.steps else 0.0
+
+    @property
+    def encoded_bytes_per_step(self) -> float:
+        return self.encoded_bytes / self.steps if self.steps else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "steps": self.steps,
+            "finished": self.finished,
+            "seconds": self.seconds,
+            "steps_per_second": self.steps_per_second,
+            "cpu_seconds": self.cpu_seconds,
+            "cpu_seconds_per_step": self.cpu_seconds_per_step,
+            "peak_rss": self.peak_rss,
+            "encoded_bytes": self.encoded_bytes,
+            "encoded_bytes_per_step": self.encoded_bytes_per_step,
+            "actions": self.actions,
+            "missed_clicks": self.missed_clicks,
+            "stages": self.stages,
+        }
+
+
+def peak_rss() -> int:
+    """Peak resident memory of the process in bytes, 0 where it can't be read."""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def replay_config() -> BaseConfig:
+    """The default config without the waits that only make sense on a real device."""
+    c = BaseConfig()
+    c.TASK_DELAY = 0
+    # the settle loop still captures and compares frames, it just doesn't sleep
+    c.SETTLE_MIN_WAIT = 0
+    c.SETTLE_INTERVAL = 0
+    c.TRACE_DIR = ""
+    c.TRACE_OPENTELEMETRY = False
+    return c
+
+
+def run_replay(
+    session: ReplaySession,
+    c: Optional[BaseConfig] = None,
+    planner_latency: float = 0.0,
+    finder_latency: float = 0.0,
+    capture_latency: float = 0.0,
+    action_latency: float = 0.0,
+) -> ReplayReport:
+    """Runs the session through ``execute_task`` and measures it. Latencies are in seconds."""
+    c = c or replay_config()
+    executor = ReplayExecutor(session, capture_latency, action_latency)
+    planner = ReplayPlanner(executor, planner_latency)
+    planner.codec = executor.codec = ImageCodec.from_config(c, "planner_config")
+    finder = configure_finder(ReplayFinder(executor, finder_latency), c)
+    trace = TaskTrace("replay", labels={"planner_model": "replay", "finder_model": "replay"})
+
+    started, cpu_started = time.perf_counter(), time.process_time()
+    finished = execute_task(session.prompt, executor, planner, finder, c, trace)
+    seconds, cpu_seconds = time.perf_counter() - started, time.process_time() - cpu_started
+
+    return ReplayReport(
+        steps=len(trace.durations().get("task.step", [])),
+        finished=finished,
+        seconds=seconds,
+        cpu_seconds=cpu_seconds,
+        peak_rss=peak_rss(),
+        encoded_bytes=sum(
+            span.attributes.get("bytes", 0) for span in trace.spans if span.name == "frame.encode"
+        ),
+        actions=len(executor.actions),
+        missed_clicks=executor.missed_clicks,
+        stages=trace.summary(),
+    )
+
+
+def _hierarchy_xml(screen_size: Tuple[int, int], nodes: List[Tuple[str, Box]]) -> str:
+    width, height = screen_size
+    children = "\n".join(
+        f'  <node index="{index}" text="{text}" resource-id="" class="android.widget.TextView" '
+        f'content-desc="" clickable="true" bounds="[{left},{top}][{right},{bottom}]" />'
+        for index, (text, (left, top, right, bottom)) in enumerate(nodes)
+    )
+    return (
+        "<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation=\"0\">\n"
+        f'<node index="0" text="" resource-id="" class="android.widget.FrameLayout" '
+        f'content-desc="" clickable="false" bounds="[0,0][{width},{height}]">\n'
+        f"{children}\n</node>\n</hierarchy>"
+    )
+
+
+def synthetic_session(
+    steps: int = 10, screen_size: Tuple[int, int] = (1080, 2400), seed: int = 0
+) -> ReplaySession:
+    """
+    A generated session of list screens, for CI boxes without recordings.
+
+    Each screen has an app bar, a photo-like banner that compresses like a real one and rows
+    of text. Even steps tap a row the UI hierarchy knows, odd steps an icon that only the
+    finder's model pass finds, and every third step swipes up first. The last step finishes.
+    """
+    rng = random.Random(seed)
+    width, height = screen_size
+    row_height = height // 16
+    margin, inset = width // 27, row_height // 8
+    session = ReplaySession("open the last item of every list", screen_size)
+    for index in range(steps):
+        image = Image.new("RGB", screen_size, (250, 250, 250))
+        draw = ImageDraw.Draw(image)
+        draw.rectangle((0, 0, width, row_height), fill=(rng.randrange(256), 90, 160))
+        banner_size = (width // 4, row_height)
+        banner = Image.frombytes("RGB", banner_size, rng.randbytes(banner_size[0] * row_height * 3))
+        image.paste(banner.resize((width, row_height * 3)), (0, row_height))
+        rows = []
+        for row in range(8):
+            top = row_height * (4 + row)
+            text = f"Item {index}.{row}"
+            box = (margin, top + inset, width - margin, top + row_height - inset)
+            draw.rectangle(box, outline=(220,) * 3)
+            draw.text((margin * 2, top + row_height // 3), text, fill=(30, 30, 30))
+            rows.append((text, box))
+        icon = (width - margin - row_height, inset, width - margin, row_height - inset)
+        draw.ellipse(icon, fill=(255, 255, 255))
+
+        if index == steps - 1:
+            actions = [FINISHED]
+            elements = {}
+        elif index % 2 == 0:
+            text, box = rows[index % len(rows)]
+            actions = [("find_element_and_click", {"prompt": text, "observation": "a list"})]
+            elements = {text: box}
+        else:
+            prompt = f"menu icon {index}"
+            actions = [("find_element_and_click", {"prompt": prompt, "observation": "a list"})]
+            elements = {prompt: icon}
+        if index % 3 == 2 and index != steps - 1:
+            actions.insert(0, ("swipe_up", {"observation": "more items below"}))
+        session.steps.append(
+            RecordedStep(Frame(image).png, _hierarchy_xml(screen_size, rows), actions, elements)
+        )
+    return session
@@ -0,0 +1,5 @@
+from .frame import Frame
+from .codec import ImageCodec
+from .settle import SettleDetector, SettleResult
+from .fingerprint import dhash, hamming_distance
+from .diff import visibly_changed
@@ -0,0 +1,123 @@
+from typing import Optional, Tuple
+from PIL import Image
+from .frame import Frame
+
+FORMATS = ("PNG", "JPEG", "WEBP", "AUTO")
+MIME_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp"}
+# the lossy format AUTO picks, every provider accepts JPEG
+AUTO_LOSSY_FORMAT = "JPEG"
+# a screen with more distinct colours than this in its sample is treated as a photo
+AUTO_MAX_COLOURS = 512
+AUTO_SAMPLE_SIZE = 64
+QUALITY_STEP = 10
+
+
+class ImageCodec:
+    """
+    How screenshots are encoded for upload to a model.
+
+    ``format`` is PNG, JPEG, WEBP or AUTO. AUTO keeps PNG for flat UI screens, which it
+    compresses well, and switches to JPEG for photos, maps and video. ``max_dimension``
+    downscales the longer side before encoding and ``max_bytes`` lowers the quality of lossy
+    formats step by step, down to ``min_quality``, until the payload fits. Frames cache every
+    resize and encoding, so asking for the same screenshot again costs nothing.
+    """
+
+    def __init__(
+        self,
+        format: str = "PNG",
+        quality: Optional[int] = None,
+        max_dimension: int = 0,
+        max_bytes: int = 0,
+        min_quality: int = 40,
+    ):
+        format = format.upper()
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported image format: {format}, expected one of {FORMATS}")
+        self.format = format
+        self.quality = quality
+        self.max_dimension = max_dimension
+        self.max_bytes = max_bytes
+        self.min_quality = min_quality
+
+    @classmethod
+    def from_config(cls, config, section: str, max_dimension: bool = True) -> "ImageCodec":
+        """
+        A codec with the config's IMAGE_* settings, a model's planner or finder section can set
+        its own ``image_format``, ``image_quality``, ``image_max_dimension`` and
+        ``image_max_bytes``.
+        """
+        model_config = config.models.get(section) or {}
+        return cls(
+            format=model_config.get("image_format", config.IMAGE_FORMAT),
+            quality=model_config.get("image_quality", config.IMAGE_QUALITY),
+            max_dimension=(
+                model_config.get("image_max_dimension", config.IMAGE_MAX_DIMENSION)
+                if max_dimension
+                else 0
+            ),
+            max_bytes=model_config.get("image_max_bytes", config.IMAGE_MAX_BYTES),
+        )
+
+    def __repr__(self):
+        return (
+            f"ImageCodec(format={self.format!r}, quality={self.quality}, "
+            f"max_dimension={self.max_dimension}, max_bytes={self.max_bytes})"
+        )
+
+    def prepare(self, frame: Frame) -> Frame:
+        """The frame scaled down so its longer side is at most ``max_dimension``."""
+        if not self.max_dimension:
+            return frame
+        width, height = frame.size
+        longest = max(width, height)
+        if longest <= self.max_dimension:
+            return frame
+        scale = self.max_dimension / longest
+        return frame.resized(max(1, round(width * scale)), max(1, round(height * scale)))
+
+    def format_for(self, frame: Frame) -> str:
+        if self.format != "AUTO":
+            return self.format
+        # nearest neighbour keeps the actual pixel colours, a filter would blend new ones
+        sample = frame.image.resize(
+            (AUTO_SAMPLE_SIZE, AUTO_SAMPLE_SIZE), Image.Resampling.NEAREST
+        ).convert("RGB")
+        if sample.getcolors(AUTO_MAX_COLOURS) is None:
+            return AUTO_LOSSY_FORMAT
+        return "PNG"
+
+    def settings(self, frame: Frame) -> Tuple[Frame, str, Optional[int]]:
+        """The prepared frame, format and quality this codec encodes ``frame`` with."""
+        frame = self.prepare(frame)
+        format = self.format_for(frame)
+        if format == "PNG":
+            return frame, format, None
+        quality = self.quality
+        if self.max_bytes:
+            quality = quality or 90
+            while (
+                quality - QUALITY_STEP >= self.min_quality
+                and len(frame.encode(format, quality)) > self.max_bytes
+            ):
+                quality -= QUALITY_STEP
+        return frame, format, quality
+
+    def encode(self, frame: Frame) -> bytes:
+        frame, format, quality = self.settings(frame)
+        return frame.encode(format, quality)
+
+    def base64(self, frame: Frame) -> str:
+        frame, format, quality = self.settings(frame)
+        return frame.base64(format, quality)
+
+    def path(self, frame: Frame) -> str:
+        """A file of the encoded frame, for backends that only accept file paths."""
+        frame, format, quality = self.settings(frame)
+        return frame.file(format, quality)
+
+    def mime_type(self, frame: Frame) -> str:
+        return MIME_TYPES[self.format_for(self.prepare(frame))]
+
+    def data_url(self, frame: Frame) -> str:
+        return f"data:{self.mime_type(frame)};base64,{self.base64(frame)}"
@@ -0,0 +1,32 @@
+from typing import Tuple
+from PIL import ImageChops
+from .fingerprint import hamming_distance
+from .frame import Frame
+from .settle import thumbnail
+
+# fine enough that a typed character or a toggled switch changes some pixel a lot
+DIFF_THUMBNAIL_SIZE = (90, 200)
+
+
+def max_difference(previous: Frame, current: Frame, size: Tuple[int, int] = DIFF_THUMBNAIL_SIZE):
+    """The largest grey level difference of any pixel of the two frames' thumbnails."""
+    return ImageChops.difference(thumbnail(previous, size), thumbnail(current, size)).getextrema()[
+        1
+    ]
+
+
+def visibly_changed(
+    previous: Frame, current: Frame, max_distance: int = 0, tolerance: int = 12
+) -> bool:
+    """
+    Whether ``current`` looks different from ``previous``.
+
+    The perceptual fingerprints rule out a different screen cheaply, the thumbnails then catch
+    small local changes the fingerprint doesn't see. A difference in one place is a change, so
+    this only says unchanged for screens that are identical but for compression noise.
+    """
+    if previous.size != current.size:
+        return True
+    if hamming_distance(previous.fingerprint, current.fingerprint) > max_distance:
+        return True
+    return max_difference(previous, current) > tolerance
@@ -0,0 +1,23 @@
+from PIL import Image
+
+
+def dhash(image: Image.Image, hash_size: int = 16) -> int:
+    """
+    Difference hash of an image, a ``hash_size * hash_size`` bit perceptual fingerprint.
+
+    The image is shrunk to (hash_size + 1) x hash_size grey pixels and every bit says
+    whether a pixel is brighter than its right neighbour, so small changes (a status bar
+    clock, compression noise) flip only a few bits while a different screen flips many.
+    """
+    small = image.resize((hash_size + 1, hash_size), Image.Resampling.BOX).convert("L")
+    pixels = small.tobytes()
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
@@ -0,0 +1,117 @@
+import io
+import base64
+from typing import Dict, Optional, Tuple
+from PIL import Image
+from clickclickclick.tracing import span
+from .fingerprint import dhash
+from .store import default_store
+
+
+class Frame:
+    """
+    A screenshot captured once per step and shared by the planner and the finder.
+
+    A frame can be created from a decoded image or from already encoded bytes (e.g. the PNG
+    that ``screencap -p`` returns). Every derived form - decoded pixels, resized variants,
+    encoded bytes, base64 and a file path - is computed on first use and cached, so nothing
+    is decoded, encoded or written twice in one step. Files are written to the bounded
+    ``FrameStore`` ring, not left behind in the temp directory.
+    """
+
+    def __init__(
+        self,
+        image: Optional[Image.Image] = None,
+        data: Optional[bytes] = None,
+        format: str = "PNG",
+    ):
+        if image is None and data is None:
+            raise ValueError("Frame needs either an image or encoded data")
+        self._image = image
+        self._encoded: Dict[Tuple[str, Optional[int]], bytes] = {}
+        self._base64: Dict[Tuple[str, Optional[int]], str] = {}
+        self._resized: Dict[Tuple[int, int], "Frame"] = {}
+        self._paths: Dict[Tuple[str, Optional[int]], str] = {}
+        self._fingerprint: Optional[int] = None
+        if data is not None:
+            self._encoded[(format.upper(), None)] = data
+
+    @property
+    def image(self) -> Image.Image:
+        """The decoded image."""
+        if self._image is None:
+            format, _ = next(iter(self._encoded))
+            image = Image.open(io.BytesIO(self._encoded[(format, None)]))
+            image.load()
+            self._image = image
+        return self._image
+
+    @property
+    def size(self) -> Tuple[int, int]:
+        if self._image is None:
+            # reading the header is enough, no need to decode the pixels
+            format, _ = next(iter(self._encoded))
+            with Image.open(io.BytesIO(self._encoded[(format, None)])) as image:
+                return image.size
+        return self._image.size
+
+    @property
+    def fingerprint(self) -> int:
+        """Perceptual hash of the frame, equal or close for screens that look the same."""
+        if self._fingerprint is None:
+            self._fingerprint = dhash(self.image)
+        return self._fingerprint
+
+    def resized(self, width: int, height: Optional[int] = None) -> "Frame":
+        """Returns a cached frame of this screenshot resized to width x height."""
+        size = (width, height or width)
+        if size not in self._resized:
+            self._resized[size] = Frame(self.image.resize(size, Image.Resampling.LANCZOS))
+        return self._resized[size]
+
+    def encode(self, format: str = "PNG", quality: Optional[int] = None) -> bytes:
+        """Returns the frame encoded as ``format``, encoding at most once per format."""
+        key = (format.upper(), quality)
+        if key not in self._encoded:
+            image = self.image
+            params = {}
+            if key[0] == "JPEG" and image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            if quality is not None:
+                params["quality"] = quality
+            buffer = io.BytesIO()
+            with span("frame.encode", format=key[0], quality=quality) as current:
+                image.save(buffer, format=key[0], **params)
+                if current is not None:
+                    current.attributes["bytes"] = buffer.tell()
+            self._encoded[key] = buffer.getvalue()
+        return self._encoded[key]
+
+    @property
+    def png(self) -> bytes:
+        return self.encode("PNG")
+
+    def jpeg(self, quality: Optional[int] = None) -> bytes:
+        return self.encode("JPEG", quality)
+
+    def base64(self, format: str = "PNG", quality: Optional[int] = None) -> str:
+        key = (format.upper(), quality)
+        if key not in self._base64:
+            encoded = self.encode(format, quality)
+            with span("frame.base64", format=key[0]):
+                self._base64[key] = base64.b64encode(encoded).decode("utf-8")
+        return self._base64[key]
+
+    def file(self, format: str = "PNG", quality: Optional[int] = None) -> str:
+        """A file of the frame encoded as ``format``, for backends that only accept file paths."""
+        key = (format.upper(), quality)
+        store = default_store()
+        # the store's ring deletes old files, an older frame's file is written again when asked
+        if key not in self._paths or not store.holds(self._paths[key]):
+            suffix = ".jpg" if key[0] == "JPEG" else f".{key[0].lower()}"
+            self._paths[key] = store.write(self.encode(format, quality), suffix)
+        return self._paths[key]
+
+    @property
+    def path(self) -> str:
+        """A PNG file of the frame."""
+        return self.file("PNG")
@@ -0,0 +1,155 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Tuple
+from PIL import Image, ImageChops, ImageStat
+from .frame import Frame
+
+# small enough to compare in well under a millisecond, big enough to see a spinner turn
+THUMBNAIL_SIZE = (24, 48)
+
+
+def image_thumbnail(image: Image.Image, size: Tuple[int, int] = THUMBNAIL_SIZE) -> Image.Image:
+    # box sampling averages the pixels, cheap on a full resolution screenshot
+    return image.resize(size, Image.Resampling.BOX).convert("L")
+
+
+def thumbnail(frame: Frame, size: Tuple[int, int] = THUMBNAIL_SIZE) -> Image.Image:
+    return image_thumbnail(frame.image, size)
+
+
+def difference(first: Image.Image, second: Image.Image) -> float:
+    """Mean absolute difference of two thumbnails, 0 for identical and 255 for inverted ones."""
+    return ImageStat.Stat(ImageChops.difference(first, second)).mean[0]
+
+
+@dataclass
+class SettleResult:
+    frame: Optional[Frame]
+    seconds: float
+    captures: int
+    settled: bool
+    # how long the capture of the returned frame took, part of ``seconds``
+    capture_seconds: float = 0.0
+
+
+class SettleDetector:
+    """
+    Waits for the screen to stop changing after an action.
+
+    After ``min_wait`` it polls the screen every ``interval`` seconds and stops once
+    ``stable_frames`` successive polls differ by at most ``threshold`` from the one before, or
+    once ``max_wait`` has passed. With a ``probe``, a capture only good for telling whether the
+    screen changes, the polls use it and the frame is captured once at the end. Without one the
+    polls capture frames and the last one is the frame the step uses. ``clock`` and ``sleep``
+    are the time functions of the sync ``wait``.
+    """
+
+    def __init__(
+        self,
+        max_wait: float = 2.0,
+        interval: float = 0.15,
+        min_wait: float = 0.2,
+        threshold: float = 1.5,
+        stable_frames: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_wait = max_wait
+        self.interval = interval
+        self.min_wait = min_wait
+        self.threshold = threshold
+        self.stable_frames = stable_frames
+        self.clock = clock
+        self.sleep = sleep
+
+    @classmethod
+    def from_config(cls, c) -> "SettleDetector":
+        return cls(
+            max_wait=c.SETTLE_MAX_WAIT,
+            interval=c.SETTLE_INTERVAL,
+            min_wait=c.SETTLE_MIN_WAIT,
+            threshold=c.SETTLE_THRESHOLD,
+        )
+
+    def _steps(self, started: float):
+        """
+        The waiting loop without the I/O: yields the seconds to sleep before the next poll and
+        is sent each poll's thumbnail, None when the screen wasn't available. Returns the number
+        of polls and whether the screen settled.
+        """
+        previous = yield self.min_wait
+        polls, stable = 1, 0
+        while previous is not None and stable < self.stable_frames:
+            if self.clock() - started + self.interval > self.max_wait:
+                return polls, False
+            current = yield self.interval
+            polls += 1
+            if current is None:
+                return polls, False
+            stable = stable + 1 if difference(previous, current) <= self.threshold else 0
+            previous = current
+        return polls, previous is not None
+
+    def wait(
+        self,
+        capture: Callable[[], Optional[Frame]],
+        probe: Optional[Callable[[], Optional[Image.Image]]] = None,
+    ) -> SettleResult:
+        started = self.clock()
+        steps = self._steps(started)
+        frame, capture_seconds = None, 0.0
+        delay = next(steps)
+        try:
+            while True:
+                self.sleep(delay)
+                if probe is not None:
+                    image = probe()
+                    delay = steps.send(image_thumbnail(image) if image is not None else None)
+                    continue
+                capture_started = self.clock()
+                latest = capture()
+                if latest is not None:
+                    # keep the last good frame, the screen may just have become unavailable
+                    frame, capture_seconds = latest, self.clock() - capture_started
+                delay = steps.send(thumbnail(latest) if latest is not None else None)
+        except StopIteration as e:
+            polls, settled = e.value
+        if probe is not None:
+            capture_started = self.clock()
+            frame = capture()
+            capture_seconds = self.clock() - capture_started
+        return SettleResult(
+            frame, self.clock() - started, polls, settled and frame is not None, capture_seconds
+        )
+
+    async def wait_async(
+        self,
+        capture: Callable[[], Awaitable[Optional[Frame]]],
+        probe: Optional[Callable[[], Awaitable[Optional[Image.Image]]]] = None,
+    ) -> SettleResult:
+        started = self.clock()
+        steps = self._steps(started)
+        frame, capture_seconds = None, 0.0
+        delay = next(steps)
+        try:
+            while True:
+                await asyncio.sleep(delay)
+                if probe is not None:
+                    image = await probe()
+                    delay = steps.send(image_thumbnail(image) if image is not None else None)
+                    continue
+                capture_started = self.clock()
+                latest = await capture()
+                if latest is not None:
+                    frame, capture_seconds = latest, self.clock() - capture_started
+                delay = steps.send(thumbnail(latest) if latest is not None else None)
+        except StopIteration as e:
+            polls, settled = e.value
+        if probe is not None:
+            capture_started = self.clock()
+            frame = await capture()
+            capture_seconds = self.clock() - capture_started
+        return SettleResult(
+            frame, self.clock() - started, polls, settled and frame is not None, capture_seconds
+        )
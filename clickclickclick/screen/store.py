@@ -0,0 +1,218 @@
+import atexit
+import logging
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Deque, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# store directories are named after the process that owns them, so leaked ones can be told apart
+DIRECTORY_PREFIX = "clickclickclick-"
+DEFAULT_SLOTS = 16
+KEPT = "kept"
+# what NamedTemporaryFile(delete=False) screenshots of earlier versions were called
+LEGACY_NAME = re.compile(r"^tmp[a-z0-9_]{8}(\.png|\.jpg|\.webp)?$")
+IMAGE_MAGIC = (b"\x89PNG", b"\xff\xd8\xff", b"RIFF")
+
+
+def shared_memory_directory() -> str:
+    """tmpfs where the platform has one, so frame files never touch the disk."""
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return tempfile.gettempdir()
+
+
+class FrameStore:
+    """
+    Files of encoded frames for the backends that only accept a path (MLX, file uploads).
+
+    Files live in a private directory, on tmpfs where there is one, and are a bounded ring: once
+    ``slots`` files were written the oldest is deleted, so disk use stays flat however many
+    steps run. Every write gets a new name, a path that is still ``holds``-true always has the
+    bytes it was written with. ``keep`` takes a file out of the ring until ``discard``, for
+    screenshots a job serves after the ring moved on. ``close`` removes everything.
+    """
+
+    def __init__(self, directory: Optional[str] = None, slots: int = DEFAULT_SLOTS):
+        self.base = directory or shared_memory_directory()
+        self.slots = slots
+        self._directory: Optional[str] = None
+        self._files: Deque[str] = deque()
+        self._written = 0
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self) -> str:
+        # created on first use, a store that never writes leaves nothing behind
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(
+                prefix=f"{DIRECTORY_PREFIX}{os.getpid()}-", dir=self.base
+            )
+        return self._directory
+
+    def write(self, data: bytes, suffix: str = ".png") -> str:
+        with self._lock:
+            self._written += 1
+            path = os.path.join(self.directory, f"frame-{self._written}{suffix}")
+            with open(path, "wb") as file:
+                file.write(data)
+            self._files.append(path)
+            while len(self._files) > self.slots:
+                self._remove(self._files.popleft())
+            return path
+
+    def holds(self, path: str) -> bool:
+        """Whether ``path`` is still in the ring."""
+        with self._lock:
+            return path in self._files
+
+    def keep(self, path: str, name: str) -> Optional[str]:
+        """
+        A copy of the ring file at ``path`` that stays until ``discard(name)``, None if the ring
+        already deleted it. Paths this store didn't write are returned as they are.
+        """
+        if self._directory is None or os.path.dirname(path) != self._directory:
+            return path
+        kept = os.path.join(self._directory, KEPT, name)
+        os.makedirs(os.path.dirname(kept), exist_ok=True)
+        kept += os.path.splitext(path)[1]
+        try:
+            # the ring only ever unlinks its files, so a hard link keeps the bytes without a copy
+            os.link(path, kept)
+        except FileExistsError:
+            pass
+        except FileNotFoundError:
+            logger.warning(f"{path} left the ring before it could be kept")
+            return None
+        except OSError:
+            shutil.copyfile(path, kept)
+        return kept
+
+    def discard(self, name: str):
+        """Removes the files kept under ``name``, a prefix such as a job id removes them all."""
+        if self._directory is None:
+            return
+        kept = os.path.join(self._directory, KEPT, name)
+        shutil.rmtree(kept, ignore_errors=True)
+        for path in self._kept_files(os.path.dirname(kept), os.path.basename(kept)):
+            self._remove(path)
+
+    @staticmethod
+    def _kept_files(directory: str, name: str) -> List[str]:
+        if not os.path.isdir(directory):
+            return []
+        return [
+            os.path.join(directory, entry)
+            for entry in os.listdir(directory)
+            if os.path.splitext(entry)[0] == name
+        ]
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def close(self):
+        with self._lock:
+            if self._directory is not None:
+                shutil.rmtree(self._directory, ignore_errors=True)
+            self._directory = None
+            self._files.clear()
+
+    def __enter__(self) -> "FrameStore":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_default: Optional[FrameStore] = None
+_default_lock = threading.Lock()
+
+
+def default_store() -> FrameStore:
+    """The process wide store frames write their files to, removed when the process exits."""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = FrameStore()
+            atexit.register(_default.close)
+        return _default
+
+
+def set_default_store(store: FrameStore) -> Optional[FrameStore]:
+    """Replaces the process wide store, returns the previous one, which the caller closes."""
+    global _default
+    with _default_lock:
+        previous, _default = _default, store
+        return previous
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _is_image(path: str) -> bool:
+    try:
+        with open(path, "rb") as file:
+            return file.read(4).startswith(IMAGE_MAGIC)
+    except OSError:
+        return False
+
+
+def cleanup_leaked(
+    directories: Optional[List[str]] = None,
+    legacy: bool = False,
+    max_age: float = 3600,
+    dry_run: bool = False,
+) -> List[str]:
+    """
+    Removes frame files other processes left behind and returns their paths.
+
+    Store directories whose process is gone are always removed. With ``legacy`` screenshot
+    files that earlier versions wrote with NamedTemporaryFile(delete=False) are removed too,
+    when they look like an image and haven't been touched for ``max_age`` seconds.
+    """
+    if directories is None:
+        directories = list(dict.fromkeys([shared_memory_directory(), tempfile.gettempdir()]))
+    removed = []
+    now = time.time()
+    for directory in directories:
+        try:
+            entries = os.listdir(directory)
+        except OSError:
+            continue
+        for entry in entries:
+            path = os.path.join(directory, entry)
+            if entry.startswith(DIRECTORY_PREFIX):
+                pid = entry[len(DIRECTORY_PREFIX) :].split("-", 1)[0]
+                if not pid.isdigit() or _process_alive(int(pid)):
+                    continue
+                removed.append(path)
+                if not dry_run:
+                    shutil.rmtree(path, ignore_errors=True)
+            elif legacy and LEGACY_NAME.match(entry) and os.path.isfile(path):
+                try:
+                    stale = now - os.path.getmtime(path) > max_age
+                except OSError:
+                    continue
+                if stale and _is_image(path):
+                    removed.append(path)
+                    if not dry_run:
+                        FrameStore._remove(path)
+    if removed and not dry_run:
+        logger.info(f"Removed {len(removed)} leaked frame files")
+    return removed
@@ -0,0 +1,289 @@
+"""
+Spans of where a task's time goes: screen captures, encoding, planner and finder requests,
+device actions and the waits between steps.
+
+A task's spans are collected in a ``TaskTrace`` that is made current with ``activate``. The
+instrumented code opens spans with ``span``, which does nothing when no trace is current, so
+the hot paths only pay for a context variable lookup when tracing is off. Finished traces are
+summarised per stage (p50/p95) and exported to a local JSON file in the Chrome trace event
+format, which Perfetto and chrome://tracing open, or to OpenTelemetry when it is installed.
+"""
+
+import contextvars
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_trace: contextvars.ContextVar[Optional["TaskTrace"]] = contextvars.ContextVar(
+    "clickclickclick_trace", default=None
+)
+_parent: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar(
+    "clickclickclick_span", default=None
+)
+# called with the trace and the span as each span ends, e.g. to feed the metrics
+_observers: List[Callable[["TaskTrace", "Span"], None]] = []
+
+
+@dataclass
+class Span:
+    name: str
+    id: int
+    parent: Optional[int]
+    # wall clock start for exporters, the duration is measured with perf_counter
+    start: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    duration: Optional[float] = None
+    thread: int = 0
+    _started: float = 0.0
+
+    @property
+    def finished(self) -> bool:
+        return self.duration is not None
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest rank percentile, ``q`` between 0 and 100."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * q // 100))
+    return ordered[int(rank) - 1]
+
+
+class TaskTrace:
+    """
+    The spans of one task. Spans can be begun and ended from any thread. ``labels`` describe
+    the task, e.g. the planner and finder models, for exporters and observers.
+    """
+
+    def __init__(
+        self, name: str = "task", id: Optional[str] = None, labels: Optional[Dict[str, str]] = None
+    ):
+        self.name = name
+        self.id = id or uuid.uuid4().hex
+        self.labels = labels or {}
+        self.spans: List[Span] = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def begin(self, name: str, parent: Optional[Span] = None, **attributes) -> Span:
+        span = Span(
+            name,
+            next(self._ids),
+            parent.id if parent is not None else None,
+            time.time(),
+            attributes,
+            thread=threading.get_ident(),
+            _started=time.perf_counter(),
+        )
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def end(self, span: Span):
+        if span.finished:
+            return
+        span.duration = time.perf_counter() - span._started
+        for observer in _observers:
+            try:
+                observer(self, span)
+            except Exception:
+                logger.exception(f"Error in trace observer {observer}")
+
+    def finish(self):
+        """Ends the spans still open, e.g. a step the task returned from."""
+        for span in self.spans:
+            self.end(span)
+
+    def durations(self) -> Dict[str, List[float]]:
+        stages: Dict[str, List[float]] = {}
+        for span in self.spans:
+            if span.finished:
+                stages.setdefault(span.name, []).append(span.duration)
+        return stages
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Count, total, p50 and p95 seconds of each stage."""
+        return {
+            name: {
+                "count": len(durations),
+                "total": sum(durations),
+                "p50": percentile(durations, 50),
+                "p95": percentile(durations, 95),
+            }
+            for name, durations in sorted(self.durations().items())
+        }
+
+    def format_summary(self) -> str:
+        return "\n".join(
+            f"  {name}: {stage['count']}x, p50 {stage['p50'] * 1000:.0f} ms, "
+            f"p95 {stage['p95'] * 1000:.0f} ms, total {stage['total']:.2f}s"
+            for name, stage in self.summary().items()
+        )
+
+    def to_chrome(self) -> dict:
+        threads = {}
+        events = [
+            {
+                "name": span.name,
+                "cat": span.name.split(".")[0],
+                "ph": "X",
+                "ts": span.start * 1e6,
+                "dur": span.duration * 1e6,
+                "pid": os.getpid(),
+                # small, stable thread ids read better in a trace viewer
+                "tid": threads.setdefault(span.thread, len(threads) + 1),
+                "args": {key: _attribute(value) for key, value in span.attributes.items()},
+            }
+            for span in self.spans
+            if span.finished
+        ]
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "task": self.name,
+                "id": self.id,
+                "labels": self.labels,
+                "summary": self.summary(),
+            },
+        }
+
+
+def _attribute(value):
+    # trace viewers and OpenTelemetry take plain values only
+    return value if isinstance(value, (str, bool, int, float)) else str(value)
+
+
+def add_observer(observer: Callable[[TaskTrace, Span], None]):
+    if observer not in _observers:
+        _observers.append(observer)
+
+
+def current_trace() -> Optional[TaskTrace]:
+    return _trace.get()
+
+
+@contextmanager
+def activate(trace: Optional[TaskTrace], parent: Optional[Span] = None) -> Iterator[None]:
+    """Makes ``trace`` current, new spans are children of ``parent``."""
+    trace_token = _trace.set(trace)
+    parent_token = _parent.set(parent)
+    try:
+        yield
+    finally:
+        _parent.reset(parent_token)
+        _trace.reset(trace_token)
+
+
+@contextmanager
+def span(name: str, **attributes) -> Iterator[Optional[Span]]:
+    """A span of the current trace, nothing is recorded when there is none."""
+    trace = _trace.get()
+    if trace is None:
+        yield None
+        return
+    current = trace.begin(name, _parent.get(), **attributes)
+    token = _parent.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        trace.end(current)
+
+
+def in_current_context(func: Callable) -> Callable:
+    """
+    ``func`` bound to a copy of the current context, for spans opened on another thread.
+    Thread pools don't carry the context over, ``asyncio.to_thread`` and tasks do.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(func, *args, **kwargs)
+
+    return run
+
+
+class JsonTraceExporter:
+    """Writes each task's trace to ``<directory>/<task id>.json``."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def export(self, trace: TaskTrace) -> str:
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{trace.id}.json")
+        with open(path, "w") as file:
+            json.dump(trace.to_chrome(), file)
+        logger.info(f"Trace written to {path}")
+        return path
+
+
+class OpenTelemetryExporter:
+    """Replays each task's spans through the OpenTelemetry tracer provider set up by the app."""
+
+    def __init__(self):
+        # optional, only needed when TRACE_OPENTELEMETRY is set
+        from opentelemetry import trace
+
+        self._trace = trace
+        self.tracer = trace.get_tracer("clickclickclick")
+
+    def export(self, trace: TaskTrace):
+        started = {}
+        # parents start before their children, so each parent is created first
+        for span in sorted(trace.spans, key=lambda span: span.start):
+            if not span.finished:
+                continue
+            parent = started.get(span.parent)
+            started[span.id] = (
+                self.tracer.start_span(
+                    span.name,
+                    context=self._trace.set_span_in_context(parent[0]) if parent else None,
+                    start_time=int(span.start * 1e9),
+                    attributes={
+                        "task.id": trace.id,
+                        **{f"task.{key}": _attribute(value) for key, value in trace.labels.items()},
+                        **{key: _attribute(value) for key, value in span.attributes.items()},
+                    },
+                ),
+                span,
+            )
+        for otel_span, span in started.values():
+            otel_span.end(end_time=int((span.start + span.duration) * 1e9))
+
+
+def exporters_from_config(c) -> list:
+    exporters = []
+    if c.TRACE_DIR:
+        exporters.append(JsonTraceExporter(c.TRACE_DIR))
+    if c.TRACE_OPENTELEMETRY:
+        try:
+            exporters.append(OpenTelemetryExporter())
+        except ImportError:
+            logger.warning("TRACE_OPENTELEMETRY is set but opentelemetry-api is not installed")
+    return exporters
+
+
+def finish_trace(trace: TaskTrace, c):
+    """Ends the trace, logs its per stage summary and exports it."""
+    trace.finish()
+    logger.info(f"Trace of {trace.name}:\n{trace.format_summary()}")
+    for exporter in exporters_from_config(c):
+        try:
+            exporter.export(trace)
+        except Exception:
+            logger.exception(f"Error exporting the trace with {type(exporter).__name__}")
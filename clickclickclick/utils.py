@@ -9,6 +9,8 @@ from clickclickclick.planner.local_ollama import OllamaPlanner
 from clickclickclick.finder.mlx import MLXFinder
 from clickclickclick.planner.anthropic import AnthropicPlanner
 from clickclickclick.finder.anthropic import AnthropicFinder
+from clickclickclick.finder import configure_finder
+from clickclickclick.screen import ImageCodec
 
 
 def get_executor(platform):
@@ -17,23 +19,38 @@ def get_executor(platform):
     return AndroidExecutor()
 
 
-def get_planner(planner_model, config, executor):
-    if planner_model.lower() == "openai":
+def configure_executor(planner_model, executor, codec=None):
+    """Sets the screenshot format the planner expects on the executor."""
+    if codec is not None:
+        executor.codec = codec
+    if planner_model.lower() in ("openai", "anthropic"):
         executor.screenshot_as_base64 = True
+    elif planner_model.lower() in ("gemini", "ollama"):
+        executor.screenshot_as_tempfile = True
+
+
+def _create_planner(planner_model, config, executor):
+    if planner_model.lower() == "openai":
         return ChatGPTPlanner(config)
     elif planner_model.lower() == "gemini":
-        executor.screenshot_as_tempfile = True
         return GeminiPlanner(config)
     elif planner_model.lower() == "ollama":
-        executor.screenshot_as_tempfile = True
         return OllamaPlanner(config, executor)
     elif planner_model.lower() == "anthropic":
-        executor.screenshot_as_base64 = True
         return AnthropicPlanner(config)
     raise ValueError(f"Unsupported planner model: {planner_model}")
 
 
-def get_finder(finder_model, config, executor):
+def get_planner(planner_model, config, executor):
+    codec = ImageCodec.from_config(config, "planner_config")
+    if executor is not None:
+        configure_executor(planner_model, executor, codec)
+    planner = _create_planner(planner_model, config, executor)
+    planner.codec = codec
+    return planner
+
+
+def _create_finder(finder_model, config, executor):
     if finder_model.lower() == "openai":
         return OpenAIFinder(config, executor)
     elif finder_model.lower() == "gemini":
@@ -45,3 +62,7 @@ def get_finder(finder_model, config, executor):
     elif finder_model.lower() == "anthropic":
         return AnthropicFinder(config, executor)
     raise ValueError(f"Unsupported finder model: {finder_model}")
+
+
+def get_finder(finder_model, config, executor):
+    return configure_finder(_create_finder(finder_model, config, executor), config)
@@ -2,6 +2,7 @@ import click
 import os
 from clickclickclick.config import get_config
 from clickclickclick.planner.task import execute_with_timeout, execute_task
+from clickclickclick.screen.store import cleanup_leaked
 from clickclickclick.utils import get_executor, get_finder, get_planner
 from interface import run_gradio
 
@@ -158,9 +159,21 @@ def gradio():
     run_gradio()
 
 
+@click.command()
+@click.option("--max-age", default=3600, help="Only remove files older than this, in seconds.")
+@click.option("--dry-run", is_flag=True, help="List the files without removing them.")
+def cleanup(max_age, dry_run):
+    """Remove screenshot files leaked by earlier runs and older versions"""
+    removed = cleanup_leaked(legacy=True, max_age=max_age, dry_run=dry_run)
+    for path in removed:
+        click.echo(path)
+    click.echo(f"{'Would remove' if dry_run else 'Removed'} {len(removed)} files")
+
+
 cli.add_command(run)
 cli.add_command(setup)
 cli.add_command(gradio)
+cli.add_command(cleanup)
 
 if __name__ == "__main__":
     cli()
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# the package configures its file logging on import, keep the tests' log out of the tree
+os.environ.setdefault(
+    "CLICKCLICKCLICK_LOG_FILE",
+    os.path.join(tempfile.mkdtemp(prefix="clickclickclick-"), "test.log"),
+)
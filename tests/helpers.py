@@ -0,0 +1,81 @@
+"""Stand-ins for the models and the device shared by the tests."""
+
+import json
+import time
+from collections import Counter
+from unittest.mock import MagicMock
+from PIL import Image
+from clickclickclick.finder import BaseFinder
+from clickclickclick.planner import Planner
+from clickclickclick.screen import Frame
+
+BOX = {"ymin": 100, "xmin": 200, "ymax": 300, "xmax": 400}
+MISSING = {"ymin": 0, "xmin": 0, "ymax": 0, "xmax": 0}
+
+
+class StubFinder(BaseFinder):
+    """A finder whose model sees a 100x100 image and answers in a 1000x1000 space.
+
+    The model answers ``boxes[prompt]``, or ``BOX`` for every prompt when no boxes are
+    given, after ``latency`` seconds. The prompts it was sent are kept in ``requests``.
+    """
+
+    IMAGE_WIDTH = 100
+    IMAGE_HEIGHT = 100
+    OUTPUT_WIDTH = 1000
+    OUTPUT_HEIGHT = 1000
+
+    def __init__(self, executor, boxes=None, latency=0.0):
+        super().__init__(None, "stub", {}, "", executor)
+        self.boxes = boxes
+        self.latency = latency
+        self.requests = []
+
+    @property
+    def calls(self):
+        return len(self.requests)
+
+    def box(self, prompt):
+        if self.boxes is None:
+            return BOX
+        return self.boxes.get(prompt, MISSING)
+
+    def process_segment(self, segment, model, prompt):
+        self.requests.append(prompt)
+        if self.latency:
+            time.sleep(self.latency)
+        return json.dumps(self.box(prompt)), segment[1]
+
+
+class SwipingPlanner(Planner):
+    """Swipes for a few steps, then finishes.
+
+    ``encoded`` has, for each step, whether the frame was already encoded for the planner.
+    """
+
+    def __init__(self, steps):
+        self.steps = steps
+        self.encoded = []
+
+    def llm_response(self, prompt, screenshot):
+        self.encoded.append(bool(screenshot._base64))
+        if len(self.encoded) == self.steps:
+            return [("task_finished", {"reason": "done", "observation": "done"})]
+        return [("swipe_up", {"observation": "a list"})]
+
+    def add_finder_message(self, message):
+        pass
+
+    def task_finished(self, reason, observation):
+        return True
+
+
+def changing_screen_executor():
+    """A mock executor showing a different screen every capture, so no step is skipped."""
+    executor = MagicMock()
+    executor.screen_stats = Counter()
+    executor.pipeline_stats = Counter()
+    executor.capture_frame.side_effect = lambda observation: Frame(
+        Image.new("RGB", (40, 80), (executor.capture_frame.call_count * 40,) * 3)
+    )
+    return executor
@@ -2,14 +2,18 @@ import unittest
 from unittest.mock import patch, MagicMock
 from subprocess import CompletedProcess
 from clickclickclick.executor.android import (
+    AdbShellSession,
     AndroidExecutor,
+    parse_raw_screencap,
     run_adb_command,
     sanitize_for_adb,
 )
 from clickclickclick.executor import logger
+from clickclickclick.screen import Frame
 import io
 from PIL import Image
 import base64
+import struct
 import tempfile
 import os
 
@@ -343,3 +347,164 @@ class TestAndroidExecutor(unittest.TestCase):
         self.assertTrue(os.path.exists(result))
         self.logger.debug.assert_called_with("Take a screenshot use_tempfile=True")
         os.remove(result)
+
+
+class TestScreenSize(unittest.TestCase):
+    @patch("clickclickclick.executor.android.run_adb_command")
+    def test_screen_size_is_probed_once(self, mock_run_adb_command):
+        mock_run_adb_command.return_value = CompletedProcess(
+            [], 0, "Physical size: 1080x2400\nOverride size: 720x1600\n", ""
+        )
+        executor = AndroidExecutor()
+        self.assertEqual(executor.screen_size, (720, 1600))
+        self.assertEqual(executor.screen_size, (720, 1600))
+        mock_run_adb_command.assert_called_once_with(["shell", "wm", "size"])
+
+    @patch("clickclickclick.executor.android.run_adb_command")
+    def test_rotation_invalidates_screen_size(self, mock_run_adb_command):
+        executor = AndroidExecutor(screenshot_mode="raw")
+        portrait = struct.pack("<III", 2, 3, 1) + bytes(24)
+        landscape = struct.pack("<III", 3, 2, 1) + bytes(24)
+        mock_run_adb_command.return_value = CompletedProcess([], 0, portrait, b"")
+        executor.capture_frame("observation")
+        self.assertEqual(executor.screen_size, (2, 3))
+
+        mock_run_adb_command.return_value = CompletedProcess([], 0, landscape, b"")
+        executor.capture_frame("observation")
+        self.assertEqual(executor.screen_size, (3, 2))
+
+
+class TestRawScreencap(unittest.TestCase):
+    PIXELS = bytes([10, 20, 30, 255]) * 6
+
+    def test_parse_header_without_colorspace(self):
+        image = parse_raw_screencap(struct.pack("<III", 2, 3, 1) + self.PIXELS)
+        self.assertEqual(image.size, (2, 3))
+        self.assertEqual(image.getpixel((1, 2)), (10, 20, 30, 255))
+
+    def test_parse_header_with_colorspace(self):
+        image = parse_raw_screencap(struct.pack("<IIII", 2, 3, 1, 1) + self.PIXELS)
+        self.assertEqual(image.size, (2, 3))
+        self.assertEqual(image.getpixel((0, 0)), (10, 20, 30, 255))
+
+    def test_parse_bgra(self):
+        image = parse_raw_screencap(struct.pack("<III", 2, 3, 5) + self.PIXELS)
+        self.assertEqual(image.getpixel((0, 0)), (30, 20, 10, 255))
+
+    def test_rgbx_frame_encodes_as_png(self):
+        image = parse_raw_screencap(struct.pack("<III", 2, 3, 2) + self.PIXELS)
+        self.assertEqual(image.mode, "RGB")
+        frame = Frame(image)
+        decoded = Image.open(io.BytesIO(base64.b64decode(frame.base64())))
+        self.assertEqual(decoded.size, (2, 3))
+        self.assertEqual(decoded.convert("RGB").getpixel((1, 2)), (10, 20, 30))
+
+    @patch("clickclickclick.executor.android.run_adb_command")
+    def test_probe_reads_the_raw_framebuffer(self, mock_run_adb_command):
+        data = struct.pack("<III", 2, 3, 1) + self.PIXELS
+        mock_run_adb_command.return_value = CompletedProcess([], 0, data, b"")
+        executor = AndroidExecutor(screenshot_mode="png")
+        self.assertTrue(executor.has_screen_probe)
+        image = executor.probe_screen()
+        mock_run_adb_command.assert_called_once_with(["exec-out", "screencap"], text_mode=False)
+        self.assertEqual(image.size, (2, 3))
+        self.assertFalse(AndroidExecutor(screenshot_mode="raw").has_screen_probe)
+
+    @patch("clickclickclick.executor.android.run_adb_command")
+    def test_probe_of_a_failed_screencap(self, mock_run_adb_command):
+        mock_run_adb_command.return_value = CompletedProcess([], 1, b"", b"no device")
+        self.assertIsNone(AndroidExecutor(screenshot_mode="png").probe_screen())
+
+    def test_parse_rejects_truncated_data(self):
+        with self.assertRaises(ValueError):
+            parse_raw_screencap(struct.pack("<III", 2, 3, 1) + self.PIXELS[:-4])
+
+    @patch("clickclickclick.executor.android.run_adb_command")
+    def test_screenshot_raw_mode(self, mock_run_adb_command):
+        mock_process = MagicMock(spec=CompletedProcess)
+        mock_process.returncode = 0
+        mock_process.stdout = struct.pack("<IIII", 2, 3, 1, 1) + self.PIXELS
+        mock_run_adb_command.return_value = mock_process
+        executor = AndroidExecutor(screenshot_mode="raw")
+        result = executor.screenshot("observation")
+        mock_run_adb_command.assert_called_once_with(["exec-out", "screencap"], text_mode=False)
+        self.assertEqual(result.size, (2, 3))
+
+
+class TestRunAdbCommand(unittest.TestCase):
+    @patch("clickclickclick.executor.android.run")
+    def test_failed_command_is_logged_in_both_modes(self, mock_run):
+        for text_mode, stderr in ((True, "error: no devices\n"), (False, b"error: no devices\n")):
+            with self.subTest(text_mode=text_mode):
+                mock_run.return_value = CompletedProcess([], 1, "", stderr)
+                with self.assertLogs("clickclickclick.executor", "ERROR") as logs:
+                    result = run_adb_command(["shell", "wm", "size"], text_mode=text_mode)
+                self.assertEqual(result.returncode, 1)
+                self.assertTrue(logs.output[0].endswith("failed: error: no devices"))
+
+
+class TestAdbShellSession(unittest.TestCase):
+    def setUp(self):
+        # a local shell stands in for `adb shell`, the wire protocol is the same
+        self.session = AdbShellSession(timeout=5)
+        self.session._command = lambda: ["sh"]
+
+    def tearDown(self):
+        self.session.close()
+
+    def test_run_reuses_one_process(self):
+        result = self.session.run(["echo", "hello"])
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(result.stdout, "hello\n")
+        pid = self.session._process.pid
+        self.session.run(["echo", "again"])
+        self.assertEqual(self.session._process.pid, pid)
+
+    def test_run_reports_exit_status(self):
+        result = self.session.run(["false"])
+        self.assertEqual(result.returncode, 1)
+
+    def test_output_without_trailing_newline(self):
+        result = self.session.run(["printf", "partial"])
+        self.assertEqual(result.stdout, "partial")
+        self.assertEqual(result.returncode, 0)
+
+    def test_reconnects_after_shell_dies(self):
+        self.session.run(["echo", "first"])
+        self.session._process.kill()
+        self.session._process.wait()
+        result = self.session.run(["echo", "second"])
+        self.assertEqual(result.stdout, "second\n")
+
+    def test_command_without_an_answer_is_not_sent_again(self):
+        self.session.timeout = 0.2
+        with tempfile.TemporaryDirectory() as directory:
+            taps = os.path.join(directory, "taps")
+            result = self.session.run(["echo", "tap", ">>", taps, ";", "sleep", "1"])
+            self.assertEqual(result.returncode, 255)
+            self.assertFalse(self.session.alive)
+            with open(taps) as file:
+                self.assertEqual(file.read(), "tap\n")
+
+    def test_failed_write_is_retried(self):
+        self.session.run(["echo", "first"])
+        write, writes = self.session._write, []
+
+        def write_once_broken(command):
+            writes.append(command)
+            if len(writes) == 1:
+                raise BrokenPipeError("broken pipe")
+            write(command)
+
+        self.session._write = write_once_broken
+        result = self.session.run(["echo", "second"])
+        self.assertEqual(result.stdout, "second\n")
+        self.assertEqual(writes, ["echo second", "echo second"])
+
+    @patch("clickclickclick.executor.android.run_adb_command")
+    def test_executor_routes_shell_commands_through_session(self, mock_run_adb_command):
+        executor = AndroidExecutor(persistent_shell=True)
+        executor._shell = MagicMock()
+        self.assertTrue(executor.click_at_a_point(100, 200, "observation"))
+        executor._shell.run.assert_called_once_with(["input", "tap", "100", "200"])
+        mock_run_adb_command.assert_not_called()
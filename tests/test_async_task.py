@@ -0,0 +1,149 @@
+import asyncio
+import time
+import unittest
+from unittest.mock import MagicMock
+from PIL import Image
+from clickclickclick.config import BaseConfig
+from clickclickclick.executor import Executor
+from clickclickclick.planner import Planner
+from clickclickclick.planner.async_task import execute_task_async, execute_with_timeout_async
+from clickclickclick.screen import Frame
+
+
+class FakeExecutor(Executor):
+    def __init__(self):
+        super().__init__()
+        self.actions = []
+
+    def _capture_frame(self):
+        return Frame(Image.new("RGB", (40, 80)))
+
+    def _action(self, name):
+        self.actions.append(name)
+        return True
+
+    def move_mouse(self, x, y, observation):
+        return self._action("move_mouse")
+
+    def press_key(self, key, observation):
+        return self._action("press_key")
+
+    def type_text(self, text, observation):
+        return self._action("type_text")
+
+    def click_mouse(self, observation, button="left"):
+        return self._action("click_mouse")
+
+    def double_click_mouse(self, button, observation):
+        return self._action("double_click_mouse")
+
+    def scroll(self, clicks, observation):
+        return self._action("scroll")
+
+    def swipe_right(self, observation):
+        return self._action("swipe_right")
+
+    def swipe_left(self, observation):
+        return self._action("swipe_left")
+
+    def swipe_up(self, observation):
+        return self._action("swipe_up")
+
+    def swipe_down(self, observation):
+        return self._action("swipe_down")
+
+    def volume_up(self, observation):
+        return self._action("volume_up")
+
+    def volume_down(self, observation):
+        return self._action("volume_down")
+
+    def navigate_back(self, observation):
+        return self._action("navigate_back")
+
+    def minimize_app(self, observation):
+        return self._action("minimize_app")
+
+    def screenshot(self, observation):
+        return self._capture_frame().image
+
+    def click_at_a_point(self, x, y, observation):
+        return self._action("click_at_a_point")
+
+    def long_press_at_a_point(self, x, y, observation):
+        return self._action("long_press_at_a_point")
+
+
+class SlowPlanner(Planner):
+    """Swipes once, then finishes. Each model call takes `latency` seconds."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.calls = 0
+        self.cancelled = False
+
+    def llm_response(self, prompt, screenshot):
+        raise AssertionError("the async engine must not use the blocking call")
+
+    async def llm_response_async(self, prompt, screenshot):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.latency)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+        if self.calls == 1:
+            return [("swipe_up", {"observation": "home screen"})]
+        return [("task_finished", {"reason": "done", "observation": "done"})]
+
+    def add_finder_message(self, message):
+        pass
+
+    def task_finished(self, reason, observation):
+        return True
+
+
+class TestAsyncTaskEngine(unittest.TestCase):
+    def setUp(self):
+        self.config = BaseConfig()
+        self.config.TASK_DELAY = 0
+
+    def test_task_runs_to_completion(self):
+        executor = FakeExecutor()
+        planner = SlowPlanner(0)
+        result = asyncio.run(
+            execute_task_async("swipe", executor, planner, MagicMock(), self.config)
+        )
+        self.assertTrue(result)
+        self.assertEqual(executor.actions, ["swipe_up"])
+
+    def test_many_tasks_share_one_event_loop(self):
+        async def run_all():
+            tasks = [
+                execute_task_async(
+                    "swipe", FakeExecutor(), SlowPlanner(0.2), MagicMock(), self.config
+                )
+                for _ in range(10)
+            ]
+            return await asyncio.gather(*tasks)
+
+        start = time.perf_counter()
+        results = asyncio.run(run_all())
+        elapsed = time.perf_counter() - start
+        self.assertEqual(results, [True] * 10)
+        # ten tasks of two 0.2s model calls each overlap instead of taking 4s
+        self.assertLess(elapsed, 2)
+
+    def test_timeout_cancels_in_flight_work(self):
+        planner = SlowPlanner(10)
+        result = asyncio.run(
+            execute_with_timeout_async(
+                execute_task_async, 0.1, "swipe", FakeExecutor(), planner, MagicMock(), self.config
+            )
+        )
+        self.assertIsNone(result)
+        self.assertTrue(planner.cancelled)
+
+
+if __name__ == "__main__":
+    unittest.main()
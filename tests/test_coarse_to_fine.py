@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+from PIL import Image
+from clickclickclick.finder import BaseFinder
+from clickclickclick.screen import Frame
+
+SCREEN = (540, 1200)
+# the element in screen pixels (left, top, right, bottom)
+ELEMENT = (300, 900, 360, 960)
+
+
+class LocatingFinder(BaseFinder):
+    """Answers with ELEMENT's box within whatever part of the screen a segment shows."""
+
+    IMAGE_WIDTH = 512
+    IMAGE_HEIGHT = 512
+    OUTPUT_WIDTH = 1000
+    OUTPUT_HEIGHT = 1000
+
+    def __init__(self, executor, coarse_size=0):
+        super().__init__(None, "stub", {}, "", executor)
+        self.coarse_size = coarse_size
+        self.refine_size = 256
+        self.sizes = []
+
+    def process_segment(self, segment, model, prompt):
+        frame, (left, top, right, bottom) = segment
+        self.sizes.append(frame.size)
+        scale_x, scale_y = self.IMAGE_WIDTH / SCREEN[0], self.IMAGE_HEIGHT / SCREEN[1]
+        box = {
+            "ymin": (ELEMENT[1] * scale_y - top) / (bottom - top) * 1000,
+            "xmin": (ELEMENT[0] * scale_x - left) / (right - left) * 1000,
+            "ymax": (ELEMENT[3] * scale_y - top) / (bottom - top) * 1000,
+            "xmax": (ELEMENT[2] * scale_x - left) / (right - left) * 1000,
+        }
+        return json.dumps(box), segment[1]
+
+
+def noisy_screen():
+    # noise doesn't compress, so PNG sizes track the pixels uploaded like real screenshots do
+    return Frame(Image.frombytes("RGB", SCREEN, os.urandom(SCREEN[0] * SCREEN[1] * 3)))
+
+
+class TestCoarseToFine(unittest.TestCase):
+    def setUp(self):
+        self.executor = MagicMock()
+        self.executor.current_frame.return_value = noisy_screen()
+        self.expected = [
+            ELEMENT[1] * 512 / SCREEN[1],
+            ELEMENT[0] * 512 / SCREEN[0],
+            ELEMENT[3] * 512 / SCREEN[1],
+            ELEMENT[2] * 512 / SCREEN[0],
+        ]
+
+    def assertBounds(self, bounds):
+        for found, expected in zip(map(int, bounds.split(",")), self.expected):
+            # the model answers in whole output units, the bounds are whole image pixels
+            self.assertAlmostEqual(found, expected, delta=2)
+
+    def test_refines_a_patch_of_the_coarse_region(self):
+        finder = LocatingFinder(self.executor, coarse_size=128)
+        self.assertBounds(finder.find_element("button", "observation"))
+        self.assertEqual(finder.sizes, [(128, 128), (256, 256)])
+
+    def test_patch_contains_the_element(self):
+        finder = LocatingFinder(self.executor, coarse_size=128)
+        frame = self.executor.current_frame("")
+        _, (left, top, right, bottom) = finder.refine_segment(frame, "370,278,420,341")
+        self.assertTrue(left <= 278 and top <= 370 and right >= 341 and bottom >= 420)
+        self.assertAlmostEqual(right - left, 256 * 512 / 540, delta=1)
+
+    def test_uploads_less_than_single_pass(self):
+        single = LocatingFinder(self.executor)
+        coarse = LocatingFinder(self.executor, coarse_size=128)
+        for _ in range(2):
+            single.find_element("button", "observation")
+        coarse.find_element("button", "observation")
+
+        single_stats, coarse_stats = (
+            single.pass_stats["single"],
+            coarse.pass_stats["coarse_to_fine"],
+        )
+        self.assertEqual((single_stats["lookups"], coarse_stats["lookups"]), (2, 1))
+        # a 128px frame plus a 256px patch against the full 512px frame
+        self.assertLess(coarse_stats["bytes"], single_stats["bytes"] / 2 / 2)
+
+    def test_coarse_miss_falls_back_to_the_full_screen(self):
+        finder = LocatingFinder(self.executor, coarse_size=128)
+        process_segment = finder.process_segment
+        finder.process_segment = lambda segment, model, prompt: (
+            ('{"ymin": 0, "xmin": 0, "ymax": 0, "xmax": 0}', segment[1])
+            if segment[0].size == (128, 128)
+            else process_segment(segment, model, prompt)
+        )
+        self.assertBounds(finder.find_element("button", "observation"))
+        self.assertEqual(finder.sizes, [(512, 512)])
+
+    def test_async(self):
+        finder = LocatingFinder(self.executor, coarse_size=128)
+        self.executor.current_frame_async = AsyncMock(return_value=self.executor.current_frame(""))
+        self.assertBounds(asyncio.run(finder.find_element_async("button", "observation")))
+        self.assertEqual(len(finder.sizes), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,95 @@
+import io
+import os
+import unittest
+from unittest.mock import MagicMock
+from PIL import Image, ImageDraw
+from clickclickclick.config import get_config
+from clickclickclick.planner.anthropic import AnthropicPlanner
+from clickclickclick.screen import Frame, ImageCodec
+from clickclickclick.utils import get_finder
+
+
+def ui_screen(size=(540, 1200)):
+    image = Image.new("RGB", size, (250, 250, 250))
+    draw = ImageDraw.Draw(image)
+    for top in range(100, size[1], 150):
+        draw.rectangle((40, top, size[0] - 40, top + 90), fill=(30, 110, 220))
+    return Frame(image)
+
+
+def photo_screen(size=(540, 1200)):
+    return Frame(Image.frombytes("RGB", size, os.urandom(size[0] * size[1] * 3)))
+
+
+class TestImageCodec(unittest.TestCase):
+    def test_png_by_default(self):
+        frame = ui_screen()
+        codec = ImageCodec()
+        self.assertIs(codec.encode(frame), frame.png)
+        self.assertEqual(codec.mime_type(frame), "image/png")
+
+    def test_lossy_formats(self):
+        frame = ui_screen()
+        for format, mime_type in (("jpeg", "image/jpeg"), ("WEBP", "image/webp")):
+            codec = ImageCodec(format, quality=80)
+            data = codec.encode(frame)
+            self.assertEqual(Image.open(io.BytesIO(data)).format, format.upper())
+            self.assertTrue(codec.data_url(frame).startswith(f"data:{mime_type};base64,"))
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            ImageCodec("GIF")
+
+    def test_max_dimension_keeps_the_aspect_ratio(self):
+        frame = ui_screen()
+        prepared = ImageCodec(max_dimension=600).prepare(frame)
+        self.assertEqual(prepared.size, (270, 600))
+        self.assertIs(ImageCodec(max_dimension=2000).prepare(frame), frame)
+
+    def test_auto_picks_png_for_ui_and_jpeg_for_photos(self):
+        codec = ImageCodec("AUTO", quality=80)
+        self.assertEqual(codec.mime_type(ui_screen()), "image/png")
+        self.assertEqual(codec.mime_type(photo_screen()), "image/jpeg")
+
+    def test_max_bytes_lowers_the_quality(self):
+        frame = photo_screen((200, 200))
+        codec = ImageCodec("JPEG", quality=90, max_bytes=len(frame.jpeg(60)))
+        _, _, quality = codec.settings(frame)
+        self.assertEqual(quality, 60)
+        self.assertLessEqual(len(codec.encode(frame)), codec.max_bytes)
+
+    def test_max_bytes_stops_at_the_minimum_quality(self):
+        codec = ImageCodec("JPEG", quality=90, max_bytes=1, min_quality=50)
+        self.assertEqual(codec.settings(photo_screen((64, 64)))[2], 50)
+
+    def test_encoded_file(self):
+        frame = ui_screen()
+        path = ImageCodec("WEBP", quality=80).path(frame)
+        self.assertTrue(path.endswith(".webp"))
+        self.assertIs(frame.file("WEBP", 80), path)
+        os.remove(path)
+
+
+class TestCodecConfig(unittest.TestCase):
+    def test_finder_codec_from_config(self):
+        config = get_config("android", "gemini", "gemini")
+        config.IMAGE_FORMAT = "JPEG"
+        config.IMAGE_MAX_DIMENSION = 768
+        config.models["finder_config"]["image_quality"] = 70
+        finder = get_finder("gemini", config, MagicMock())
+        self.assertEqual(finder.codec.format, "JPEG")
+        self.assertEqual(finder.codec.quality, 70)
+        # finders size their segments themselves
+        self.assertEqual(finder.codec.max_dimension, 0)
+
+    def test_planner_sends_the_codec_media_type(self):
+        config = get_config("android", "anthropic", "gemini")
+        planner = AnthropicPlanner(config)
+        planner.codec = ImageCodec("JPEG", quality=80)
+        request = planner._prepare_request("open settings", ui_screen())
+        image = request["messages"][-1]["content"][-1]
+        self.assertEqual(image["source"]["media_type"], "image/jpeg")
+
+
+if __name__ == "__main__":
+    unittest.main()
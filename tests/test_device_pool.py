@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+from subprocess import CompletedProcess
+from unittest.mock import patch
+from clickclickclick.executor.android import AndroidExecutor
+from clickclickclick.executor.device_pool import DevicePool, parse_adb_devices
+
+ADB_DEVICES = """List of devices attached
+emulator-5554\tdevice
+R58M123ABC\tdevice product:a51 model:SM_A515F
+0123456789\tunauthorized
+192.168.1.5:5555\toffline
+
+"""
+
+
+class TestParseAdbDevices(unittest.TestCase):
+    def test_only_ready_devices_are_listed(self):
+        self.assertEqual(parse_adb_devices(ADB_DEVICES), ["emulator-5554", "R58M123ABC"])
+
+    def test_no_devices(self):
+        self.assertEqual(parse_adb_devices("List of devices attached\n\n"), [])
+
+
+class TestDevicePool(unittest.IsolatedAsyncioTestCase):
+    async def test_one_task_per_device(self):
+        pool = DevicePool(["a", "b"])
+        first = await pool.acquire()
+        second = await pool.acquire()
+        self.assertEqual({first, second}, {"a", "b"})
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        self.assertEqual(pool.waiting, 1)
+        pool.release(first)
+        self.assertEqual(await waiter, first)
+
+    async def test_waiters_are_served_in_order(self):
+        pool = DevicePool(["a"])
+        serial = await pool.acquire()
+        order = []
+
+        async def task(name):
+            async with pool.lease():
+                order.append(name)
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.create_task(task(name)) for name in "xyz"]
+        await asyncio.sleep(0)
+        pool.release(serial)
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["x", "y", "z"])
+
+    async def test_released_devices_go_to_the_back(self):
+        pool = DevicePool(["a", "b", "c"])
+        async with pool.lease() as serial:
+            self.assertEqual(serial, "a")
+        async with pool.lease() as serial:
+            self.assertEqual(serial, "b")
+
+    async def test_max_concurrency(self):
+        pool = DevicePool(["a", "b", "c"], max_concurrency=2)
+        await pool.acquire()
+        second = await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        self.assertFalse(waiter.done())
+        pool.release(second)
+        await waiter
+        self.assertEqual(pool.in_use, 2)
+
+    async def test_cancelled_waiter_does_not_hold_a_device(self):
+        pool = DevicePool(["a"])
+        serial = await pool.acquire()
+        waiter = asyncio.create_task(pool.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        pool.release(serial)
+        self.assertEqual(pool.available, 1)
+        self.assertEqual(pool.waiting, 0)
+
+    async def test_refresh_tracks_attached_devices(self):
+        pool = DevicePool()
+        with patch(
+            "clickclickclick.executor.device_pool.list_devices", return_value=["a", "b"]
+        ) as mock_list_devices:
+            self.assertEqual(await pool.refresh(), ["a", "b"])
+            mock_list_devices.return_value = ["b", "c"]
+            self.assertEqual(await pool.refresh(), ["b", "c"])
+        self.assertEqual(pool.available, 2)
+
+    async def test_no_devices(self):
+        pool = DevicePool()
+        with patch("clickclickclick.executor.device_pool.list_devices", return_value=[]):
+            with self.assertRaises(RuntimeError):
+                await pool.acquire()
+
+
+class TestExecutorTargetsSerial(unittest.TestCase):
+    @patch("clickclickclick.executor.android.run")
+    def test_commands_carry_serial(self, mock_run):
+        mock_run.return_value = CompletedProcess([], 0, "", "")
+        executor = AndroidExecutor(persistent_shell=False, serial="emulator-5554")
+        executor.move_mouse(1, 2, "tap")
+        self.assertEqual(
+            mock_run.call_args[0][0],
+            ["adb", "-s", "emulator-5554", "shell", "input", "tap", "1", "2"],
+        )
+
+    @patch("clickclickclick.executor.android.run")
+    def test_default_device_without_serial(self, mock_run):
+        mock_run.return_value = CompletedProcess([], 0, "", "")
+        AndroidExecutor(persistent_shell=False).move_mouse(1, 2, "tap")
+        self.assertEqual(mock_run.call_args[0][0], ["adb", "shell", "input", "tap", "1", "2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,156 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+from PIL import Image
+from clickclickclick.config import get_config
+from clickclickclick.finder import FinderElementsResponseLLM
+from clickclickclick.finder.anthropic import AnthropicFinder
+from clickclickclick.finder.gemini import GeminiFinder
+from clickclickclick.finder.local_ollama import OllamaFinder
+from clickclickclick.finder.openai import OpenAIFinder
+from clickclickclick.planner.task import _process_finder_output
+from clickclickclick.screen import Frame
+from helpers import StubFinder
+
+BOXES = {
+    "search field": {"ymin": 100, "xmin": 100, "ymax": 200, "xmax": 900},
+    "search button": {"ymin": 100, "xmin": 900, "ymax": 200, "xmax": 1000},
+}
+
+
+class BatchStubFinder(StubFinder):
+    """A finder whose model answers all the elements in one request."""
+
+    def process_segment_batch(self, segment, model, prompts):
+        self.requests.append(list(prompts))
+        elements = [self.box(prompt) for prompt in prompts]
+        return json.dumps({"elements": elements}), segment[1]
+
+
+class TestFindElements(unittest.TestCase):
+    def setUp(self):
+        self.executor = MagicMock()
+        self.executor.current_frame.return_value = Frame(Image.new("RGB", (100, 200)))
+
+    def test_one_request_for_all_elements(self):
+        finder = BatchStubFinder(self.executor, BOXES)
+        bounds = finder.find_elements(["search field", "search button", "clear"], "observation")
+        self.assertEqual(bounds, ["10,10,20,90", "10,90,20,100", "0,0,0,0"])
+        self.assertEqual(finder.requests, [["search field", "search button", "clear"]])
+        self.assertEqual(finder.pass_stats["batch"]["lookups"], 1)
+
+    def test_duplicates_and_single_element(self):
+        finder = BatchStubFinder(self.executor, BOXES)
+        bounds = finder.find_elements(["search field", "search field"], "observation")
+        self.assertEqual(bounds, ["10,10,20,90", "10,10,20,90"])
+        self.assertEqual(finder.requests, ["search field"])
+
+    def test_finder_without_batch_support(self):
+        finder = StubFinder(self.executor, BOXES)
+        bounds = finder.find_elements(["search field", "search button", "clear"], "observation")
+        self.assertEqual(bounds, ["10,10,20,90", "10,90,20,100", "0,0,0,0"])
+        self.assertEqual(finder.requests, ["search field", "search button", "clear"])
+        self.assertEqual(finder.pass_stats["batch"]["lookups"], 1)
+
+    def test_short_batch_answer(self):
+        finder = BatchStubFinder(self.executor, BOXES)
+        finder.process_segment_batch = lambda segment, model, prompts: (
+            '{"elements": [{"ymin": 100, "xmin": 100, "ymax": 200, "xmax": 900}]}',
+            segment[1],
+        )
+        bounds = finder.find_elements(["search field", "search button"], "observation")
+        self.assertEqual(bounds, ["10,10,20,90", "0,0,0,0"])
+
+    def test_async(self):
+        finder = BatchStubFinder(self.executor, BOXES)
+        self.executor.current_frame_async = AsyncMock(return_value=self.executor.current_frame(""))
+        bounds = asyncio.run(
+            finder.find_elements_async(["search field", "search button"], "observation")
+        )
+        self.assertEqual(bounds, ["10,10,20,90", "10,90,20,100"])
+        self.assertEqual(len(finder.requests), 1)
+
+
+class TestBatchSchemas(unittest.TestCase):
+    def setUp(self):
+        self.segment = (Frame(Image.new("RGB", (8, 8))), (0, 0, 8, 8))
+        self.prompts = ["search field", "search button"]
+
+    def test_anthropic_tool_returns_a_list(self):
+        finder = AnthropicFinder(get_config("android", "anthropic", "anthropic"), MagicMock())
+        request = finder._request(self.segment, "model", self.prompts, batch=True)
+        schema = request["tools"][0]["input_schema"]
+        self.assertEqual(request["tool_choice"]["name"], "return_coordinates")
+        self.assertEqual(schema["properties"]["elements"]["type"], "array")
+        self.assertEqual(schema["properties"]["elements"]["items"]["required"][0], "ymin")
+        self.assertIn('2. "search button"', request["messages"][0]["content"][1]["text"])
+
+    def test_openai_parses_a_list(self):
+        finder = OpenAIFinder(get_config("android", "openai", "openai"), MagicMock())
+        request = finder._batch_request(self.segment, "model", self.prompts)
+        self.assertIs(request["response_format"], FinderElementsResponseLLM)
+
+    def test_gemini_response_schema(self):
+        finder = GeminiFinder(get_config("android", "gemini", "gemini"), MagicMock())
+        config = finder._batch_generation_config(self.prompts)
+        self.assertEqual(config["response_schema"]["properties"]["elements"]["type"], "array")
+        self.assertEqual(
+            config["max_output_tokens"], finder.generation_config["max_output_tokens"] * 2
+        )
+
+
+class TestResponseErrors(unittest.TestCase):
+    def test_openai_logs_an_unreadable_response(self):
+        finder = OpenAIFinder(get_config("android", "openai", "openai"), MagicMock())
+        response = MagicMock(choices=[], usage=None)
+        with self.assertLogs("clickclickclick.finder", "ERROR") as logs:
+            self.assertEqual(finder._handle_response(response, (0, 0, 8, 8)), ("", (0, 0, 8, 8)))
+        self.assertIn("IndexError", logs.output[0])
+
+    def test_ollama_logs_the_error(self):
+        finder = OllamaFinder(get_config("android", "ollama", "ollama"), MagicMock())
+        with self.assertLogs("clickclickclick.finder", "ERROR") as logs:
+            self.assertEqual(finder._handle_response({}, (0, 0, 8, 8)), ("", (0, 0, 8, 8)))
+        self.assertIn("KeyError: 'message'", logs.output[0])
+
+
+class TestClickElements(unittest.TestCase):
+    prompts = ["search field", "search button"]
+
+    def setUp(self):
+        self.executor = MagicMock()
+        self.executor.screen_size = (100, 200)
+        self.planner = MagicMock()
+        self.finder = BatchStubFinder(self.executor, BOXES)
+
+    def test_clicks_in_order(self):
+        _process_finder_output(
+            "find_elements_and_click",
+            ["10,10,20,90", "10,90,20,100"],
+            {"prompts": self.prompts},
+            self.executor,
+            self.finder,
+            self.planner,
+        )
+        self.assertEqual(
+            [call.args[:2] for call in self.executor.click_at_a_point.call_args_list],
+            [(50, 30), (95, 30)],
+        )
+        self.assertEqual(self.planner.add_finder_message.call_count, 2)
+
+    def test_stops_at_a_missing_element(self):
+        _process_finder_output(
+            "find_elements_and_click",
+            ["0,0,0,0", "10,90,20,100"],
+            {"prompts": self.prompts},
+            self.executor,
+            self.finder,
+            self.planner,
+        )
+        self.executor.click_at_a_point.assert_not_called()
+        self.assertIn("not found", self.planner.add_finder_message.call_args.args[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,61 @@
+import io
+import unittest
+from unittest.mock import MagicMock, PropertyMock
+from PIL import Image
+from clickclickclick.screen import Frame
+from clickclickclick.finder import BaseFinder
+
+
+def make_png(size=(60, 120), color=(200, 10, 10)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class StubFinder(BaseFinder):
+    IMAGE_WIDTH = 100
+    IMAGE_HEIGHT = 100
+    OUTPUT_WIDTH = 1000
+    OUTPUT_HEIGHT = 1000
+
+    def __init__(self, executor):
+        super().__init__(None, "stub", {}, "", executor)
+        self.segments = []
+
+    def process_segment(self, segment, model, prompt):
+        self.segments.append(segment)
+        return ('{"ymin": 100, "xmin": 200, "ymax": 300, "xmax": 400}', segment[1])
+
+
+class TestFinderUsesStepFrame(unittest.TestCase):
+    def test_find_element_reuses_current_frame(self):
+        frame = Frame(data=make_png())
+        executor = MagicMock()
+        executor.current_frame.return_value = frame
+        finder = StubFinder(executor)
+
+        self.assertEqual(finder.find_element("search bar", "observation"), "10,20,30,40")
+        executor.current_frame.assert_called_once_with("observation")
+        executor.screenshot.assert_not_called()
+        self.assertIs(finder.segments[0][0], frame.resized(100))
+
+    def test_find_element_without_frame(self):
+        executor = MagicMock()
+        executor.current_frame.return_value = None
+        self.assertEqual(StubFinder(executor).find_element("x", "observation"), "0,0,0,0")
+
+
+class TestScaleCoordinates(unittest.TestCase):
+    def test_uses_cached_executor_screen_size(self):
+        executor = MagicMock()
+        screen_size = PropertyMock(return_value=(1000, 2000))
+        type(executor).screen_size = screen_size
+        finder = StubFinder(executor)
+
+        # mobile screens come back as x,y ordered bounds
+        self.assertEqual(finder.scale_coordinates([10, 20, 30, 40]), [200, 200, 400, 600])
+        screen_size.assert_called_once_with()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from PIL import Image, ImageDraw
+from clickclickclick.config import get_config
+from clickclickclick.finder.cache import ElementCache, normalize_prompt
+from clickclickclick.screen import Frame, dhash, hamming_distance
+from helpers import StubFinder
+
+MODEL_LATENCY = 0.02
+
+
+def make_screen(clock="12:00", offset=0, seed=0):
+    """A 400x800 phone screen with a status bar clock and a list of rows."""
+    image = Image.new("RGB", (400, 800), (240, 240, 240))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((0, 0, 400, 16), fill=(30, 30, 30))
+    draw.text((8, 2), clock, fill=(255, 255, 255))
+    for row in range(8):
+        top = 40 + row * 95 - offset
+        left = 20 + (row * 53 + seed * 97) % 250
+        draw.rectangle((left, top + 10, left + 60, top + 70), fill=(200, 40, 40))
+        draw.rectangle((left + 80, top + 30, 380, top + 50), fill=(60, 60, 60))
+    return Frame(image)
+
+
+class TestFingerprint(unittest.TestCase):
+    def test_small_changes_stay_close(self):
+        screen = make_screen()
+        self.assertEqual(screen.fingerprint, dhash(make_screen().image))
+        self.assertLessEqual(
+            hamming_distance(screen.fingerprint, make_screen(clock="12:01").fingerprint), 8
+        )
+        self.assertGreater(hamming_distance(screen.fingerprint, make_screen(seed=1).fingerprint), 8)
+
+
+class TestElementCache(unittest.TestCase):
+    def setUp(self):
+        self.executor = MagicMock()
+        self.finder = StubFinder(self.executor, latency=MODEL_LATENCY)
+        self.finder.element_cache = ElementCache()
+
+    def find(self, frame, prompt="Settings"):
+        self.executor.current_frame.return_value = frame
+        return self.finder.find_element(prompt, "observation")
+
+    def test_replay_hit_rate_and_latency_saved(self):
+        screens = [
+            make_screen(),
+            make_screen(),
+            make_screen(clock="12:01"),
+            make_screen(seed=1),
+            make_screen(clock="12:02"),
+            make_screen(seed=1),
+            make_screen(offset=30),
+        ]
+        results = [self.find(screen) for screen in screens]
+
+        self.assertEqual(set(results), {"10,20,30,40"})
+        cache = self.finder.element_cache
+        # the first screen, the other screen and the scrolled list need the model
+        self.assertEqual(self.finder.calls, 3)
+        self.assertEqual((cache.hits, cache.misses), (4, 3))
+        self.assertAlmostEqual(cache.hit_rate, 4 / 7)
+        self.assertGreaterEqual(cache.saved_seconds, 4 * MODEL_LATENCY)
+
+    def test_equivalent_prompts_share_an_entry(self):
+        self.find(make_screen(), "the Settings button")
+        self.find(make_screen(), "settings")
+        self.assertEqual(self.finder.calls, 1)
+        self.assertEqual(normalize_prompt("The  Settings icon!"), "settings")
+
+    def test_different_prompt_misses(self):
+        self.find(make_screen(), "Settings")
+        self.find(make_screen(), "Search bar")
+        self.assertEqual(self.finder.calls, 2)
+
+    def test_not_found_is_not_cached(self):
+        cache = ElementCache()
+        cache.put(make_screen(), "Settings", "0,0,0,0")
+        self.assertEqual(len(cache), 0)
+
+    def test_entries_expire(self):
+        cache = ElementCache(ttl=10)
+        screen = make_screen().resized(100)
+        with patch("clickclickclick.finder.cache.time.monotonic", return_value=100.0):
+            cache.put(screen, "Settings", "10,20,30,40")
+        with patch("clickclickclick.finder.cache.time.monotonic", return_value=105.0):
+            self.assertEqual(cache.get(screen, "Settings"), "10,20,30,40")
+        with patch("clickclickclick.finder.cache.time.monotonic", return_value=111.0):
+            self.assertIsNone(cache.get(screen, "Settings"))
+        self.assertEqual(len(cache), 0)
+
+    def test_least_recently_used_is_evicted(self):
+        cache = ElementCache(max_size=2)
+        screen = make_screen().resized(100)
+        cache.put(screen, "first", "10,20,30,40")
+        cache.put(screen, "second", "10,20,30,40")
+        cache.get(screen, "first")
+        cache.put(screen, "third", "10,20,30,40")
+        self.assertIsNotNone(cache.get(screen, "first"))
+        self.assertIsNone(cache.get(screen, "second"))
+
+    def test_sessions_share_the_cache(self):
+        self.find(make_screen())
+        session = self.finder.new_session(MagicMock())
+        session.executor.current_frame.return_value = make_screen()
+        session.find_element("Settings", "observation")
+        self.assertEqual(session.calls, 1)
+        self.assertEqual(self.finder.element_cache.hits, 1)
+
+    def test_from_config(self):
+        c = get_config("android", "gemini", "gemini")
+        self.assertIsInstance(ElementCache.from_config(c), ElementCache)
+        with patch.object(c, "FINDER_CACHE_SIZE", 0):
+            self.assertIsNone(ElementCache.from_config(c))
+
+
+if __name__ == "__main__":
+    unittest.main()
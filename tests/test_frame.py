@@ -0,0 +1,42 @@
+import io
+import unittest
+from unittest.mock import patch
+from PIL import Image
+from clickclickclick.screen import Frame
+
+
+def make_png(size=(60, 120), color=(200, 10, 10)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class TestFrame(unittest.TestCase):
+    def test_encoded_data_is_not_reencoded(self):
+        data = make_png()
+        frame = Frame(data=data, format="PNG")
+        with patch.object(Image.Image, "save") as mock_save:
+            self.assertIs(frame.png, data)
+            frame.base64()
+            mock_save.assert_not_called()
+
+    def test_image_is_decoded_lazily(self):
+        frame = Frame(data=make_png(size=(60, 120)))
+        self.assertIsNone(frame._image)
+        self.assertEqual(frame.size, (60, 120))
+
+    def test_derived_forms_are_cached(self):
+        frame = Frame(Image.new("RGB", (60, 120)))
+        self.assertIs(frame.resized(32), frame.resized(32, 32))
+        self.assertIs(frame.png, frame.png)
+        self.assertIs(frame.base64(), frame.base64())
+        self.assertIs(frame.jpeg(80), frame.jpeg(80))
+        self.assertEqual(frame.resized(32).size, (32, 32))
+
+    def test_jpeg_from_rgba(self):
+        frame = Frame(Image.new("RGBA", (8, 8)))
+        self.assertEqual(Image.open(io.BytesIO(frame.jpeg())).format, "JPEG")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import tempfile
+import time
+import tracemalloc
+import unittest
+from PIL import Image
+from clickclickclick.screen import Frame, ImageCodec
+from clickclickclick.screen.store import FrameStore, cleanup_leaked, set_default_store
+
+
+def disk_use(directory):
+    files = [os.path.join(root, name) for root, _, names in os.walk(directory) for name in names]
+    return len(files), sum(os.path.getsize(path) for path in files)
+
+
+class StoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.base = tempfile.TemporaryDirectory()
+        self.store = FrameStore(self.base.name, slots=4)
+        self.previous = set_default_store(self.store)
+
+    def tearDown(self):
+        set_default_store(self.previous)
+        self.store.close()
+        self.base.cleanup()
+
+
+class TestFrameStore(StoreTestCase):
+    def test_ring_deletes_the_oldest_file(self):
+        paths = [self.store.write(bytes([i]) * 10) for i in range(6)]
+        self.assertEqual(disk_use(self.store.directory), (4, 40))
+        self.assertFalse(os.path.exists(paths[0]))
+        self.assertFalse(self.store.holds(paths[1]))
+        with open(paths[-1], "rb") as file:
+            self.assertEqual(file.read(), bytes([5]) * 10)
+
+    def test_frame_writes_its_file_again_after_the_ring_moved_on(self):
+        frame = Frame(Image.new("RGB", (8, 8)))
+        path = frame.path
+        self.assertIs(frame.path, path)
+        for _ in range(4):
+            Frame(Image.new("RGB", (8, 8))).path
+        self.assertNotEqual(frame.path, path)
+        self.assertTrue(os.path.exists(frame.path))
+
+    def test_kept_files_outlive_the_ring(self):
+        kept = self.store.keep(self.store.write(b"step one"), "job/1")
+        for _ in range(4):
+            self.store.write(b"later")
+        with open(kept, "rb") as file:
+            self.assertEqual(file.read(), b"step one")
+        self.store.discard("job")
+        self.assertFalse(os.path.exists(kept))
+        self.assertEqual(self.store.keep("/elsewhere/step.png", "job/2"), "/elsewhere/step.png")
+
+    def test_close_removes_everything(self):
+        directory = self.store.directory
+        self.store.keep(self.store.write(b"data"), "job/1")
+        self.store.close()
+        self.assertFalse(os.path.exists(directory))
+
+    def test_soak(self):
+        codec = ImageCodec("JPEG", quality=80)
+        image = Image.new("RGB", (64, 128), (20, 120, 200))
+        tracemalloc.start()
+        try:
+            for step in range(3000):
+                frame = Frame(image.copy())
+                frame.path
+                codec.path(frame)
+                if step == 500:
+                    files, size = disk_use(self.store.directory)
+                    memory, _ = tracemalloc.get_traced_memory()
+            final_memory, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(disk_use(self.store.directory), (files, size))
+        self.assertEqual(files, 4)
+        self.assertLess(final_memory - memory, 64 * 1024)
+
+
+class TestCleanupLeaked(StoreTestCase):
+    def test_removes_directories_of_dead_processes(self):
+        live = self.store.directory
+        dead = tempfile.mkdtemp(prefix="clickclickclick-999999999-", dir=self.base.name)
+        self.assertEqual(cleanup_leaked([self.base.name]), [dead])
+        self.assertTrue(os.path.exists(live))
+        self.assertFalse(os.path.exists(dead))
+
+    def test_legacy_screenshots(self):
+        def leaked(name, data, age):
+            path = os.path.join(self.base.name, name)
+            with open(path, "wb") as file:
+                file.write(data)
+            os.utime(path, (time.time() - age, time.time() - age))
+            return path
+
+        old = leaked("tmpab12cd34.png", b"\x89PNG\r\n", 7200)
+        leaked("tmpab12cd35.png", b"\x89PNG\r\n", 60)
+        leaked("tmpab12cd36.txt", b"\x89PNG\r\n", 7200)
+        leaked("tmpab12cd37", b"not an image", 7200)
+        self.assertEqual(cleanup_leaked([self.base.name]), [])
+        self.assertEqual(cleanup_leaked([self.base.name], legacy=True, dry_run=True), [old])
+        self.assertTrue(os.path.exists(old))
+        cleanup_leaked([self.base.name], legacy=True)
+        self.assertFalse(os.path.exists(old))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+from PIL import Image
+from clickclickclick.config import get_config
+from clickclickclick.planner.gemini import GeminiPlanner
+from clickclickclick.screen import Frame
+
+
+def response(name="click", args=None):
+    function_call = SimpleNamespace(name=name, args=args or {"x": 1})
+    part = SimpleNamespace(function_call=function_call)
+    return SimpleNamespace(
+        candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))],
+        usage_metadata=SimpleNamespace(cached_content_token_count=0, prompt_token_count=300),
+    )
+
+
+class TestGeminiPlanner(unittest.TestCase):
+    def setUp(self):
+        self.planner = GeminiPlanner(get_config("android", "gemini", "gemini"))
+        self.model = MagicMock()
+        self.model.start_chat.side_effect = lambda: MagicMock(
+            model=self.model, send_message=MagicMock(return_value=response())
+        )
+        self.planner._model["model"] = self.model
+
+    def screenshot(self):
+        return Frame(Image.new("RGB", (540, 1200), (30, 110, 220)))
+
+    def test_screenshot_is_sent_inline(self):
+        with patch("google.generativeai.upload_file") as upload_file:
+            for _ in range(2):
+                self.planner.llm_response("open settings", self.screenshot())
+        upload_file.assert_not_called()
+
+        history = self.planner.chat_session.history
+        image = history[-1]["parts"][0]
+        self.assertEqual(image["mime_type"], "image/png")
+        self.assertEqual(Frame(data=image["data"]).size, (768, 768))
+        # only the latest screenshot is in the history
+        images = [
+            part for message in history for part in message["parts"] if isinstance(part, dict)
+        ]
+        self.assertEqual(len(images), 1)
+
+    def test_one_chat_per_task(self):
+        for _ in range(3):
+            self.planner.llm_response("open settings", self.screenshot())
+        self.assertEqual(self.model.start_chat.call_count, 1)
+        self.assertEqual(self.planner.chat_session.send_message.call_count, 3)
+        self.assertEqual(len(self.planner.step_timings), 3)
+        self.assertEqual(set(self.planner.step_timings[0]), {"image", "request"})
+
+        session = self.planner.new_session()
+        session.llm_response("open settings", self.screenshot())
+        self.assertEqual(self.model.start_chat.call_count, 2)
+        self.assertEqual(len(session.step_timings), 1)
+
+    def test_new_model_starts_a_new_chat(self):
+        self.planner.llm_response("open settings", self.screenshot())
+        refreshed = MagicMock()
+        refreshed.start_chat.return_value = MagicMock(
+            model=refreshed, send_message=MagicMock(return_value=response())
+        )
+        self.planner._model["model"] = refreshed
+        self.planner.llm_response("open settings", self.screenshot())
+        refreshed.start_chat.assert_called_once()
+
+    def prompt_cache(self, tokens, create):
+        self.planner.prompt_cache = True
+        self.planner._model["model"] = None
+        counting = MagicMock()
+        counting.count_tokens.return_value = SimpleNamespace(total_tokens=tokens)
+        return (
+            patch("google.generativeai.GenerativeModel", return_value=counting),
+            patch("google.generativeai.caching.CachedContent.create", side_effect=create),
+        )
+
+    def test_prompt_below_the_cacheable_size_is_not_cached(self):
+        models, create = self.prompt_cache(3000, None)
+        with models, create as created:
+            self.planner.model
+        created.assert_not_called()
+        self.assertIsNone(self.planner._model["expires_at"])
+
+    def test_cache_failure_is_not_retried_by_later_tasks(self):
+        models, create = self.prompt_cache(40000, ValueError("too small"))
+        with models, create as created:
+            self.planner.new_session().model
+            # e.g. the planner was set up again for another task
+            self.planner._model["model"] = None
+            self.planner.new_session().model
+        created.assert_called_once()
+
+    def test_async(self):
+        self.model.start_chat.side_effect = lambda: MagicMock(
+            model=self.model, send_message_async=AsyncMock(return_value=response())
+        )
+        result = asyncio.run(self.planner.llm_response_async("open settings", self.screenshot()))
+        self.assertEqual(result, [("click", {"x": 1})])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import unittest
+from subprocess import CompletedProcess, TimeoutExpired
+from unittest.mock import AsyncMock, MagicMock, PropertyMock, patch
+from PIL import Image
+from clickclickclick.executor.android import AndroidExecutor
+from clickclickclick.finder.hierarchy import UIIndex, parse_hierarchy
+from clickclickclick.screen import Frame
+from helpers import StubFinder
+
+DUMP = """<?xml version='1.0' encoding='UTF-8' standalone='yes' ?><hierarchy rotation="0">
+<node index="0" text="" resource-id="" class="android.widget.FrameLayout" content-desc="" clickable="false" bounds="[0,0][1000,2000]">
+  <node index="0" text="" resource-id="com.android.settings:id/search_bar" class="android.widget.LinearLayout" content-desc="" clickable="true" bounds="[40,100][960,200]">
+    <node index="0" text="Search settings" resource-id="" class="android.widget.TextView" content-desc="" clickable="false" bounds="[120,120][600,180]" />
+  </node>
+  <node index="1" text="" resource-id="" class="android.widget.LinearLayout" content-desc="" clickable="true" bounds="[0,300][1000,400]">
+    <node index="0" text="Network &amp; internet" resource-id="android:id/title" class="android.widget.TextView" content-desc="" clickable="false" bounds="[150,320][700,380]" />
+  </node>
+  <node index="2" text="" resource-id="" class="android.widget.ImageButton" content-desc="Navigate up" clickable="true" bounds="[0,0][100,100]" />
+  <node index="3" text="Wi-Fi" resource-id="" class="android.widget.TextView" content-desc="" clickable="true" bounds="[0,500][1000,600]" />
+  <node index="4" text="Wi-Fi" resource-id="" class="android.widget.TextView" content-desc="" clickable="true" bounds="[0,700][1000,800]" />
+  <node index="5" text="Hidden" resource-id="" class="android.widget.TextView" content-desc="" clickable="true" bounds="[0,0][0,0]" />
+</node>
+</hierarchy>UI hierchary dumped to: /dev/tty"""
+
+
+class TestUIIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = UIIndex.from_xml(DUMP)
+
+    def test_parse_skips_unlabelled_and_invisible_nodes(self):
+        texts = [node.text or node.content_desc or node.resource_id for node in self.index.nodes]
+        self.assertNotIn("Hidden", texts)
+        self.assertEqual(len(parse_hierarchy(DUMP)), 6)
+
+    def test_exact_text(self):
+        self.assertEqual(self.index.find("Search settings").bounds, (120, 120, 600, 180))
+
+    def test_fuzzy_text_and_content_desc(self):
+        self.assertEqual(self.index.find("Network and internet").bounds, (150, 320, 700, 380))
+        self.assertEqual(self.index.find("navigate up button").bounds, (0, 0, 100, 100))
+
+    def test_resource_id(self):
+        self.assertEqual(self.index.find("search bar").bounds, (40, 100, 960, 200))
+
+    def test_ambiguous_or_unknown_prompt(self):
+        self.assertIsNone(self.index.find("Wi-Fi"))
+        self.assertIsNone(self.index.find("Bluetooth"))
+
+
+class TestHierarchyFinder(unittest.TestCase):
+    def setUp(self):
+        self.executor = MagicMock()
+        self.executor.current_frame.return_value = Frame(Image.new("RGB", (50, 100)))
+        self.executor.ui_hierarchy.return_value = DUMP
+        type(self.executor).screen_size = PropertyMock(return_value=(1000, 2000))
+        self.finder = StubFinder(self.executor)
+        self.finder.use_hierarchy = True
+
+    def test_hierarchy_answers_without_the_model(self):
+        # bounds come back as ymin,xmin,ymax,xmax in the finder's 100x100 image space
+        self.assertEqual(self.finder.find_element("Search settings", "observation"), "6,12,9,60")
+        self.assertEqual(self.finder.calls, 0)
+        self.assertEqual(self.finder.lookup_sources, {"hierarchy": 1})
+
+    def test_miss_falls_back_to_the_model(self):
+        self.assertEqual(self.finder.find_element("Bluetooth", "observation"), "10,20,30,40")
+        self.assertEqual(self.finder.calls, 1)
+        self.assertEqual(self.finder.lookup_sources, {"model": 1})
+
+    def test_disabled_or_unavailable(self):
+        self.finder.use_hierarchy = False
+        self.finder.find_element("Search settings", "observation")
+        self.executor.ui_hierarchy.assert_not_called()
+
+        self.finder.use_hierarchy = True
+        self.executor.ui_hierarchy.return_value = None
+        self.finder.find_element("Search settings", "observation")
+        self.assertEqual(self.finder.calls, 2)
+
+    def test_async(self):
+        self.executor.current_frame_async = AsyncMock(return_value=Frame(Image.new("RGB", (5, 5))))
+        self.executor.ui_hierarchy_async = AsyncMock(return_value=DUMP)
+        bounds = asyncio.run(self.finder.find_element_async("search bar", "observation"))
+        self.assertEqual(bounds, "5,4,10,96")
+        self.assertEqual(self.finder.calls, 0)
+
+
+class TestAndroidHierarchyDump(unittest.TestCase):
+    @patch("clickclickclick.executor.android.run_adb_command")
+    def test_dumped_once_per_step(self, mock_run):
+        mock_run.return_value = CompletedProcess([], 0, DUMP, "")
+        executor = AndroidExecutor(persistent_shell=False, serial="emulator-5554")
+
+        self.assertEqual(executor.ui_hierarchy(), DUMP)
+        self.assertEqual(executor.ui_hierarchy(), DUMP)
+        mock_run.assert_called_once_with(
+            ["exec-out", "uiautomator", "dump", "/dev/tty"],
+            timeout=executor.hierarchy_timeout,
+            serial="emulator-5554",
+        )
+        executor.invalidate_frame()
+        executor.ui_hierarchy()
+        self.assertEqual(mock_run.call_count, 2)
+
+    @patch("clickclickclick.executor.android.run_adb_command")
+    def test_failed_dump(self, mock_run):
+        mock_run.return_value = CompletedProcess([], 0, "ERROR: could not get idle state.", "")
+        self.assertIsNone(AndroidExecutor(persistent_shell=False).ui_hierarchy())
+
+    @patch("clickclickclick.executor.android.run_adb_command")
+    def test_failed_dump_is_not_retried_within_the_step(self, mock_run):
+        mock_run.side_effect = TimeoutExpired("adb", 3)
+        executor = AndroidExecutor(persistent_shell=False)
+        self.assertIsNone(executor.ui_hierarchy())
+        self.assertIsNone(executor.ui_hierarchy())
+        self.assertEqual(mock_run.call_count, 1)
+        executor.invalidate_frame()
+        executor.ui_hierarchy()
+        self.assertEqual(mock_run.call_count, 2)
+
+    @patch("clickclickclick.executor.android.run_adb_command_async")
+    def test_async_dump_times_out(self, mock_run):
+        mock_run.side_effect = asyncio.TimeoutError()
+        executor = AndroidExecutor(persistent_shell=False)
+        self.assertIsNone(asyncio.run(executor.ui_hierarchy_async()))
+        self.assertIsNone(asyncio.run(executor.ui_hierarchy_async()))
+        self.assertEqual(mock_run.call_count, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import unittest
+from clickclickclick.planner.history import IMAGE_TOKENS, ChatHistory, estimate_tokens
+
+
+def text(value, role="user"):
+    return {"role": role, "content": [{"type": "text", "text": value}]}
+
+
+def screenshot(value=None):
+    content = [{"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}}]
+    if value is not None:
+        content.insert(0, {"type": "text", "text": value})
+    return {"role": "user", "content": content}
+
+
+class TestChatHistory(unittest.TestCase):
+    def test_only_latest_screenshot_is_kept(self):
+        history = ChatHistory()
+        history.pin({"role": "system", "content": "system"})
+        history.set_task("open calculator", text("open calculator"))
+        for step in range(3):
+            history.append_screenshot(screenshot())
+            history.append(text(f"Function: swipe_up {step}", role="assistant"))
+
+        messages = history.messages()
+        images = [
+            item
+            for message in messages
+            for item in message["content"]
+            if isinstance(item, dict) and item["type"] == "image_url"
+        ]
+        self.assertEqual(len(images), 1)
+        # image only messages of earlier steps are gone entirely
+        self.assertEqual(len(messages), 2 + 1 + 3)
+        self.assertEqual(messages[0]["role"], "system")
+        self.assertEqual(messages[1], text("open calculator"))
+
+    def test_screenshot_text_is_kept_when_stripped(self):
+        history = ChatHistory()
+        history.append_screenshot(screenshot("a different question"))
+        history.append_screenshot(screenshot())
+        self.assertEqual(history.messages()[0], text("a different question"))
+
+    def test_token_budget_drops_oldest_turns(self):
+        history = ChatHistory(token_budget=IMAGE_TOKENS + 100, text_message=text)
+        history.set_task("task", text("task"))
+        for step in range(50):
+            history.append_screenshot(screenshot())
+            history.append(text(f"Function: step {step} " + "x" * 80, role="assistant"))
+            self.assertLessEqual(history.tokens, IMAGE_TOKENS + 100)
+
+        messages = history.messages()
+        self.assertEqual(messages[0], text("task"))
+        summary = messages[1]["content"][0]["text"]
+        self.assertIn("earlier messages of this task were dropped", summary)
+        self.assertIn("assistant: Function: step", summary)
+        self.assertEqual(messages[-1]["content"][0]["text"].split()[2], "49")
+        self.assertEqual(history.tokens, sum(estimate_tokens(m) for m in messages[2:]))
+
+    def test_latest_screenshot_is_never_dropped(self):
+        history = ChatHistory(token_budget=1)
+        history.append(text("finder message"))
+        history.append_screenshot(screenshot())
+        self.assertEqual(len(history.messages()), 2)
+        self.assertEqual(history.messages()[-1], screenshot())
+
+    def test_caption_goes_with_the_screenshot(self):
+        history = ChatHistory()
+        caption = "New screenshot for the task attached"
+        for _ in range(3):
+            history.append_screenshot(
+                {"role": "user", "content": caption, "images": [b"png"]}, caption
+            )
+        self.assertEqual(
+            history.messages(), [{"role": "user", "content": caption, "images": [b"png"]}]
+        )
+
+    def test_provider_formats(self):
+        history = ChatHistory()
+        history.append_screenshot({"role": "user", "content": "look", "images": [b"png"]})
+        history.append_screenshot({"role": "user", "parts": [object()]})
+        history.append_screenshot({"role": "user", "content": "again", "images": [b"png"]})
+        self.assertEqual(
+            history.messages(),
+            [
+                {"role": "user", "content": "look"},
+                {"role": "user", "content": "again", "images": [b"png"]},
+            ],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,200 @@
+import asyncio
+import threading
+import unittest
+from clickclickclick.jobs import (
+    CANCELLED,
+    FAILED,
+    QUEUED,
+    RUNNING,
+    SUCCEEDED,
+    TIMED_OUT,
+    JobManager,
+    QueueFull,
+    run_task_generator,
+)
+
+
+def fake_task(steps, result=True):
+    for step in range(steps):
+        yield [(f"/tmp/step{step}.png", f"observation {step}")]
+    return result
+
+
+def hung_task(stop, release, acted):
+    """A step stuck in a model request until ``release``, then acting unless stopped."""
+    try:
+        yield [("/tmp/step0.png", "")]
+        release.wait(5)
+        if stop.is_set():
+            return False
+        acted.append(True)
+        yield [("/tmp/step1.png", "")]
+        return True
+    finally:
+        acted.append("closed")
+
+
+class TestJobManager(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        await self.manager.stop()
+
+    def start(self, handler, **kwargs):
+        self.manager = JobManager(handler, **kwargs)
+        self.manager.start()
+        return self.manager
+
+    async def wait_until_finished(self, job):
+        async for _ in job.stream():
+            pass
+
+    async def test_job_runs_in_the_background(self):
+        release = asyncio.Event()
+
+        async def handler(job):
+            await release.wait()
+            return True
+
+        manager = self.start(handler)
+        job = manager.submit({"task_prompt": "open calculator"})
+        self.assertEqual(job.status, QUEUED)
+        await asyncio.sleep(0)
+        self.assertEqual(job.status, RUNNING)
+        release.set()
+        await self.wait_until_finished(job)
+        self.assertEqual(job.status, SUCCEEDED)
+        self.assertTrue(job.result)
+
+    async def test_concurrency_is_bounded(self):
+        running = []
+        release = asyncio.Event()
+
+        async def handler(job):
+            running.append(job.id)
+            await release.wait()
+            return True
+
+        manager = self.start(handler, workers=2)
+        jobs = [manager.submit({}) for _ in range(5)]
+        await asyncio.sleep(0.01)
+        self.assertEqual(len(running), 2)
+        self.assertEqual(manager.queued, 3)
+        release.set()
+        for job in jobs:
+            await self.wait_until_finished(job)
+        self.assertEqual(len(running), 5)
+
+    async def test_full_queue_pushes_back(self):
+        async def handler(job):
+            await asyncio.Event().wait()
+
+        manager = self.start(handler, workers=1, queue_size=2)
+        manager.submit({})
+        await asyncio.sleep(0)
+        manager.submit({})
+        manager.submit({})
+        with self.assertRaises(QueueFull):
+            manager.submit({})
+
+    async def test_cancel_queued_job(self):
+        release = asyncio.Event()
+        started = []
+
+        async def handler(job):
+            started.append(job.id)
+            await release.wait()
+            return True
+
+        manager = self.start(handler, workers=1)
+        manager.submit({})
+        queued = manager.submit({})
+        await manager.cancel(queued.id)
+        self.assertEqual(queued.status, CANCELLED)
+        release.set()
+        await asyncio.sleep(0.01)
+        self.assertNotIn(queued.id, started)
+
+    async def test_failed_job_reports_error(self):
+        async def handler(job):
+            raise ValueError("Unsupported planner model: foo")
+
+        manager = self.start(handler)
+        job = manager.submit({})
+        await self.wait_until_finished(job)
+        self.assertEqual(job.status, FAILED)
+        self.assertIn("foo", job.error)
+
+    async def test_stream_replays_steps(self):
+        async def handler(job):
+            return await run_task_generator(job, fake_task(3), timeout=60)
+
+        manager = self.start(handler)
+        job = manager.submit({})
+        events = [event async for event in job.stream()]
+        steps = [event for event in events if event["type"] == "step"]
+        self.assertEqual([event["step"] for event in steps], [1, 2, 3])
+        self.assertEqual(steps[0]["screenshot"], "/tmp/step0.png")
+        self.assertEqual(events[-1]["status"], SUCCEEDED)
+        self.assertEqual(job.to_dict()["steps"], 3)
+
+    async def test_cancel_running_job_between_steps(self):
+        async def handler(job):
+            return await run_task_generator(job, fake_task(100), timeout=60)
+
+        manager = self.start(handler)
+        job = manager.submit({})
+        async for event in job.stream():
+            if event["type"] == "step":
+                await manager.cancel(job.id)
+        self.assertEqual(job.status, CANCELLED)
+        self.assertLess(job.to_dict()["steps"], 100)
+
+    async def test_timeout(self):
+        async def handler(job):
+            return await run_task_generator(job, fake_task(100), timeout=0)
+
+        manager = self.start(handler)
+        job = manager.submit({})
+        await self.wait_until_finished(job)
+        self.assertEqual(job.status, TIMED_OUT)
+        # the wait for the first step already times out
+        self.assertEqual(job.to_dict()["steps"], 0)
+
+    async def test_timeout_covers_a_hung_step(self):
+        release = threading.Event()
+        acted = []
+
+        async def handler(job):
+            generator = hung_task(job.stop, release, acted)
+            return await run_task_generator(job, generator, timeout=0.1)
+
+        manager = self.start(handler)
+        job = manager.submit({})
+        await self.wait_until_finished(job)
+        self.assertEqual(job.status, TIMED_OUT)
+        self.assertTrue(job.stop.is_set())
+        release.set()
+        await asyncio.sleep(0.1)
+        self.assertEqual(acted, ["closed"])
+
+    async def test_stop_waits_for_the_running_step(self):
+        release = threading.Event()
+        acted = []
+
+        async def handler(job):
+            generator = hung_task(job.stop, release, acted)
+            return await run_task_generator(job, generator, timeout=60)
+
+        manager = self.start(handler)
+        job = manager.submit({})
+        async for event in job.stream():
+            if event["type"] == "step":
+                break
+        threading.Timer(0.1, release.set).start()
+        await asyncio.wait_for(manager.stop(), 5)
+        self.assertEqual(job.status, CANCELLED)
+        # the step saw the stop, nothing was sent after it and the generator was closed
+        self.assertEqual(acted, ["closed"])
+
+
+if __name__ == "__main__":
+    unittest.main()
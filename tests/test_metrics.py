@@ -0,0 +1,93 @@
+import unittest
+from types import SimpleNamespace
+from clickclickclick import metrics
+from clickclickclick.prompt_cache import PromptCacheStats
+from clickclickclick.tracing import TaskTrace, activate, span
+
+
+class TestMetrics(unittest.TestCase):
+    def test_counter(self):
+        counter = metrics.Counter("test_requests", "Requests.", ("model",))
+        counter.inc(model="gemini")
+        counter.inc(2, model="gemini")
+        self.assertEqual(
+            counter.render(),
+            "# HELP test_requests Requests.\n"
+            "# TYPE test_requests counter\n"
+            'test_requests_total{model="gemini"} 3',
+        )
+        with self.assertRaises(ValueError):
+            counter.inc(serial="emulator-5554")
+
+    def test_histogram(self):
+        histogram = metrics.Histogram("test_latency_seconds", "Latency.", ("stage",), (0.1, 1))
+        for value in (0.05, 0.1, 0.5, 3):
+            histogram.observe(value, stage="planner")
+        lines = histogram.render().splitlines()[2:]
+        self.assertEqual(
+            lines,
+            [
+                'test_latency_seconds_bucket{stage="planner",le="0.1"} 2',
+                'test_latency_seconds_bucket{stage="planner",le="1"} 3',
+                'test_latency_seconds_bucket{stage="planner",le="+Inf"} 4',
+                'test_latency_seconds_sum{stage="planner"} 3.65',
+                'test_latency_seconds_count{stage="planner"} 4',
+            ],
+        )
+
+    def test_gauge_function_and_escaping(self):
+        gauge = metrics.Gauge("test_devices", "Devices.", ("state",))
+        gauge.set_function(lambda: {('in "use"',): 2})
+        self.assertIn('test_devices{state="in \\"use\\""} 2', gauge.render())
+
+
+class TestTaskMetrics(unittest.TestCase):
+    labels = {"planner_model": "test-planner", "finder_model": "test-finder", "serial": "5554"}
+
+    def test_spans_and_tasks_are_recorded(self):
+        trace = TaskTrace(labels=self.labels)
+        with activate(trace), span("task"):
+            for _ in range(3):
+                with span("task.step"), span("planner.llm_response"):
+                    pass
+
+        model_labels = {"planner_model": "test-planner", "finder_model": "test-finder"}
+        self.assertEqual(
+            metrics.STAGE_DURATION.count(stage="planner.llm_response", **self.labels), 3
+        )
+
+        planner = SimpleNamespace(cache_stats=PromptCacheStats())
+        planner.cache_stats.record(cached_tokens=200, input_tokens=1000)
+        metrics.record_task(trace, "succeeded", planner, None)
+        self.assertEqual(metrics.TASKS.value(status="succeeded", serial="5554", **model_labels), 1)
+        self.assertEqual(metrics.TASK_STEPS.count(**model_labels), 1)
+        self.assertEqual(metrics.TASK_DURATION.count(serial="5554", **model_labels), 1)
+        self.assertEqual(
+            metrics.MODEL_TOKENS.value(role="planner", model="test-planner", kind="cached"), 200
+        )
+        self.assertIn("clickclickclick_task_steps_bucket", metrics.render())
+
+    def test_undeclared_tools_share_a_stage(self):
+        trace = TaskTrace(labels=self.labels)
+        with activate(trace):
+            for name in ("tool.swipe_up", "tool.open_the_pod_bay_doors", "tool.fly"):
+                with span(name):
+                    pass
+
+        self.assertEqual(metrics.STAGE_DURATION.count(stage="tool.swipe_up", **self.labels), 1)
+        self.assertEqual(metrics.STAGE_DURATION.count(stage="tool.other", **self.labels), 2)
+        self.assertNotIn("tool.fly", metrics.render())
+
+    def test_error_outcome(self):
+        # the registry is shared, these labels keep the task out of the other tests' counts
+        labels = dict(self.labels, planner_model="raising-planner")
+        metrics.record_task(TaskTrace(labels=labels), metrics.ERROR)
+        self.assertEqual(metrics.TASKS.value(status="error", **labels), 1)
+
+    def test_adb_failures(self):
+        metrics.record_adb_failure("emulator-test", ["exec-out", "screencap", "-p"])
+        self.assertEqual(metrics.ADB_FAILURES.value(serial="emulator-test", command="exec-out"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
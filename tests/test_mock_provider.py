@@ -0,0 +1,122 @@
+import time
+import unittest
+from unittest.mock import MagicMock
+import requests
+from PIL import Image
+from clickclickclick.config import get_config
+from clickclickclick.mock_provider import (
+    FINISHED,
+    MockProvider,
+    MockProviderServer,
+    MockScript,
+    point_models_at,
+)
+from clickclickclick.screen import Frame
+from clickclickclick.utils import get_finder, get_planner
+
+SCREEN = (540, 1200)
+MODELS = ["openai", "anthropic", "gemini", "ollama"]
+
+
+class TestMockProvider(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.provider = MockProvider(
+            MockScript(
+                steps=[
+                    [("find_element_and_click", {"prompt": "Settings", "observation": "home"})],
+                    [("swipe_up", {"observation": "settings"})],
+                ],
+                elements={"Settings": (0.1, 0.2, 0.3, 0.4)},
+            )
+        )
+        cls.server = MockProviderServer(cls.provider).start()
+        cls.frame = Frame(Image.new("RGB", SCREEN, (200, 200, 200)))
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+
+    def setUp(self):
+        self.provider.stats.clear()
+        self.provider.latency = 0.0
+        self.provider.error_rate = 0.0
+
+    def models(self, model):
+        c = get_config("android", model, model)
+        point_models_at(c, self.server.url, model, model)
+        # the ollama finder has no output space in models.yaml
+        c.models["finder_config"].setdefault("output_width", 1000)
+        c.models["finder_config"].setdefault("output_height", 1000)
+        executor = MagicMock()
+        executor.screen_size = SCREEN
+        executor.current_frame.return_value = self.frame
+        planner = get_planner(model, c, executor)
+        finder = get_finder(model, c, executor)
+        finder.use_hierarchy = False
+        finder.element_cache = None
+        return planner, finder
+
+    def test_planners_follow_the_script(self):
+        for model in MODELS:
+            with self.subTest(model=model):
+                planner, _ = self.models(model)
+                first = planner.llm_response("open settings", self.frame)
+                self.assertEqual(first[0][0], "find_element_and_click")
+                self.assertEqual(first[0][1]["prompt"], "Settings")
+                planner.add_finder_message("clicked")
+                self.assertEqual(
+                    planner.llm_response("open settings", self.frame)[0][0], "swipe_up"
+                )
+                planner.add_finder_message("swiped")
+                last = planner.llm_response("open settings", self.frame)
+                self.assertEqual(last[0][0], FINISHED[0])
+                self.assertEqual(self.provider.stats[f"{model}.planner"], 3)
+
+    def test_new_task_starts_the_script_again(self):
+        planner, _ = self.models("openai")
+        planner.llm_response("open settings", self.frame)
+        planner.add_finder_message("clicked")
+        planner.llm_response("open settings", self.frame)
+        again = planner.new_session().llm_response("open settings", self.frame)
+        self.assertEqual(again[0][1]["prompt"], "Settings")
+
+    def test_finders_find_the_scripted_element(self):
+        for model in MODELS:
+            with self.subTest(model=model):
+                _, finder = self.models(model)
+                left, top, right, bottom = map(int, finder.find_element("Settings", "").split(","))
+                self.assertLess(left, right)
+                self.assertLess(top, bottom)
+                self.assertEqual(self.provider.stats[f"{model}.finder"], 1)
+
+    def test_finders_find_a_batch(self):
+        _, finder = self.models("gemini")
+        settings, other = finder.find_elements(["Settings", "Wi-Fi"], "")
+        self.assertNotEqual(settings, "0,0,0,0")
+        self.assertNotEqual(other, "0,0,0,0")
+        self.assertNotEqual(settings, other)
+
+    def test_injected_errors_use_the_provider_format(self):
+        self.provider.error_rate = 1.0
+        self.provider.error_status = 429
+        body = {"model": "mock", "messages": [{"role": "user", "content": "hi"}]}
+        response = requests.post(f"{self.server.url}/v1/messages", json=body)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.json()["error"]["type"], "rate_limit_error")
+        response = requests.post(f"{self.server.url}/v1/chat/completions", json=body)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("message", response.json()["error"])
+        self.assertEqual(self.provider.stats["anthropic.errors"], 1)
+        self.assertEqual(self.provider.stats["openai.errors"], 1)
+
+    def test_latency_is_waited(self):
+        self.provider.latency = 0.1
+        planner, _ = self.models("anthropic")
+        started = time.monotonic()
+        planner.llm_response("open settings", self.frame)
+        self.assertGreaterEqual(time.monotonic() - started, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,142 @@
+import asyncio
+import threading
+import unittest
+from collections import Counter
+from subprocess import CompletedProcess
+from unittest.mock import MagicMock, call, patch
+from PIL import Image
+from clickclickclick.config import BaseConfig
+from clickclickclick.executor.android import AndroidExecutor
+from clickclickclick.planner.pipeline import FramePrefetcher, FramePrefetcherAsync
+from clickclickclick.planner.task import _process_finder_output, execute_task
+from clickclickclick.screen import Frame
+from helpers import SwipingPlanner, changing_screen_executor
+
+
+class FakeClock:
+    """Time that only passes while a capture runs, so the timings are exact."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def timed_capture(clock, seconds):
+    def capture(settle):
+        clock.now += seconds
+        return Frame(Image.new("RGB", (40, 80)))
+
+    return capture
+
+
+class TestFramePrefetcher(unittest.TestCase):
+    def test_capture_overlaps_the_end_of_the_step(self):
+        clock = FakeClock()
+        prepared = threading.Event()
+        prepare = MagicMock(side_effect=lambda frame: prepared.set())
+        prefetcher = FramePrefetcher(timed_capture(clock, 0.2), prepare, clock=clock)
+        prefetcher.start()
+        # the step is wrapped up while the capture runs, it is done by the next step
+        self.assertTrue(prepared.wait(5))
+        frame = prefetcher.frame()
+        prepare.assert_called_once_with(frame)
+
+        stats = prefetcher.stats
+        self.assertEqual(stats["steps"], 1)
+        self.assertEqual(stats["capture"], 0.2)
+        self.assertEqual(stats["wait"], 0)
+        self.assertEqual(stats["overlapped"], 0.2)
+        prefetcher.close()
+
+    def test_captures_right_away_when_not_started(self):
+        capture = MagicMock(return_value=None)
+        prefetcher = FramePrefetcher(capture, MagicMock())
+        self.assertIsNone(prefetcher.frame(settle=False))
+        capture.assert_called_once_with(False)
+        self.assertEqual(prefetcher.stats, Counter())
+
+    def test_disabled(self):
+        prefetcher = FramePrefetcher(timed_capture(FakeClock(), 0), MagicMock(), enabled=False)
+        prefetcher.start()
+        self.assertFalse(prefetcher.started)
+
+    def test_async(self):
+        clock = FakeClock()
+        capture = timed_capture(clock, 0.2)
+        prepared = threading.Event()
+
+        async def capture_async(settle):
+            return capture(settle)
+
+        async def step():
+            prefetcher = FramePrefetcherAsync(
+                capture_async, lambda frame: prepared.set(), clock=clock
+            )
+            prefetcher.start()
+            self.assertTrue(await asyncio.to_thread(prepared.wait, 5))
+            frame = await prefetcher.frame()
+            await prefetcher.close()
+            return frame, prefetcher.stats
+
+        frame, stats = asyncio.run(step())
+        self.assertIsNotNone(frame)
+        self.assertEqual(stats["overlapped"], 0.2)
+
+
+DUMP = '<hierarchy rotation="0"><node text="{}" bounds="[0,0][10,10]" /></hierarchy>'
+
+
+class TestPrefetchedHierarchy(unittest.TestCase):
+    @patch("clickclickclick.executor.android.run_adb_command")
+    def test_prefetched_frame_drops_the_hierarchy(self, mock_run):
+        # the next step's frame is captured without invalidate_frame(), its screen's
+        # hierarchy must not be the one dumped for the step before
+        dumps = iter([DUMP.format("before"), DUMP.format("after")])
+        mock_run.side_effect = lambda *args, **kwargs: CompletedProcess([], 0, next(dumps), "")
+        executor = AndroidExecutor(persistent_shell=False)
+        executor._capture_frame = lambda: Frame(Image.new("RGB", (40, 80)))
+        executor.capture_frame("")
+        self.assertIn("before", executor.ui_hierarchy())
+
+        prefetcher = FramePrefetcher(lambda settle: executor.capture_frame(""), MagicMock())
+        prefetcher.start()
+        prefetcher.frame()
+        prefetcher.close()
+        self.assertIn("after", executor.ui_hierarchy())
+
+
+class TestPipelinedTask(unittest.TestCase):
+    def test_frames_are_encoded_ahead_of_the_planner(self):
+        config = BaseConfig()
+        config.SETTLE_MAX_WAIT = 0
+        config.TASK_DELAY = 0
+        config.PIPELINE_CAPTURE = True
+        executor = changing_screen_executor()
+        planner = SwipingPlanner(steps=4)
+        self.assertTrue(execute_task("scroll", executor, planner, MagicMock(), config))
+        self.assertEqual(planner.encoded, [False, True, True, True])
+        self.assertEqual(executor.pipeline_stats["steps"], 3)
+
+    def test_next_capture_starts_once_the_click_is_sent(self):
+        events = MagicMock()
+        finder = MagicMock()
+        finder.scale_coordinates.side_effect = lambda coordinates: coordinates
+        _process_finder_output(
+            "find_element_and_click",
+            "10,10,30,30",
+            {"prompt": "the OK button"},
+            events.executor,
+            finder,
+            events.planner,
+            events.dispatched,
+        )
+        self.assertEqual(
+            [name for name, _, _ in events.mock_calls],
+            ["executor.click_at_a_point", "dispatched", "planner.add_finder_message"],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
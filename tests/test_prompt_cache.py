@@ -0,0 +1,75 @@
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from clickclickclick.config import get_config
+from clickclickclick.planner.anthropic import AnthropicPlanner
+from clickclickclick.planner.openai import ChatGPTPlanner
+from clickclickclick.prompt_cache import PromptCacheStats
+
+
+class TestPromptCacheStats(unittest.TestCase):
+    def test_anthropic_usage(self):
+        stats = PromptCacheStats()
+        stats.record_anthropic(
+            SimpleNamespace(
+                input_tokens=50, cache_read_input_tokens=0, cache_creation_input_tokens=2000
+            )
+        )
+        stats.record_anthropic(
+            SimpleNamespace(
+                input_tokens=60, cache_read_input_tokens=2000, cache_creation_input_tokens=0
+            )
+        )
+        self.assertEqual(
+            stats.to_dict(), {"hits": 1, "misses": 1, "cached_tokens": 2000, "input_tokens": 4110}
+        )
+        self.assertEqual(stats.hit_rate, 0.5)
+
+    def test_openai_usage(self):
+        stats = PromptCacheStats()
+        stats.record_openai(
+            SimpleNamespace(
+                prompt_tokens=1500, prompt_tokens_details=SimpleNamespace(cached_tokens=1024)
+            )
+        )
+        stats.record_openai(SimpleNamespace(prompt_tokens=1500, prompt_tokens_details=None))
+        self.assertEqual((stats.hits, stats.misses, stats.cached_tokens), (1, 1, 1024))
+
+    def test_gemini_usage(self):
+        stats = PromptCacheStats()
+        stats.record_gemini(SimpleNamespace(cached_content_token_count=0, prompt_token_count=300))
+        self.assertEqual((stats.hits, stats.misses, stats.input_tokens), (0, 1, 300))
+
+
+class TestStablePrefix(unittest.TestCase):
+    def requests(self, planner, steps=3):
+        screenshot = MagicMock()
+        requests = []
+        for step in range(steps):
+            screenshot.base64.return_value = f"image{step}"
+            requests.append(planner._prepare_request("open calculator", screenshot))
+            planner.add_finder_message(f"clicked {step}")
+        return requests
+
+    def test_anthropic_marks_system_prompt_and_tools(self):
+        planner = AnthropicPlanner(get_config("android", "anthropic", "anthropic"))
+        first, second, third = self.requests(planner)
+        self.assertEqual(first["system"][-1]["cache_control"], {"type": "ephemeral"})
+        self.assertIs(first["tools"], third["tools"])
+        self.assertEqual(first["messages"][0], third["messages"][0])
+
+    def test_openai_prefix_is_stable(self):
+        planner = ChatGPTPlanner(get_config("android", "openai", "openai"))
+        first, second, third = self.requests(planner)
+        self.assertIs(first["tools"], third["tools"])
+        # system and task prompt open every request unchanged
+        self.assertEqual(first["messages"][:2], third["messages"][:2])
+
+    def test_sessions_count_separately(self):
+        planner = ChatGPTPlanner(get_config("android", "openai", "openai"))
+        planner.cache_stats.record(10, 10)
+        self.assertEqual(planner.new_session().cache_stats.hits, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
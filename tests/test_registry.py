@@ -0,0 +1,55 @@
+import unittest
+from unittest.mock import MagicMock, patch
+from clickclickclick import registry as registry_module
+from clickclickclick.planner import openai as openai_planner
+from clickclickclick.registry import Registry
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_config_is_parsed_once(self):
+        with patch.object(
+            registry_module, "get_config", wraps=registry_module.get_config
+        ) as mock_get_config:
+            first = self.registry.config("android", "openai", "openai")
+            second = self.registry.config("android", "OpenAI", "openai")
+        self.assertIs(first, second)
+        mock_get_config.assert_called_once()
+
+    @patch("clickclickclick.planner.openai.openai.AsyncOpenAI", side_effect=lambda **_: MagicMock())
+    def test_sessions_share_clients_but_not_history(self, _):
+        self.addCleanup(openai_planner._async_client.cache_clear)
+        with patch.object(
+            registry_module, "get_planner", wraps=registry_module.get_planner
+        ) as mock_get_planner:
+            executor_a, executor_b = MagicMock(), MagicMock()
+            _, planner_a, finder_a = self.registry.session(
+                "android", "openai", "openai", executor_a
+            )
+            _, planner_b, finder_b = self.registry.session(
+                "android", "openai", "openai", executor_b
+            )
+        mock_get_planner.assert_called_once()
+
+        planner_a.add_finder_message("clicked")
+        self.assertIsNot(planner_a.chat_history, planner_b.chat_history)
+        self.assertEqual(len(planner_b.chat_history), 1)
+        self.assertIs(planner_a.async_client, planner_b.async_client)
+        # the finder talks to the same endpoint, so it shares the connection pool too
+        self.assertIs(finder_a.async_client, planner_a.async_client)
+
+        self.assertIs(finder_a.executor, executor_a)
+        self.assertIs(finder_b.executor, executor_b)
+        self.assertTrue(executor_b.screenshot_as_base64)
+
+    def test_new_session_starts_with_system_prompt(self):
+        _, planner, _ = self.registry.session("android", "openai", "openai", MagicMock())
+        planner.add_finder_message("clicked")
+        session = planner.new_session()
+        self.assertEqual(list(session.chat_history), [planner.chat_history[0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
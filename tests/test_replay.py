@@ -0,0 +1,89 @@
+import tempfile
+import unittest
+from clickclickclick.replay import (
+    ReplayExecutor,
+    ReplayFinder,
+    ReplayPlanner,
+    ReplaySession,
+    SessionRecorder,
+    replay_config,
+    run_replay,
+    synthetic_session,
+)
+from clickclickclick.finder import configure_finder
+from clickclickclick.planner.task import execute_task
+
+SCREEN = (270, 600)
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.session = synthetic_session(steps=5, screen_size=SCREEN)
+
+    def test_session_runs_through_the_task_loop(self):
+        report = run_replay(self.session)
+        self.assertTrue(report.finished)
+        self.assertEqual(report.steps, 5)
+        self.assertEqual(report.missed_clicks, 0)
+        self.assertEqual(report.actions, sum(step.device_actions for step in self.session.steps))
+        self.assertGreater(report.encoded_bytes_per_step, 0)
+        self.assertGreater(report.cpu_seconds, 0)
+        # the icons aren't in the hierarchy, they are found by the finder's segment pass
+        self.assertIn("finder.process_segment", report.stages)
+
+    def test_latencies_are_waited(self):
+        report = run_replay(synthetic_session(steps=3, screen_size=SCREEN), planner_latency=0.05)
+        self.assertGreaterEqual(report.seconds, 0.15)
+        self.assertLess(report.steps_per_second, 20)
+
+    def test_clicks_off_the_recorded_element_are_counted(self):
+        # the icon of step 1 was recorded somewhere else
+        step = self.session.steps[1]
+        prompt = next(iter(step.elements))
+        left, top, right, bottom = step.elements[prompt]
+        step.elements[prompt] = (left - 100, top + 300, right - 100, bottom + 300)
+        executor = ReplayExecutor(self.session)
+        executor.answered(1)
+        executor.shown_index = 1
+        executor.click_at_a_point(left + 5, top + 5, "")
+        self.assertEqual(executor.missed_clicks, 1)
+        self.assertEqual(executor.position, 1)
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            self.session.save(directory)
+            loaded = ReplaySession.load(directory)
+        self.assertEqual(loaded.prompt, self.session.prompt)
+        self.assertEqual(loaded.screen_size, SCREEN)
+        for saved, step in zip(self.session.steps, loaded.steps):
+            self.assertEqual(step.frame, saved.frame)
+            self.assertEqual(step.hierarchy, saved.hierarchy)
+            self.assertEqual(
+                [list(action) for action in step.actions],
+                [list(action) for action in saved.actions],
+            )
+            self.assertEqual(step.elements, saved.elements)
+
+    def test_recorded_task_replays_the_same_actions(self):
+        c = replay_config()
+        executor = ReplayExecutor(self.session)
+        planner = ReplayPlanner(executor)
+        finder = configure_finder(ReplayFinder(executor), c)
+        recorder = SessionRecorder(self.session.prompt, executor, planner, finder)
+        self.assertTrue(execute_task(self.session.prompt, executor, planner, finder, c))
+
+        recorded = recorder.session
+        self.assertEqual(len(recorded.steps), len(self.session.steps))
+        for step, original in zip(recorded.steps, self.session.steps):
+            self.assertEqual(step.actions, original.actions)
+            self.assertEqual(step.hierarchy, original.hierarchy)
+            self.assertEqual(step.elements.keys(), original.elements.keys())
+            for prompt, box in step.elements.items():
+                for found, expected in zip(box, original.elements[prompt]):
+                    # the finder answers in its image space, a pixel or two is lost each way
+                    self.assertAlmostEqual(found, expected, delta=3)
+        self.assertTrue(run_replay(recorded).finished)
+
+
+if __name__ == "__main__":
+    unittest.main()
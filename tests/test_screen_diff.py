@@ -0,0 +1,115 @@
+import unittest
+from collections import Counter
+from unittest.mock import MagicMock
+from PIL import Image, ImageDraw
+from clickclickclick.config import BaseConfig
+from clickclickclick.planner import UNCHANGED_SCREEN, Planner
+from clickclickclick.planner.loop import LoopDetector, RepeatedActionError, StepTracker
+from clickclickclick.planner.task import execute_task
+from clickclickclick.screen import Frame, visibly_changed
+
+
+def screen(text="", noise=0, size=(540, 1200)):
+    image = Image.new("RGB", size, (250, 250, 250))
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((40, 300, 500, 360), outline=(120, 120, 120), fill=(250 - noise,) * 3)
+    draw.text((50, 320), text, fill=(20, 20, 20))
+    return Frame(image)
+
+
+class TestVisiblyChanged(unittest.TestCase):
+    def test_identical_frames(self):
+        self.assertFalse(visibly_changed(screen("hello"), screen("hello")))
+
+    def test_compression_noise_is_no_change(self):
+        self.assertFalse(visibly_changed(screen("hello"), screen("hello", noise=3)))
+
+    def test_a_typed_character_is_a_change(self):
+        self.assertTrue(visibly_changed(screen("hello"), screen("hello!")))
+
+    def test_rotated_screen_is_a_change(self):
+        self.assertTrue(visibly_changed(screen(), screen(size=(1200, 540))))
+
+
+class TestLoopDetector(unittest.TestCase):
+    swipe = [("swipe_up", {"observation": "a list"})]
+
+    def test_repeats_without_change(self):
+        loops = LoopDetector(max_repeats=3)
+        for observation in ("a list", "the same list", "still the list"):
+            self.assertFalse(loops.looping)
+            loops.record([("swipe_up", {"observation": observation})], changed=False)
+        self.assertTrue(loops.looping)
+
+    def test_change_or_other_action_resets(self):
+        loops = LoopDetector(max_repeats=2)
+        loops.record(self.swipe, changed=False)
+        loops.record(self.swipe, changed=True)
+        loops.record(self.swipe, changed=False)
+        loops.record([("swipe_down", {})], changed=False)
+        self.assertEqual(loops.repeats, 1)
+        self.assertFalse(loops.looping)
+
+    def test_disabled(self):
+        loops = LoopDetector(max_repeats=0)
+        for _ in range(10):
+            loops.record(self.swipe, changed=False)
+        self.assertFalse(loops.looping)
+
+
+class RecordingPlanner(Planner):
+    """Swipes up on every step and remembers what each step was sent."""
+
+    def __init__(self):
+        self.sent = []
+
+    def llm_response(self, prompt, screenshot):
+        self.sent.append(screenshot if screenshot is not None else self.no_screenshot_text())
+        return [("swipe_up", {"observation": "a list"})]
+
+    def add_finder_message(self, message):
+        pass
+
+    def task_finished(self, reason, observation):
+        return True
+
+
+class TestUnchangedSteps(unittest.TestCase):
+    def setUp(self):
+        self.config = BaseConfig()
+        self.config.SETTLE_MAX_WAIT = 0
+        self.config.TASK_DELAY = 0
+        self.executor = MagicMock()
+        self.executor.screen_stats = Counter()
+        self.executor.capture_frame.side_effect = lambda observation: screen("end of list")
+
+    def test_planner_is_told_instead_of_sent_the_screenshot(self):
+        tracker = StepTracker(self.config)
+        self.assertTrue(tracker.observe(screen("hello")))
+        self.assertFalse(tracker.observe(screen("hello")))
+        self.config.SKIP_UNCHANGED_SCREENS = False
+        self.assertTrue(StepTracker(self.config, Counter(steps=1)).observe(screen("hello")))
+
+    def test_task_stops_repeating_a_futile_swipe(self):
+        planner = RecordingPlanner()
+        self.assertFalse(
+            execute_task("scroll down", self.executor, planner, MagicMock(), self.config)
+        )
+        # the first screenshot, then three swipes that changed nothing
+        self.assertEqual(len(planner.sent), 3)
+        self.assertIsInstance(planner.sent[0], Frame)
+        self.assertEqual(planner.sent[1:], [UNCHANGED_SCREEN] * 2)
+        self.assertEqual(self.executor.swipe_up.call_count, 3)
+        self.assertEqual(dict(self.executor.screen_stats), {"steps": 4, "unchanged": 3, "loops": 1})
+
+    def test_loop_error(self):
+        tracker = StepTracker(self.config)
+        tracker.observe(screen())
+        with self.assertRaises(RepeatedActionError):
+            for _ in range(3):
+                tracker.acted("navigate_back", {"observation": "home"})
+                tracker.observe(screen())
+
+
+if __name__ == "__main__":
+    unittest.main()
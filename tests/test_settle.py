@@ -0,0 +1,165 @@
+import asyncio
+import unittest
+from collections import Counter
+from unittest.mock import MagicMock
+from PIL import Image, ImageDraw
+from clickclickclick.config import BaseConfig
+from clickclickclick.planner.task import capture_settled_frame, record_settle
+from clickclickclick.screen import Frame, SettleDetector, SettleResult
+
+
+def screen(offset):
+    # a card sliding in from the left, at rest once the offset stops changing
+    image = Image.new("RGB", (270, 600), (250, 250, 250))
+    ImageDraw.Draw(image).rectangle((offset, 200, offset + 200, 400), fill=(30, 110, 220))
+    return Frame(image)
+
+
+class Screen:
+    """Captures of a transition that moves for `moving` frames and then stays put."""
+
+    def __init__(self, moving):
+        self.offsets = [-200 + 40 * i for i in range(moving)]
+        self.captures = 0
+
+    def capture(self):
+        offset = self.offsets[min(self.captures, len(self.offsets) - 1)] if self.offsets else 0
+        self.captures += 1
+        return screen(offset)
+
+    async def capture_async(self):
+        return self.capture()
+
+
+class FakeClock:
+    """Time that only passes when the detector sleeps, so the waits are exact."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def detector(clock=None, **kwargs):
+    clock = clock or FakeClock()
+    return SettleDetector(
+        **{
+            "interval": 0.01,
+            "min_wait": 0,
+            "max_wait": 1.0,
+            "clock": clock.monotonic,
+            "sleep": clock.sleep,
+            **kwargs,
+        }
+    )
+
+
+class TestSettleDetector(unittest.TestCase):
+    def test_still_screen_moves_on_right_away(self):
+        result = detector().wait(Screen(0).capture)
+        self.assertTrue(result.settled)
+        self.assertEqual(result.captures, 2)
+        self.assertLess(result.seconds, 0.1)
+
+    def test_waits_for_a_transition_to_end(self):
+        transition = Screen(6)
+        result = detector().wait(transition.capture)
+        self.assertTrue(result.settled)
+        self.assertEqual(result.captures, 7)
+        # the returned frame is the last capture, the card at rest
+        self.assertEqual(result.frame.image.getpixel((10, 300)), (30, 110, 220))
+
+    def test_gives_up_after_max_wait(self):
+        transition = Screen(1000)
+        result = detector(max_wait=0.1).wait(transition.capture)
+        self.assertFalse(result.settled)
+        self.assertLessEqual(result.seconds, 0.1)
+        self.assertIsNotNone(result.frame)
+
+    def test_no_screen(self):
+        result = detector().wait(lambda: None)
+        self.assertFalse(result.settled)
+        self.assertIsNone(result.frame)
+        self.assertEqual(result.captures, 1)
+
+    def test_async(self):
+        result = asyncio.run(detector().wait_async(Screen(3).capture_async))
+        self.assertTrue(result.settled)
+        self.assertEqual(result.captures, 4)
+
+    def test_probe_polls_and_one_frame_is_captured(self):
+        clock = FakeClock()
+        transition = Screen(4)
+
+        def capture():
+            clock.now += 0.3  # a full screenshot
+            return screen(0)
+
+        result = detector(clock).wait(capture, lambda: transition.capture().image)
+        self.assertTrue(result.settled)
+        self.assertEqual((result.captures, transition.captures), (5, 5))
+        self.assertEqual(result.capture_seconds, 0.3)
+        self.assertAlmostEqual(result.seconds, 0.04 + 0.3)
+
+    def test_frame_is_captured_when_the_probe_fails(self):
+        capture = MagicMock(return_value=screen(0))
+        result = detector().wait(capture, lambda: None)
+        self.assertFalse(result.settled)
+        self.assertIsNotNone(result.frame)
+        capture.assert_called_once()
+
+    def test_async_probe(self):
+        transition = Screen(2)
+
+        async def probe():
+            return transition.capture().image
+
+        result = asyncio.run(detector().wait_async(Screen(0).capture_async, probe))
+        self.assertTrue(result.settled)
+        self.assertEqual(result.captures, 3)
+        self.assertIsNotNone(result.frame)
+
+
+class TestSettledStep(unittest.TestCase):
+    def setUp(self):
+        self.config = BaseConfig()
+        self.config.SETTLE_INTERVAL = 0.01
+        self.config.SETTLE_MIN_WAIT = 0
+        self.executor = MagicMock()
+        self.executor.settle_stats = Counter()
+        self.executor.has_screen_probe = False
+
+    def test_step_metrics(self):
+        self.executor.capture_frame.side_effect = lambda observation: screen(0)
+        frame = capture_settled_frame(self.executor, self.config)
+        self.assertIsNotNone(frame)
+        stats = self.executor.settle_stats
+        self.assertEqual((stats["steps"], stats["settled"], stats["captures"]), (1, 1, 2))
+        self.assertGreater(stats["saved"], 0.9)
+
+    def test_probe_polls_the_screen(self):
+        self.executor.has_screen_probe = True
+        self.executor.probe_screen.side_effect = lambda: screen(0).image
+        self.executor.capture_frame.side_effect = lambda observation: screen(0)
+        self.assertIsNotNone(capture_settled_frame(self.executor, self.config))
+        self.executor.capture_frame.assert_called_once()
+        self.assertEqual(self.executor.probe_screen.call_count, 2)
+
+    def test_saved_counts_the_capture_the_sleep_was_followed_by(self):
+        # polls for 0.2s, then a 0.3s capture; the old step slept 1s and captured for 0.3s
+        result = SettleResult(screen(0), 0.5, 3, True, capture_seconds=0.3)
+        record_settle(self.executor, result, self.config)
+        self.assertAlmostEqual(self.executor.settle_stats["saved"], 0.8)
+
+    def test_first_step_is_captured_right_away(self):
+        capture_settled_frame(self.executor, self.config, settle=False)
+        self.executor.capture_frame.assert_called_once()
+        self.assertEqual(self.executor.settle_stats["steps"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
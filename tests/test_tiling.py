@@ -0,0 +1,161 @@
+import asyncio
+import json
+import threading
+import time
+import unittest
+from unittest.mock import AsyncMock, MagicMock
+from PIL import Image
+from clickclickclick.finder import BaseFinder
+from clickclickclick.finder.tiling import Detection, non_max_suppression, tile_boxes, truncated
+from clickclickclick.screen import Frame
+
+SCREEN = (1080, 2400)
+# a small element near the bottom of the screen, in screen pixels (left, top, right, bottom)
+ELEMENT = (500, 1900, 560, 1960)
+
+
+class TileFinder(BaseFinder):
+    """Finds ELEMENT in every tile that shows any of it, like a model would."""
+
+    IMAGE_WIDTH = 1000
+    IMAGE_HEIGHT = 1000
+    OUTPUT_WIDTH = 1000
+    OUTPUT_HEIGHT = 1000
+
+    def __init__(self, executor, tiles):
+        super().__init__(None, "stub", {}, "", executor)
+        self.tiles = tiles
+        self.tile_workers = 2
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def locate(self, coordinates):
+        left, top, right, bottom = coordinates
+        element = (
+            ELEMENT[1] / SCREEN[1] * 1000,
+            ELEMENT[0] / SCREEN[0] * 1000,
+            ELEMENT[3] / SCREEN[1] * 1000,
+            ELEMENT[2] / SCREEN[0] * 1000,
+        )
+        ymin, xmin = max(element[0], top), max(element[1], left)
+        ymax, xmax = min(element[2], bottom), min(element[3], right)
+        if ymin >= ymax or xmin >= xmax:
+            box = {"ymin": 0, "xmin": 0, "ymax": 0, "xmax": 0}
+        else:
+            box = {
+                "ymin": (ymin - top) / (bottom - top) * 1000,
+                "xmin": (xmin - left) / (right - left) * 1000,
+                "ymax": (ymax - top) / (bottom - top) * 1000,
+                "xmax": (xmax - left) / (right - left) * 1000,
+            }
+        return json.dumps(box), coordinates
+
+    def process_segment(self, segment, model, prompt):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(0.02)
+        with self.lock:
+            self.running -= 1
+        return self.locate(segment[1])
+
+
+class TestTileBoxes(unittest.TestCase):
+    def test_single_tile_is_the_screen(self):
+        self.assertEqual(tile_boxes(1080, 2400, 1), [(0, 0, 1080, 2400)])
+
+    def test_overlapping_tiles_cover_the_long_side(self):
+        boxes = tile_boxes(1080, 2400, 3, overlap=0.2)
+        self.assertEqual(len(boxes), 3)
+        self.assertEqual(boxes[0][1], 0)
+        self.assertAlmostEqual(boxes[-1][3], 2400)
+        for box in boxes:
+            self.assertEqual((box[0], box[2]), (0, 1080))
+            self.assertAlmostEqual((box[3] - box[1]) / 1080, 2400 / 2.6 / 1080)
+        for first, second in zip(boxes, boxes[1:]):
+            self.assertAlmostEqual(first[3] - second[1], (first[3] - first[1]) * 0.2)
+
+    def test_landscape_tiles_split_the_width(self):
+        boxes = tile_boxes(2400, 1080, 2)
+        self.assertTrue(all(box[1] == 0 and box[3] == 1080 for box in boxes))
+
+
+class TestNonMaxSuppression(unittest.TestCase):
+    def test_overlapping_boxes_support_each_other(self):
+        kept = non_max_suppression(
+            [
+                Detection((10, 10, 20, 20), 0.6),
+                Detection((50, 50, 60, 60), 0.9),
+                Detection((11, 10, 21, 20), 0.6),
+            ]
+        )
+        self.assertEqual(len(kept), 2)
+        self.assertEqual(kept[0].box, (10, 10, 20, 20))
+        self.assertAlmostEqual(kept[0].score, 1.2)
+
+    def test_box_at_an_inner_tile_edge_is_truncated(self):
+        frame = (0, 0, 1000, 1000)
+        tile = (0, 400, 1000, 800)
+        self.assertTrue(truncated((400, 100, 450, 200), tile, frame))
+        self.assertFalse(truncated((500, 100, 550, 200), tile, frame))
+        self.assertFalse(truncated((0, 0, 50, 50), (0, 0, 1000, 400), frame))
+
+
+class TestTiledFinder(unittest.TestCase):
+    def setUp(self):
+        self.executor = MagicMock()
+        self.executor.current_frame.return_value = Frame(Image.new("RGB", SCREEN))
+        self.expected = "791,462,816,518"
+
+    def test_single_segment(self):
+        finder = TileFinder(self.executor, tiles=1)
+        self.assertEqual(finder.find_element("button", "observation"), self.expected)
+
+    def test_tiles_are_merged(self):
+        finder = TileFinder(self.executor, tiles=4)
+        segments, _, _ = finder.resize(self.executor.current_frame(""), finder.IMAGE_WIDTH)
+        self.assertEqual(len(segments), 4)
+        self.assertTrue(all(segment[0].size == (1000, 1000) for segment in segments))
+
+        self.assertEqual(finder.find_element("button", "observation"), self.expected)
+        self.assertEqual(finder.max_running, 2)
+
+    def test_tiles_async(self):
+        finder = TileFinder(self.executor, tiles=3)
+        self.executor.current_frame_async = AsyncMock(return_value=self.executor.current_frame(""))
+        bounds = asyncio.run(finder.find_element_async("button", "observation"))
+        self.assertEqual(bounds, self.expected)
+
+    def test_failed_tile_is_skipped(self):
+        finder = TileFinder(self.executor, tiles=3)
+        locate = finder.locate
+
+        def flaky(coordinates):
+            if coordinates[1] == 0:
+                raise RuntimeError("model unavailable")
+            return locate(coordinates)
+
+        finder.locate = flaky
+        self.assertEqual(finder.find_element("button", "observation"), self.expected)
+
+    def test_malformed_tile_is_a_miss(self):
+        finder = TileFinder(self.executor, tiles=3)
+        locate = finder.locate
+
+        def malformed(coordinates):
+            if coordinates[1] == 0:
+                return (
+                    '{"ymin": 1, "xmin": 2, "ymax": 3, "xmax": 4, "confidence": null}',
+                    coordinates,
+                )
+            if coordinates[1] < 500:
+                return '{"ymin": 1, "xmin": 2}', coordinates
+            return locate(coordinates)
+
+        finder.locate = malformed
+        self.assertEqual(finder.find_element("button", "observation"), self.expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
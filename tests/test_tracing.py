@@ -0,0 +1,114 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import MagicMock
+from clickclickclick.config import BaseConfig
+from clickclickclick.jobs import _advance
+from clickclickclick.planner.task import execute_task, execute_task_with_generator
+from clickclickclick.tracing import TaskTrace, activate, in_current_context, percentile, span
+from helpers import SwipingPlanner, changing_screen_executor
+
+
+class TestSpans(unittest.TestCase):
+    def test_nothing_is_recorded_without_a_trace(self):
+        with span("frame.encode") as current:
+            self.assertIsNone(current)
+
+    def test_nested_spans(self):
+        trace = TaskTrace()
+        with activate(trace):
+            with span("task.step") as step:
+                with span("planner.llm_response") as request:
+                    pass
+        self.assertEqual(request.parent, step.id)
+        self.assertIsNone(step.parent)
+        self.assertTrue(step.duration >= request.duration)
+
+    def test_spans_on_another_thread(self):
+        trace = TaskTrace()
+        with activate(trace), span("task.step") as step:
+
+            def capture():
+                with span("executor.capture"):
+                    pass
+
+            worker = threading.Thread(target=in_current_context(capture))
+            worker.start()
+            worker.join()
+        capture_span = next(s for s in trace.spans if s.name == "executor.capture")
+        self.assertEqual(capture_span.parent, step.id)
+
+    def test_error_is_recorded(self):
+        trace = TaskTrace()
+        with self.assertRaises(ValueError), activate(trace), span("tool.swipe_up"):
+            raise ValueError("no device")
+        self.assertEqual(trace.spans[0].attributes["error"], "ValueError")
+
+    def test_summary(self):
+        self.assertEqual(percentile([3, 1, 2], 50), 2)
+        self.assertEqual(percentile(list(range(1, 101)), 95), 95)
+        trace = TaskTrace()
+        for seconds in (0.1, 0.2, 0.3):
+            trace.end(trace.begin("planner.llm_response"))
+            trace.spans[-1].duration = seconds
+        stage = trace.summary()["planner.llm_response"]
+        self.assertEqual((stage["count"], stage["p50"], stage["p95"]), (3, 0.2, 0.3))
+
+
+class TestTaskTrace(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = BaseConfig()
+        self.config.SETTLE_MAX_WAIT = 0
+        self.config.TASK_DELAY = 0
+        self.config.TRACE_DIR = self.directory.name
+        self.config.PIPELINE_CAPTURE = True
+        self.executor = changing_screen_executor()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_task_is_traced_and_exported(self):
+        trace = TaskTrace("swipe", id="task-1")
+        planner = SwipingPlanner(steps=3)
+        self.assertTrue(
+            execute_task("swipe", self.executor, planner, MagicMock(), self.config, trace)
+        )
+
+        summary = trace.summary()
+        self.assertEqual(summary["task"]["count"], 1)
+        self.assertEqual(summary["task.step"]["count"], 3)
+        self.assertEqual(summary["planner.llm_response"]["count"], 3)
+        self.assertEqual(summary["tool.swipe_up"]["count"], 2)
+        # the frames after the first are captured and encoded by the prefetch of the step before
+        self.assertEqual(summary["pipeline.prefetch"]["count"], 2)
+        self.assertIn("frame.base64", summary)
+
+        with open(os.path.join(self.directory.name, "task-1.json")) as file:
+            exported = json.load(file)
+        self.assertEqual(len(exported["traceEvents"]), len(trace.spans))
+        self.assertEqual(exported["otherData"]["summary"]["task.step"]["count"], 3)
+
+    def test_generator_resumed_in_other_contexts(self):
+        trace = TaskTrace()
+        generator = execute_task_with_generator(
+            "swipe", self.executor, SwipingPlanner(steps=2), MagicMock(), self.config, trace
+        )
+
+        async def drive():
+            # like the API, every step is advanced on a worker thread
+            while not (await asyncio.to_thread(_advance, generator))[0]:
+                pass
+
+        asyncio.run(drive())
+        steps = [s for s in trace.spans if s.name == "task.step"]
+        self.assertEqual(len(steps), 2)
+        requests = [s for s in trace.spans if s.name == "planner.llm_response"]
+        self.assertEqual([s.parent for s in requests], [s.id for s in steps])
+
+
+if __name__ == "__main__":
+    unittest.main()